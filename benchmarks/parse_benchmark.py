@@ -0,0 +1,126 @@
+"""
+文档解析吞吐基准
+
+以 tests/ 下的样例文档中以空行分隔的片段随机拼接出指定大小的合成语料（默认 50 MB），
+分别计时 Markdown（parse）与 RST（iter_parse，流式翻译使用的路径）的解析，取多次中的最好成绩。
+
+指定 --baseline <git 修订> 时，从该修订读取解析器源码一并计时，并检查两者产生的块完全一致，
+用于比较解析器改动前后的吞吐：
+
+    python benchmarks/parse_benchmark.py --baseline HEAD~1
+"""
+
+import argparse
+import gc
+import random
+import subprocess
+import sys
+import time
+import types
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.core.markdown_document_processor import MarkdownDocumentProcessor
+from src.core.rst_processor import RSTProcessor
+
+# (名称, 样例文档, 解析器模块, 解析器类名)
+TARGETS = [
+    ('markdown', 'tests/ldm.md', 'markdown_document_processor', 'MarkdownDocumentProcessor'),
+    ('rst', 'tests/w1-generic.rst', 'rst_processor', 'RSTProcessor'),
+]
+CURRENT = {'MarkdownDocumentProcessor': MarkdownDocumentProcessor, 'RSTProcessor': RSTProcessor}
+
+
+def build_corpus(sample: str, size: int, seed: int) -> str:
+    """以空行分隔的片段为单位随机拼接，直到不少于 size 字节"""
+    rng = random.Random(seed)
+    pieces = sample.split('\n\n')
+    parts: List[str] = []
+    total = 0
+    while total < size:
+        piece = rng.choice(pieces)
+        parts.append(piece)
+        total += len(piece.encode('utf-8')) + 2
+    return '\n\n'.join(parts)
+
+
+def load_baseline(revision: str, module: str):
+    """从 git 修订中读取 src/core/<module>.py，作为 src.core 下的模块加载（相对导入使用当前代码）"""
+    source = subprocess.run(
+        ['git', 'show', f'{revision}:src/core/{module}.py'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    baseline = types.ModuleType(f'src.core._baseline_{module}')
+    baseline.__package__ = 'src.core'
+    exec(compile(source, f'{revision}:src/core/{module}.py', 'exec'), baseline.__dict__)
+    return baseline
+
+
+def parser_for(name: str, processor_class) -> Callable[[str], list]:
+    """RST 走 iter_parse（逐行流式解析），Markdown 走 parse"""
+    if name == 'rst' and hasattr(processor_class, 'iter_parse'):
+        return lambda text: list(processor_class().iter_parse(text.split('\n')))
+    return lambda text: processor_class().parse(text)
+
+
+def best_time(parse: Callable[[str], list], text: str, repeat: int):
+    """返回 (最好耗时, 解析结果)；计时期间关闭垃圾回收"""
+    best = None
+    blocks = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            blocks = parse(text)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, blocks
+
+
+def run(size_mb: float, repeat: int, seed: int, baseline: Optional[str]) -> List[Dict]:
+    results = []
+    for name, sample_path, module, class_name in TARGETS:
+        sample = (ROOT / sample_path).read_text(encoding='utf-8')
+        text = build_corpus(sample, int(size_mb * 2 ** 20), seed)
+        megabytes = len(text.encode('utf-8')) / 2 ** 20
+
+        elapsed, blocks = best_time(parser_for(name, CURRENT[class_name]), text, repeat)
+        result = {"format": name, "megabytes": megabytes, "blocks": len(blocks),
+                  "seconds": elapsed, "mb_per_s": megabytes / elapsed}
+        if baseline:
+            baseline_class = getattr(load_baseline(baseline, module), class_name)
+            baseline_elapsed, baseline_blocks = best_time(parser_for(name, baseline_class), text, repeat)
+            if baseline_blocks != blocks:
+                raise AssertionError(f"{name}: 当前解析器与 {baseline} 的解析结果不一致")
+            result.update({"baseline_seconds": baseline_elapsed,
+                           "baseline_mb_per_s": megabytes / baseline_elapsed,
+                           "speedup": baseline_elapsed / elapsed})
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文档解析吞吐基准（合成语料）")
+    parser.add_argument('--size', type=float, default=50, help='合成语料大小（MB），默认 50')
+    parser.add_argument('--repeat', type=int, default=3, help='每项计时次数（取最好成绩），默认 3')
+    parser.add_argument('--seed', type=int, default=7, help='语料拼接的随机种子')
+    parser.add_argument('--baseline', help='对比的 git 修订（如 HEAD~1），会同时检查解析结果一致')
+    args = parser.parse_args()
+
+    for result in run(args.size, args.repeat, args.seed, args.baseline):
+        line = (f"{result['format']:<8} {result['megabytes']:.1f} MB, {result['blocks']} 个块: "
+                f"{result['seconds']:.2f}s ({result['mb_per_s']:.1f} MB/s)")
+        if 'speedup' in result:
+            line += (f"；{args.baseline}: {result['baseline_seconds']:.2f}s "
+                     f"({result['baseline_mb_per_s']:.1f} MB/s)，加速 {result['speedup']:.2f}x")
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
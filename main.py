@@ -50,15 +50,39 @@ def translate_single_file(args):
         provider=args.provider,
         openai_api_key=getattr(args, 'openai_api_key', None),
         openai_base_url=getattr(args, 'openai_base_url', None),
-        qwen_api_key=getattr(args, 'qwen_api_key', None)
+        qwen_api_key=getattr(args, 'qwen_api_key', None),
+        cache_dir=getattr(args, 'cache_dir', None),
+        verification_method=getattr(args, 'verify_method', 'summary'),
+        chunk_verify=getattr(args, 'chunk_verify', False),
+        local_gate=getattr(args, 'local_gate', False),
+        verify_mode=getattr(args, 'verify', 'full'),
+        sample_rate=getattr(args, 'sample_rate', 0.2),
+        verify_later=getattr(args, 'verify_later', False),
+        refine_token_budget=getattr(args, 'refine_budget', 20000),
+        batch_refine_token_budget=getattr(args, 'batch_refine_budget', None),
+        max_refine_rounds=getattr(args, 'max_refine_rounds', 2),
+        escalation_model=getattr(args, 'escalation_model', None),
+        rst_mode=getattr(args, 'rst_mode', 'chunks')
     )
     
     try:
-        stats = translator.translate_file(
-            input_file=args.input,
-            output_file=args.output,
-            save_stats=True
-        )
+        if getattr(args, 'stream', False):
+            # 流式翻译：边读边译边写，不做整篇校验
+            stats = translator.translate_file_streaming(
+                input_file=args.input,
+                output_file=args.output,
+                save_stats=True
+            )
+        else:
+            stats = translator.translate_file(
+                input_file=args.input,
+                output_file=args.output,
+                save_stats=True
+            )
+        
+        if args.verify_later and not getattr(args, 'stream', False):
+            print("初稿已可审阅，等待后台校验完成...")
+            translator.wait_for_background()
     
         report = translator.get_translation_report(stats)
         print(report)
@@ -84,25 +108,80 @@ def translate_batch(args):
         provider=args.provider,
         openai_api_key=getattr(args, 'openai_api_key', None),
         openai_base_url=getattr(args, 'openai_base_url', None),
-        qwen_api_key=getattr(args, 'qwen_api_key', None)
+        qwen_api_key=getattr(args, 'qwen_api_key', None),
+        cache_dir=getattr(args, 'cache_dir', None),
+        verification_method=getattr(args, 'verify_method', 'summary'),
+        chunk_verify=getattr(args, 'chunk_verify', False),
+        local_gate=getattr(args, 'local_gate', False),
+        verify_mode=getattr(args, 'verify', 'full'),
+        sample_rate=getattr(args, 'sample_rate', 0.2),
+        verify_later=getattr(args, 'verify_later', False),
+        refine_token_budget=getattr(args, 'refine_budget', 20000),
+        batch_refine_token_budget=getattr(args, 'batch_refine_budget', None),
+        max_refine_rounds=getattr(args, 'max_refine_rounds', 2),
+        escalation_model=getattr(args, 'escalation_model', None),
+        rst_mode=getattr(args, 'rst_mode', 'chunks')
     )
     
     try:
+        if args.plan:
+            results = translator.plan_batch(args.input, file_pattern=args.pattern)
+            planned = [r for r in results if 'error' not in r]
+            for r in results:
+                if 'error' in r:
+                    print(f"   {r['input_file']}: 出错 {r['error']}")
+            print(f"\n预估: {len(planned)}/{len(results)} 个文件, "
+                  f"{sum(r['requests'] for r in planned)} 个请求, "
+                  f"约 {sum(r['input_tokens'] for r in planned)} 输入 tokens")
+            return
+        
         results = translator.batch_translate(
             input_dir=args.input,
             output_dir=args.output,
-            file_pattern=args.pattern
+            file_pattern=args.pattern,
+            anomaly_detection=args.anomaly_detection
         )
         
+        if args.verify_later:
+            print("全部初稿已写出，等待后台校验完成...")
+            translator.wait_for_background()
+        
         successful = sum(1 for r in results if 'error' not in r)
         total = len(results)
-        avg_score = sum(r.get('completeness_score', 0) for r in results if 'error' not in r)
-        avg_score = avg_score / successful if successful > 0 else 0
+        scores = [r['completeness_score'] for r in results
+                  if 'error' not in r and r.get('completeness_score') is not None]
+        avg_score = sum(scores) / len(scores) if scores else 0
         
         print(f"\n批量翻译完成:")
         print(f"   成功: {successful}/{total} 个文件")
         print(f"   平均完整性评分: {avg_score:.1f}/10")
         
+        refine_stats = translator.translator.refine_budget.get_stats()
+        if refine_stats['batch_tokens_spent']:
+            print(f"   重译预估花费: {refine_stats['batch_tokens_spent']} tokens")
+            stopped = {}
+            for r in results:
+                reason = r.get('refine_control', {}).get('stop_reason')
+                if reason and r['refine_control'].get('rounds'):
+                    stopped[reason] = stopped.get(reason, 0) + 1
+            if stopped:
+                print(f"   重译停止原因: {', '.join(f'{k} {v}' for k, v in stopped.items())}")
+        
+        failed_files = [r for r in results if r.get('failed_units')]
+        if failed_files:
+            print(f"   重试后仍有失败单元的文件: {len(failed_files)} 个")
+            for r in failed_files:
+                print(f"     {r['input_file']}: {', '.join(str(u['index']) for u in r['failed_units'])}")
+        
+        if args.verify == 'sampled':
+            sampling = translator.get_sampling_report(results)
+            print(f"   抽样校验: {sampling['llm_verified']}/{sampling['files']} 个文件做了 LLM 校验 "
+                  f"(风险 {sampling['risk_verified']}, 随机 {sampling['random_verified']})")
+            if sampling['pass_rate_interval']:
+                low, high = sampling['pass_rate_interval']
+                print(f"   随机样本通过率: {sampling['random_pass_rate']:.0%} "
+                      f"(95% 置信区间 {low:.0%} - {high:.0%})")
+        
     except Exception as e:
         print(f"批量翻译过程中发生错误: {e}")
         sys.exit(1)
@@ -118,7 +197,9 @@ def validate_translation(args):
         provider=args.provider,
         openai_api_key=getattr(args, 'openai_api_key', None),
         openai_base_url=getattr(args, 'openai_base_url', None),
-        qwen_api_key=getattr(args, 'qwen_api_key', None)
+        qwen_api_key=getattr(args, 'qwen_api_key', None),
+        cache_dir=getattr(args, 'cache_dir', None),
+        verification_method=getattr(args, 'verify_method', 'summary')
     )
     
     try:
@@ -134,6 +215,65 @@ def validate_translation(args):
         sys.exit(1)
 
 
+def repair_translation(args):
+    """修复中断后残留的部分译文（支持单个文件或整个目录）"""
+    print(f"修复部分译文")
+    print(f"原文: {args.source}")
+    print(f"译文: {args.translated}")
+    
+    translator = UniversalTranslator(
+        model_name=args.model,
+        translator_id=args.translator,
+        max_tokens=args.max_tokens,
+        provider=args.provider,
+        openai_api_key=getattr(args, 'openai_api_key', None),
+        openai_base_url=getattr(args, 'openai_base_url', None),
+        qwen_api_key=getattr(args, 'qwen_api_key', None),
+        cache_dir=getattr(args, 'cache_dir', None)
+    )
+    
+    try:
+        if os.path.isdir(args.source) and os.path.isdir(args.translated):
+            results = translator.repair_directory(args.source, args.translated,
+                                                  min_cjk_ratio=args.min_cjk_ratio)
+        else:
+            results = [translator.repair_file(args.source, args.translated, args.output,
+                                              min_cjk_ratio=args.min_cjk_ratio)]
+        
+        print(f"\n修复完成:")
+        for r in results:
+            if 'error' in r:
+                print(f"   {r['translated_file']}: 出错 {r['error']}")
+                continue
+            print(f"   {r['output_file']}: 重译 {len(r['repaired_blocks'])}/{r['segment_count']} 个片段"
+                  + (f"，仍失败 {len(r['still_failed'])} 个" if r['still_failed'] else ""))
+        
+    except Exception as e:
+        print(f"修复过程中发生错误: {e}")
+        sys.exit(1)
+
+
+def add_verify_arguments(subparser):
+    """为 translate/batch 子命令添加校验策略参数"""
+    subparser.add_argument(
+        '--verify',
+        choices=['off', 'local', 'sampled', 'full'],
+        default='full',
+        help='校验策略: off 不校验, local 仅本地结构检查, sampled 抽样 LLM 校验, full 全量 LLM 校验 (默认: full)'
+    )
+    subparser.add_argument(
+        '--sample-rate',
+        type=float,
+        default=0.2,
+        help='sampled 模式下本地检查通过的文件被随机抽中做 LLM 校验的比例 (默认: 0.2)'
+    )
+    subparser.add_argument(
+        '--verify-later',
+        action='store_true',
+        help='先写出首轮译文，校验与重译在后台进行，完成后回写文件并更新 verification 状态标记'
+    )
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -147,12 +287,21 @@ def main():
   # 翻译单个 RST 文件
   python main.py translate input.rst -o output.rst
   
+  # 流式翻译超大文件（边读边译边写）
+  python main.py translate huge.md -o huge_zh.md --stream
+  
   # 批量翻译（支持 .md, .rst 等格式）
   python main.py batch input_dir output_dir
   
+  # 预估批量翻译的请求数与 token 数（不调用 LLM）
+  python main.py batch input_dir output_dir --plan
+  
   # 验证翻译质量
   python main.py validate original.md translated.md
   
+  # 修复中断后残留的部分译文（只重译仍为英文或翻译失败的片段）
+  python main.py repair original.md translated.md
+  
 支持的文件格式:
   - Markdown (.md, .markdown)
   - reStructuredText (.rst, .rest)
@@ -203,21 +352,92 @@ def main():
         help='Qwen API密钥（优先级高于配置文件）'
     )
     
+    parser.add_argument(
+        '--cache-dir',
+        help='摘要/比较结果的磁盘缓存目录（可选，重复运行和 validate 可复用）'
+    )
+    
+    parser.add_argument(
+        '--verify-method',
+        choices=['summary', 'structured'],
+        default='summary',
+        help='完整性校验方式: summary 为摘要比较, structured 为单次 JSON 结构化校验 (默认: summary)'
+    )
+    
+    parser.add_argument(
+        '--chunk-verify',
+        action='store_true',
+        help='每个块翻译后立即并行校验，只重译被标记的块'
+    )
+    
+    parser.add_argument(
+        '--local-gate',
+        action='store_true',
+        help='先做本地结构完整性检查，通过则跳过 LLM 校验'
+    )
+    
+    parser.add_argument(
+        '--refine-budget',
+        type=int,
+        default=20000,
+        help='单个文件重译的预估 token 预算 (默认: 20000)'
+    )
+    
+    parser.add_argument(
+        '--batch-refine-budget',
+        type=int,
+        help='整批重译的预估 token 预算 (默认不限)'
+    )
+    
+    parser.add_argument(
+        '--max-refine-rounds',
+        type=int,
+        default=2,
+        help='单个文件最多重译轮数，评分不再提升时提前停止 (默认: 2)'
+    )
+    
+    parser.add_argument(
+        '--escalation-model',
+        help='模型级联：--model 作为首轮廉价模型（如 qwen-turbo），未通过检查的片段升级到该模型重译（如 qwen-max）'
+    )
+    
+    parser.add_argument(
+        '--rst-mode',
+        choices=['chunks', 'blocks'],
+        default='chunks',
+        help='RST 翻译方式：chunks 按 RST 结构分块后整篇并行翻译（默认），blocks 逐块翻译'
+    )
+    
     subparsers = parser.add_subparsers(dest='command', help='可用命令')
     
     translate_parser = subparsers.add_parser('translate', help='翻译单个文件（支持 .md, .rst 等格式）')
     translate_parser.add_argument('input', help='输入文件路径')
     translate_parser.add_argument('-o', '--output', help='输出文件路径（可选）')
+    translate_parser.add_argument('--stream', action='store_true',
+                                  help='流式翻译超大文件：逐行读取、边翻译边写出，内存占用有界（不做整篇校验）')
+    add_verify_arguments(translate_parser)
     
     batch_parser = subparsers.add_parser('batch', help='批量翻译文件（支持多种格式）')
     batch_parser.add_argument('input', help='输入目录路径')
     batch_parser.add_argument('output', help='输出目录路径')
     batch_parser.add_argument('--pattern', default='*.*', help='文件匹配模式 (默认: *.*，支持所有格式)')
+    batch_parser.add_argument('--plan', action='store_true',
+                              help='只预估请求数与输入 token 数（快速估计器，不调用 LLM、不写出文件）')
+    batch_parser.add_argument('--anomaly-detection', action='store_true',
+                              help='跳过逐文件 LLM 校验，改为整批长度比异常检测并只重译异常片段')
+    add_verify_arguments(batch_parser)
  
     validate_parser = subparsers.add_parser('validate', help='验证翻译质量')
     validate_parser.add_argument('original', help='原始文件路径')
     validate_parser.add_argument('translated', help='翻译文件路径')
     
+    repair_parser = subparsers.add_parser('repair', help='修复部分译文：只重译仍为英文或带失败标记的片段')
+    repair_parser.add_argument('source', help='原文文件或目录')
+    repair_parser.add_argument('translated', help='部分翻译的输出文件或目录')
+    repair_parser.add_argument('-o', '--output', help='修复结果输出路径（默认覆盖译文文件，目录模式下忽略）')
+    repair_parser.add_argument('--min-cjk-ratio', type=float, default=0.2,
+                               help='译文片段的最低中文比例，低于该值视为未翻译 (默认: 0.2)')
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -232,6 +452,8 @@ def main():
         translate_batch(args)
     elif args.command == 'validate':
         validate_translation(args)
+    elif args.command == 'repair':
+        repair_translation(args)
 
 
 if __name__ == "__main__":
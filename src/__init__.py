@@ -7,7 +7,7 @@
 """
 
 # 导入工具层
-from .utils import ConfigManager, config_manager, LLMFactory
+from .utils import ConfigManager, config_manager, LLMFactory, ResultCache
 
 # 导入核心业务层
 from .core import (
@@ -27,6 +27,7 @@ __all__ = [
     "ConfigManager",
     "config_manager", 
     "LLMFactory",
+    "ResultCache",
     "TranslationAgent",
     "MarkdownParser",
     "Metadata",
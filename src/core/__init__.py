@@ -11,6 +11,14 @@ from .universal_translator import UniversalTranslator
 from .document_processor import DocumentProcessor, ProcessorFactory, DocumentBlock
 from .markdown_document_processor import MarkdownDocumentProcessor
 from .rst_processor import RSTProcessor
+from .rst_chunker import RSTChunker
+from .integrity_checker import StructuralIntegrityChecker, IntegrityReport
+from .batch_anomaly import LengthRatioDetector, AnomalyReport
+from .segment_index import SegmentIndex
+from .refine_budget import RefineBudget
+from .retry_queue import RetryQueue
+from .partial_repair import PartialTranslationScanner, RepairReport
+from .tokenizer import TokenCalibration, TokenEstimator
 
 # 注册文档处理器
 ProcessorFactory.register(['.md', '.markdown'], MarkdownDocumentProcessor)
@@ -29,5 +37,17 @@ __all__ = [
     'ProcessorFactory',
     'DocumentBlock',
     'MarkdownDocumentProcessor',
-    'RSTProcessor'
+    'RSTProcessor',
+    'RSTChunker',
+    'StructuralIntegrityChecker',
+    'IntegrityReport',
+    'LengthRatioDetector',
+    'AnomalyReport',
+    'SegmentIndex',
+    'RefineBudget',
+    'RetryQueue',
+    'PartialTranslationScanner',
+    'RepairReport',
+    'TokenCalibration',
+    'TokenEstimator'
 ]
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+批量长度比异常检测
+按块类型拟合译文/原文长度比，用 median/MAD 鲁棒地找出疑似截断或漏译的片段
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from .document_processor import DocumentBlock
+from .integrity_checker import StructuralIntegrityChecker
+
+
+# 与 integrity_checker.CJK_PATTERN 保持一致的码点区间
+CJK_RANGES = (
+    (0x3400, 0x4DBF),
+    (0x4E00, 0x9FFF),
+    (0xF900, 0xFAFF),
+    (0x3000, 0x303F),
+    (0xFF00, 0xFFEF),
+)
+
+# 块类型 -> 拟合分组
+TYPE_GROUPS = {
+    'heading': 0,
+    'title': 0,
+    'list_item': 1,
+    'list': 1,
+}
+GROUP_NAMES = ['heading', 'list_item', 'paragraph']
+PARAGRAPH_GROUP = 2
+
+
+def cjk_ratios(texts: List[str]) -> np.ndarray:
+    """
+    向量化计算每段文本的中文比例（中文字符 / (中文字符 + 英文字母)）
+
+    所有文本拼接后一次性转为码点数组，用前缀和按段求计数，
+    适合对整棵目录树的片段做一次性检测。
+
+    Args:
+        texts: 文本列表
+
+    Returns:
+        与 texts 等长的比例数组；不含字母和中文的文本比例为 1.0
+    """
+    if not texts:
+        return np.zeros(0, dtype=np.float64)
+    joined = ''.join(texts)
+    codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+
+    is_cjk = np.zeros(codes.shape, dtype=bool)
+    for low, high in CJK_RANGES:
+        is_cjk |= (codes >= low) & (codes <= high)
+    lowered = codes | 0x20
+    is_latin = (lowered >= ord('a')) & (lowered <= ord('z'))
+
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    cjk_prefix = np.concatenate(([0], np.cumsum(is_cjk, dtype=np.int64)))
+    latin_prefix = np.concatenate(([0], np.cumsum(is_latin, dtype=np.int64)))
+    cjk = cjk_prefix[ends] - cjk_prefix[starts]
+    latin = latin_prefix[ends] - latin_prefix[starts]
+
+    total = cjk + latin
+    ratios = np.ones(len(texts), dtype=np.float64)
+    np.divide(cjk, total, out=ratios, where=total > 0)
+    return ratios
+
+
+@dataclass
+class AnomalyReport:
+    """批量异常检测结果"""
+    segment_count: int = 0
+    flagged: Dict[Hashable, List[int]] = field(default_factory=dict)  # 文档ID -> 块下标列表
+    group_stats: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @property
+    def flagged_count(self) -> int:
+        return sum(len(indices) for indices in self.flagged.values())
+
+    def to_dict(self) -> Dict:
+        return {
+            "segment_count": self.segment_count,
+            "flagged_count": self.flagged_count,
+            "group_stats": self.group_stats
+        }
+
+
+class LengthRatioDetector:
+    """
+    批量长度比异常检测器
+
+    先用 add_document 收集整批文档的片段特征（原文 token 数、译文字符数、中文比例），
+    再由 detect 对整批做一次向量化拟合：每个块类型取 log(译文字符/原文token) 的中位数和
+    MAD，鲁棒 z 分数超过阈值或中文比例过低的片段被标记。
+    中文比例只检查原文含足够多英文单词的片段（与结构检查器相同，w1_smem 这类标识符不要求翻译）。
+    """
+
+    def __init__(self,
+                 token_counter: Optional[Callable[[str], int]] = None,
+                 z_threshold: float = 3.5,
+                 min_cjk_ratio: float = 0.2,
+                 min_source_tokens: int = 4,
+                 min_group_size: int = 8,
+                 checker: Optional[StructuralIntegrityChecker] = None):
+        """
+        初始化检测器
+
+        Args:
+            token_counter: 原文 token 计数函数（默认按空白分词计数）
+            z_threshold: 鲁棒 z 分数阈值
+            min_cjk_ratio: 译文最低中文比例
+            min_source_tokens: 原文 token 数低于该值的片段不参与长度比判断（过短噪声大）
+            min_group_size: 分组样本数低于该值时使用全体样本的统计量
+            checker: 用于判断原文是否需要检查中文比例、剥离行内代码等的结构检查器
+        """
+        self.token_counter = token_counter or (lambda text: len(text.split()))
+        self.z_threshold = z_threshold
+        self.min_cjk_ratio = min_cjk_ratio
+        self.min_source_tokens = min_source_tokens
+        self.min_group_size = min_group_size
+        self.checker = checker or StructuralIntegrityChecker(min_cjk_ratio=min_cjk_ratio)
+
+        self._doc_ids: List[Hashable] = []
+        self._doc_index: List[int] = []
+        self._block_index: List[int] = []
+        self._groups: List[int] = []
+        self._source_tokens: List[int] = []
+        self._targets: List[str] = []
+        self._needs_cjk: List[bool] = []
+        self._cjk_texts: List[str] = []
+
+    def add_document(self,
+                     doc_id: Hashable,
+                     original_blocks: List[DocumentBlock],
+                     translated_blocks: List[DocumentBlock]):
+        """收集一个文档的可翻译片段特征"""
+        doc_pos = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        for i, (src, tgt) in enumerate(zip(original_blocks, translated_blocks)):
+            if not src.translatable or not src.content.strip():
+                continue
+            self._doc_index.append(doc_pos)
+            self._block_index.append(i)
+            self._groups.append(TYPE_GROUPS.get(src.type, PARAGRAPH_GROUP))
+            self._source_tokens.append(self.token_counter(src.content))
+            self._targets.append(tgt.content)
+            self._needs_cjk.append(self.checker.needs_cjk(src.content))
+            self._cjk_texts.append(self.checker.strip_literals(tgt.content))
+
+    def detect(self) -> AnomalyReport:
+        """对已收集的所有片段做一次向量化检测"""
+        report = AnomalyReport(segment_count=len(self._targets))
+        if not self._targets:
+            return report
+
+        groups = np.asarray(self._groups, dtype=np.int64)
+        source_tokens = np.asarray(self._source_tokens, dtype=np.float64)
+        target_chars = np.fromiter((len(t.strip()) for t in self._targets),
+                                   dtype=np.float64, count=len(self._targets))
+        log_ratio = np.log1p(target_chars) - np.log1p(source_tokens)
+        ratio_eligible = source_tokens >= self.min_source_tokens
+
+        z_scores = np.zeros_like(log_ratio)
+        global_median, global_mad = self._robust_stats(log_ratio[ratio_eligible])
+        for group_id, name in enumerate(GROUP_NAMES):
+            mask = (groups == group_id) & ratio_eligible
+            count = int(mask.sum())
+            if count >= self.min_group_size:
+                median, mad = self._robust_stats(log_ratio[mask])
+            else:
+                median, mad = global_median, global_mad
+            z_scores[mask] = 0.6745 * (log_ratio[mask] - median) / mad
+            if count:
+                report.group_stats[name] = {
+                    "count": count,
+                    # 译文字符数 / 原文 token 数的中位数（z 分数使用的是其 log1p 形式）
+                    "median_ratio": float(np.median(target_chars[mask] / source_tokens[mask])),
+                    "mad": float(mad)
+                }
+
+        ratios = cjk_ratios(self._cjk_texts)
+        needs_cjk = np.asarray(self._needs_cjk, dtype=bool)
+        untranslated = (ratios < self.min_cjk_ratio) & needs_cjk & (source_tokens >= self.min_source_tokens)
+        flagged = (np.abs(z_scores) > self.z_threshold) | untranslated
+
+        doc_index = np.asarray(self._doc_index, dtype=np.int64)
+        block_index = np.asarray(self._block_index, dtype=np.int64)
+        for pos in np.flatnonzero(flagged):
+            doc_id = self._doc_ids[doc_index[pos]]
+            report.flagged.setdefault(doc_id, []).append(int(block_index[pos]))
+        return report
+
+    @staticmethod
+    def _robust_stats(values: np.ndarray):
+        """返回 (中位数, MAD)，MAD 设下限以避免除零"""
+        if values.size == 0:
+            return 0.0, 1.0
+        median = float(np.median(values))
+        mad = float(np.median(np.abs(values - median)))
+        return median, max(mad, 0.05)
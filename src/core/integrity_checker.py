@@ -0,0 +1,235 @@
+"""
+本地结构完整性检查器
+在调用 LLM 校验之前，对原文与译文的可计数不变量进行确定性比对
+"""
+
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
+
+from .document_processor import DocumentBlock
+
+
+# 中日韩统一表意文字及常用中文标点
+CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3000-\u303f\uff00-\uffef]')
+LATIN_LETTER_PATTERN = re.compile(r'[A-Za-z]')
+
+# 翻译失败时 translate_chunk 写入的标记
+FAILURE_MARKER = "翻译失败:"
+
+
+def cjk_ratio(text: str) -> float:
+    """
+    计算文本中中文字符占（中文字符 + 英文字母）的比例
+
+    Args:
+        text: 待检测文本
+
+    Returns:
+        0-1 之间的比例；没有任何字母和中文时返回 1.0
+    """
+    cjk = len(CJK_PATTERN.findall(text))
+    latin = len(LATIN_LETTER_PATTERN.findall(text))
+    if cjk + latin == 0:
+        return 1.0
+    return cjk / (cjk + latin)
+
+
+@dataclass
+class SegmentIssue:
+    """单个片段的问题"""
+    index: int  # 片段在输入列表（或块列表）中的下标
+    reasons: List[str] = field(default_factory=list)
+
+
+@dataclass
+class IntegrityReport:
+    """结构完整性检查结果"""
+    segment_count: int = 0
+    issues: List[SegmentIssue] = field(default_factory=list)
+    cjk_coverage: float = 1.0  # 译文中文覆盖达标的片段比例
+
+    @property
+    def clean(self) -> bool:
+        return not self.issues
+
+    @property
+    def flagged_indices(self) -> List[int]:
+        return [issue.index for issue in self.issues]
+
+    def describe(self, limit: int = 20) -> str:
+        """生成可作为“遗漏内容”传给重译流程的中文描述"""
+        if self.clean:
+            return "无"
+        lines = [
+            f"片段{issue.index}: {'；'.join(issue.reasons)}"
+            for issue in self.issues[:limit]
+        ]
+        if len(self.issues) > limit:
+            lines.append(f"……另有 {len(self.issues) - limit} 个片段存在问题")
+        return '\n'.join(lines)
+
+    def to_dict(self) -> Dict:
+        return {
+            "clean": self.clean,
+            "segment_count": self.segment_count,
+            "cjk_coverage": round(self.cjk_coverage, 4),
+            "issues": {issue.index: issue.reasons for issue in self.issues}
+        }
+
+
+class StructuralIntegrityChecker:
+    """
+    本地结构完整性检查器
+
+    对每个片段比较标题、列表项、代码围栏、指令等结构标记的数量，
+    检查行内代码、链接、数字、标识符、RST 角色是否原样保留，
+    并计算译文的中文覆盖率。纯正则实现，不调用 LLM。
+    """
+
+    HEADING_PATTERN = re.compile(r'^#{1,6}\s+\S', re.MULTILINE)
+    LIST_ITEM_PATTERN = re.compile(r'^\s*(?:[-*+]|\d+\.|\w\))\s+\S', re.MULTILINE)
+    CODE_FENCE_PATTERN = re.compile(r'^\s*```', re.MULTILINE)
+    DIRECTIVE_PATTERN = re.compile(r'^\s*\.\.\s+[\w:-]+::', re.MULTILINE)
+    ROLE_PATTERN = re.compile(r':[\w\-]+(?::[\w\-]+)?:`[^`]+`')
+    INLINE_LITERAL_PATTERN = re.compile(r'``[^`]+``|(?<![`:])`[^`]+`(?!`|_)')
+    URL_PATTERN = re.compile(r'https?://[^\s<>()\[\]`\'"]+[^\s<>()\[\]`\'".,;:!?]')
+    NUMBER_PATTERN = re.compile(r'(?<![\w.])\d+(?:\.\d+)*(?![\w])')
+    IDENTIFIER_PATTERN = re.compile(
+        r'\b(?:[A-Za-z_][A-Za-z0-9]*_[A-Za-z0-9_]*'     # snake_case / W1_SKIP_ROM
+        r'|[a-z]+[A-Z][A-Za-z0-9]*'                      # camelCase
+        r'|[A-Za-z_][A-Za-z0-9_]*\(\)'                   # func()
+        r'|[A-Za-z0-9_\-]+\.(?:h|c|rst|md|txt|py|S))\b'  # 文件名
+    )
+
+    def __init__(self, min_cjk_ratio: float = 0.2, min_source_words: int = 3):
+        """
+        初始化检查器
+
+        Args:
+            min_cjk_ratio: 译文片段的最低中文比例，低于该值视为未翻译
+            min_source_words: 原文英文单词数达到该值时才检查中文比例（跳过短标识/专有名词）
+        """
+        self.min_cjk_ratio = min_cjk_ratio
+        self.min_source_words = min_source_words
+
+    def check_blocks(self,
+                     original_blocks: List[DocumentBlock],
+                     translated_blocks: List[DocumentBlock]) -> IntegrityReport:
+        """
+        比较两组文档块
+
+        可翻译块逐个做片段检查；不可翻译块（代码、指令等）必须原样保留。
+        报告中的下标为块下标。
+        """
+        if len(original_blocks) != len(translated_blocks):
+            report = IntegrityReport(segment_count=len(original_blocks))
+            report.issues.append(SegmentIssue(
+                index=0,
+                reasons=[f"块数量不一致: 原文 {len(original_blocks)}，译文 {len(translated_blocks)}"]
+            ))
+            return report
+
+        indices = []
+        sources = []
+        translations = []
+        fixed_issues = []
+        for i, (src, tgt) in enumerate(zip(original_blocks, translated_blocks)):
+            if src.translatable and src.content.strip():
+                indices.append(i)
+                sources.append(src.content)
+                translations.append(tgt.content)
+            elif src.content != tgt.content:
+                fixed_issues.append(SegmentIssue(index=i, reasons=[f"不可翻译的 {src.type} 块被修改"]))
+
+        report = self.check_segments(sources, translations, indices)
+        report.issues = sorted(report.issues + fixed_issues, key=lambda issue: issue.index)
+        report.segment_count = len(original_blocks)
+        return report
+
+    def check_segments(self,
+                       sources: List[str],
+                       translations: List[str],
+                       indices: Optional[List[int]] = None,
+                       segment_types: Optional[List[str]] = None) -> IntegrityReport:
+        """
+        逐片段比较原文与译文
+
+        Args:
+            sources: 原文片段
+            translations: 与原文一一对应的译文片段
+            indices: 报告中使用的片段下标（默认 0..n-1）
+            segment_types: 片段类型（为 'code' 的片段不检查中文比例）
+
+        Returns:
+            检查报告
+        """
+        if indices is None:
+            indices = list(range(len(sources)))
+        report = IntegrityReport(segment_count=len(sources))
+        covered = 0
+        checked = 0
+
+        for pos, (src, tgt) in enumerate(zip(sources, translations)):
+            reasons = self._compare_structure(src, tgt)
+            if segment_types is None or segment_types[pos] != 'code':
+                if self.needs_cjk(src):
+                    checked += 1
+                    ratio = cjk_ratio(self.strip_literals(tgt))
+                    if ratio < self.min_cjk_ratio:
+                        reasons.append(f"疑似未翻译（中文比例 {ratio:.0%}）")
+                    else:
+                        covered += 1
+            if reasons:
+                report.issues.append(SegmentIssue(index=indices[pos], reasons=reasons))
+
+        for pos in range(len(translations), len(sources)):
+            report.issues.append(SegmentIssue(index=indices[pos], reasons=["缺少译文"]))
+
+        report.cjk_coverage = covered / checked if checked else 1.0
+        return report
+
+    def needs_cjk(self, src: str) -> bool:
+        """原文是否包含足够多的英文单词，需要检查译文的中文比例"""
+        words = re.findall(r'[A-Za-z]{2,}', self.strip_literals(src))
+        return len(words) >= self.min_source_words
+
+    def strip_literals(self, text: str) -> str:
+        """去除行内代码、角色、链接、标识符等应保持原样的内容"""
+        for pattern in (self.ROLE_PATTERN, self.INLINE_LITERAL_PATTERN,
+                        self.URL_PATTERN, self.IDENTIFIER_PATTERN):
+            text = pattern.sub(' ', text)
+        return text
+
+    def _compare_structure(self, src: str, tgt: str) -> List[str]:
+        """比较单个片段的结构不变量"""
+        if FAILURE_MARKER in tgt:
+            return ["包含翻译失败标记"]
+        if src.strip() and not tgt.strip():
+            return ["译文为空"]
+
+        reasons = []
+        for name, pattern in (
+            ("标题", self.HEADING_PATTERN),
+            ("列表项", self.LIST_ITEM_PATTERN),
+            ("代码围栏", self.CODE_FENCE_PATTERN),
+            ("指令", self.DIRECTIVE_PATTERN),
+            ("RST 角色", self.ROLE_PATTERN),
+        ):
+            src_count = len(pattern.findall(src))
+            tgt_count = len(pattern.findall(tgt))
+            if src_count != tgt_count:
+                reasons.append(f"{name}数量不一致（原文 {src_count}，译文 {tgt_count}）")
+
+        for name, pattern in (
+            ("行内代码", self.INLINE_LITERAL_PATTERN),
+            ("链接", self.URL_PATTERN),
+            ("数字", self.NUMBER_PATTERN),
+            ("标识符", self.IDENTIFIER_PATTERN),
+        ):
+            missing = Counter(pattern.findall(src)) - Counter(pattern.findall(tgt))
+            if missing:
+                items = ', '.join(sorted(missing)[:5])
+                reasons.append(f"缺少{name}: {items}")
+        return reasons
@@ -0,0 +1,98 @@
+"""
+按行流式读取
+文件逐行读入、解析与分块，只在内存中保留当前位置附近的少量行
+"""
+
+from collections import deque
+from typing import Iterable, Iterator, Optional, TextIO
+
+
+def iter_lines(stream: TextIO) -> Iterator[str]:
+    """
+    逐行读取文本流，结果与 stream.read().split('\n') 一致（不含换行符；以换行结尾时最后产出一个空行）
+    """
+    ends_with_newline = True
+    for line in stream:
+        ends_with_newline = line.endswith('\n')
+        yield line[:-1] if ends_with_newline else line
+    if ends_with_newline:
+        yield ''
+
+
+class LineWindow:
+    """
+    行窗口
+
+    按下标访问行，需要时才从迭代器读取，并丢弃已处理的行，用于需要有限前瞻/回看的逐行解析器。
+    has(i) 对应 i < len(lines)，window[i] 对应 lines[i]；release(i) 表示 i 之前的行
+    （保留 keep_behind 行供回看）不再需要。
+    """
+
+    def __init__(self, lines: Iterable[str], keep_behind: int = 1):
+        self._iter = iter(lines)
+        self._buffer = deque()
+        self._base = 0  # _buffer[0] 的行号
+        self._exhausted = False
+        self.keep_behind = keep_behind
+
+    def has(self, index: int) -> bool:
+        """第 index 行是否存在（必要时从迭代器读取）"""
+        while not self._exhausted and index >= self._base + len(self._buffer):
+            try:
+                self._buffer.append(next(self._iter))
+            except StopIteration:
+                self._exhausted = True
+        return index < self._base + len(self._buffer)
+
+    def __getitem__(self, index: int) -> str:
+        offset = index - self._base
+        if 0 <= offset < len(self._buffer):
+            return self._buffer[offset]
+        if offset < 0 or not self.has(index):
+            raise IndexError(f"行 {index} 不在窗口内")
+        return self._buffer[offset]
+
+    def release(self, index: int):
+        """丢弃 index - keep_behind 之前的行"""
+        while self._buffer and self._base < index - self.keep_behind:
+            self._buffer.popleft()
+            self._base += 1
+
+
+class SourceBuffer:
+    """
+    原文缓冲
+
+    包装行迭代器：被下游读出的行同时追加到缓冲区，可按原文字符偏移（各行以 '\n' 连接）
+    取回片段；已写出的部分用 discard 丢弃，缓冲区只保留读取位置与写出位置之间的原文。
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self._iter = iter(lines)
+        self._pieces = []
+        self._base = 0  # 缓冲区开头在原文中的字符偏移
+        self._started = False
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self._iter:
+            self._pieces.append('\n' + line if self._started else line)
+            self._started = True
+            yield line
+
+    def _text(self) -> str:
+        if len(self._pieces) > 1:
+            self._pieces = [''.join(self._pieces)]
+        return self._pieces[0] if self._pieces else ''
+
+    def slice(self, start: int, end: Optional[int] = None) -> str:
+        """原文[start:end]（start 不得早于已丢弃的位置）"""
+        if start < self._base:
+            raise IndexError(f"偏移 {start} 已被丢弃")
+        text = self._text()
+        return text[start - self._base:None if end is None else end - self._base]
+
+    def discard(self, upto: int):
+        """丢弃 upto 之前的原文"""
+        if upto > self._base:
+            self._pieces = [self._text()[upto - self._base:]]
+            self._base = upto
@@ -3,7 +3,7 @@ Markdown 文档处理器（基于新架构）
 """
 
 import re
-from typing import List, Dict, Tuple, Optional
+from typing import Iterator, List, Dict, Tuple, Optional
 from dataclasses import asdict
 from .document_processor import DocumentProcessor, DocumentBlock
 from .markdown_parser import MarkdownParser, Metadata
@@ -19,6 +19,12 @@ class MarkdownDocumentProcessor(DocumentProcessor):
     BLOCKQUOTE_PATTERN = re.compile(r'^>\s*(.*)$')
     HORIZONTAL_RULE_PATTERN = re.compile(r'^(\*{3,}|-{3,}|_{3,})$')
     
+    # 按行首（去掉缩进后）第一个字符分派：只对可能以该字符开头的语法做匹配
+    # （数字开头只可能是有序列表，其余未列出的字符只可能是段落）
+    _FENCE, _HEADING, _RULE, _LIST, _QUOTE = 1, 2, 4, 8, 16
+    LINE_DISPATCH = {'`': _FENCE, '#': _HEADING, '>': _QUOTE,
+                     '*': _RULE | _LIST, '-': _RULE | _LIST, '_': _RULE, '+': _LIST}
+    
     def __init__(self):
         self.in_code_block = False
         self.code_language = None
@@ -26,22 +32,26 @@ class MarkdownDocumentProcessor(DocumentProcessor):
         self._metadata_parser = MarkdownParser()
     
     def parse(self, content: str) -> List[DocumentBlock]:
-        """解析 Markdown 文档为块"""
+        """解析 Markdown 文档为块（每行只去一次首尾空白，再按行首字符分派）"""
         blocks = []
-        lines = content.split('\n')
-        i = 0
+        append = blocks.append
+        dispatch = self.LINE_DISPATCH
         
-        while i < len(lines):
-            line = lines[i]
+        for line in content.split('\n'):
+            stripped = line.strip()
+            head = stripped[:1]
+            kinds = dispatch.get(head, 0)
+            if not kinds and head.isdecimal():
+                kinds = self._LIST
             
             # 检测代码围栏
-            fence_match = self.CODE_FENCE_PATTERN.match(line.strip())
+            fence_match = self.CODE_FENCE_PATTERN.match(stripped) if kinds & self._FENCE else None
             if fence_match:
                 if not self.in_code_block:
                     # 开始代码块
                     self.in_code_block = True
                     self.code_language = fence_match.group(1)
-                    blocks.append(DocumentBlock(
+                    append(DocumentBlock(
                         type='code_fence_start',
                         content=line,
                         translatable=False,
@@ -50,92 +60,84 @@ class MarkdownDocumentProcessor(DocumentProcessor):
                 else:
                     # 结束代码块
                     self.in_code_block = False
-                    blocks.append(DocumentBlock(
+                    append(DocumentBlock(
                         type='code_fence_end',
                         content=line,
                         translatable=False
                     ))
                     self.code_language = None
-                i += 1
                 continue
             
             # 代码块内容
             if self.in_code_block:
-                blocks.append(DocumentBlock(
+                append(DocumentBlock(
                     type='code',
                     content=line,
                     translatable=False
                 ))
-                i += 1
                 continue
             
             # 检测标题
-            heading_match = self.HEADING_PATTERN.match(line)
+            heading_match = self.HEADING_PATTERN.match(line) if kinds & self._HEADING else None
             if heading_match:
                 hashes, title = heading_match.groups()
                 level = len(hashes)
-                blocks.append(DocumentBlock(
+                append(DocumentBlock(
                     type='heading',
                     content=line,
                     translatable=True,
                     metadata={'level': level, 'hashes': hashes, 'title': title}
                 ))
-                i += 1
                 continue
             
             # 检测水平分隔线
-            if self.HORIZONTAL_RULE_PATTERN.match(line.strip()):
-                blocks.append(DocumentBlock(
+            if kinds & self._RULE and self.HORIZONTAL_RULE_PATTERN.match(stripped):
+                append(DocumentBlock(
                     type='horizontal_rule',
                     content=line,
                     translatable=False
                 ))
-                i += 1
                 continue
             
             # 检测列表项
-            list_match = self.LIST_PATTERN.match(line)
+            list_match = self.LIST_PATTERN.match(line) if kinds & self._LIST else None
             if list_match:
                 indent, marker, text = list_match.groups()
-                blocks.append(DocumentBlock(
+                append(DocumentBlock(
                     type='list_item',
                     content=line,
                     translatable=True,
                     metadata={'indent': len(indent), 'marker': marker, 'text': text}
                 ))
-                i += 1
                 continue
             
             # 检测引用块
-            quote_match = self.BLOCKQUOTE_PATTERN.match(line)
+            quote_match = self.BLOCKQUOTE_PATTERN.match(line) if kinds & self._QUOTE else None
             if quote_match:
                 text = quote_match.group(1)
-                blocks.append(DocumentBlock(
+                append(DocumentBlock(
                     type='blockquote',
                     content=line,
                     translatable=True,
                     metadata={'text': text}
                 ))
-                i += 1
                 continue
             
             # 空行
-            if not line.strip():
-                blocks.append(DocumentBlock(
+            if not stripped:
+                append(DocumentBlock(
                     type='blank',
                     content=line,
                     translatable=False
                 ))
-                i += 1
                 continue
             
             # 普通段落
-            blocks.append(DocumentBlock(
+            append(DocumentBlock(
                 type='paragraph',
                 content=line,
                 translatable=True
             ))
-            i += 1
         
         return blocks
     
@@ -159,25 +161,29 @@ class MarkdownDocumentProcessor(DocumentProcessor):
         
         return '\n'.join(lines)
     
-    def get_translatable_content(self, blocks: List[DocumentBlock]) -> str:
-        """提取所有可翻译的内容"""
-        translatable_texts = []
+    def iter_translatable(self, blocks: List[DocumentBlock]) -> Iterator[Tuple[int, DocumentBlock, str]]:
+        """
+        逐个产出可翻译块 (块下标, 块, 可翻译文本)，每块一行
         
-        for block in blocks:
+        分块器据此直接按文档块分块（MarkdownChunker.chunk_blocks），不必再解析一遍可翻译内容。
+        """
+        for i, block in enumerate(blocks):
             if block.translatable and block.content.strip():
                 # 对于标题，提取标题文本
                 if block.type == 'heading' and 'title' in block.metadata:
-                    translatable_texts.append(block.metadata['title'])
+                    yield i, block, block.metadata['title']
                 # 对于列表项，提取文本部分
                 elif block.type == 'list_item' and 'text' in block.metadata:
-                    translatable_texts.append(block.metadata['text'])
+                    yield i, block, block.metadata['text']
                 # 对于引用，提取文本部分
                 elif block.type == 'blockquote' and 'text' in block.metadata:
-                    translatable_texts.append(block.metadata['text'])
+                    yield i, block, block.metadata['text']
                 else:
-                    translatable_texts.append(block.content.strip())
-        
-        return '\n'.join(translatable_texts)
+                    yield i, block, block.content.strip()
+    
+    def get_translatable_content(self, blocks: List[DocumentBlock]) -> str:
+        """提取所有可翻译的内容"""
+        return '\n'.join(text for _, _, text in self.iter_translatable(blocks))
     
     def extract_metadata(self, content: str) -> Tuple[Optional[Dict], str]:
         """提取 YAML front matter，委托给 MarkdownParser。
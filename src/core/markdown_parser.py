@@ -19,6 +19,7 @@ class Metadata:
     translator: str = "FILL_YOUR_GITHUB_ID_HERE"
     translating_date: str = ""
     link: str = "FILL_THE_LINK_HERE"
+    verification: str = ""  # verify-later 模式下的校验状态（pending/verified/refined），为空时不输出
     
     def __post_init__(self):
         if not self.collected_date:
@@ -77,6 +78,8 @@ class MarkdownParser:
 
         metadata_lines = []
         for key, value in asdict(metadata).items():
+            if key == "verification" and not value:
+                continue
             metadata_lines.append(f"{key}: {value}")
         
         metadata_section = "---\n" + "\n".join(metadata_lines) + "\n---\n"
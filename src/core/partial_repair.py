@@ -0,0 +1,125 @@
+"""
+部分翻译结果修复
+将原文与（中断后残留的）译文按块对齐，找出仍为英文、带失败标记或缺失的片段
+"""
+
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Dict, Hashable, List, Optional
+
+from .batch_anomaly import cjk_ratios
+from .document_processor import DocumentBlock
+from .integrity_checker import StructuralIntegrityChecker, FAILURE_MARKER
+
+
+def align_blocks(source_blocks: List[DocumentBlock],
+                 translated_blocks: List[DocumentBlock]) -> List[Optional[str]]:
+    """
+    将译文块对齐到原文块
+
+    不可翻译块（代码、空行、指令、下划线等）按内容匹配作为锚点，可翻译块按类型匹配；
+    锚点之间块数不一致时按顺序配对，多出的译文行并入最后一个配对的块。
+
+    Returns:
+        与 source_blocks 等长的列表：可翻译块为对齐到的译文（缺失时为 None），
+        不可翻译块为原文内容
+    """
+    def key(block: DocumentBlock):
+        return (block.type,) if block.translatable else (block.type, block.content)
+
+    aligned: List[Optional[str]] = [
+        None if block.translatable else block.content for block in source_blocks
+    ]
+    matcher = SequenceMatcher(
+        None, [key(b) for b in source_blocks], [key(b) for b in translated_blocks], autojunk=False
+    )
+    last_paired = None
+    for _, i1, i2, j1, j2 in matcher.get_opcodes():
+        sources = [i for i in range(i1, i2) if source_blocks[i].translatable]
+        targets = [translated_blocks[j].content for j in range(j1, j2) if translated_blocks[j].translatable]
+        for i, text in zip(sources, targets):
+            aligned[i] = text
+            last_paired = i
+        extra = targets[len(sources):]
+        if extra and last_paired is not None:
+            aligned[last_paired] = '\n'.join([aligned[last_paired]] + extra)
+    return aligned
+
+
+@dataclass
+class RepairReport:
+    """待修复片段的检测结果"""
+    segment_count: int = 0
+    targets: Dict[Hashable, Dict[int, str]] = field(default_factory=dict)  # 文档ID -> {块下标: 原因}
+
+    @property
+    def target_count(self) -> int:
+        return sum(len(blocks) for blocks in self.targets.values())
+
+    def to_dict(self) -> Dict:
+        reasons: Dict[str, int] = {}
+        for blocks in self.targets.values():
+            for reason in blocks.values():
+                reasons[reason] = reasons.get(reason, 0) + 1
+        return {
+            "segment_count": self.segment_count,
+            "target_count": self.target_count,
+            "reasons": reasons
+        }
+
+
+class PartialTranslationScanner:
+    """
+    部分翻译检测器
+
+    先用 add_document 收集整批文档的对齐结果，再由 detect 一次性向量化计算所有
+    译文片段的中文比例：缺失、带失败标记或中文比例过低（原文有足够英文单词时）的
+    片段被标记为待修复，其余片段保持不动。
+    """
+
+    def __init__(self, min_cjk_ratio: float = 0.2,
+                 checker: Optional[StructuralIntegrityChecker] = None):
+        """
+        初始化检测器
+
+        Args:
+            min_cjk_ratio: 译文最低中文比例，低于该值视为仍未翻译
+            checker: 用于判断原文是否需要检查中文比例、剥离行内代码等的结构检查器
+        """
+        self.min_cjk_ratio = min_cjk_ratio
+        self.checker = checker or StructuralIntegrityChecker(min_cjk_ratio=min_cjk_ratio)
+        self._doc_ids: List[Hashable] = []
+        self._refs: List[tuple] = []  # (文档位置, 块下标)
+        self._texts: List[str] = []
+        self._segment_count = 0
+        self._fixed: Dict[Hashable, Dict[int, str]] = {}
+
+    def add_document(self, doc_id: Hashable,
+                     source_blocks: List[DocumentBlock],
+                     aligned: List[Optional[str]]):
+        """收集一个文档的可翻译片段（aligned 为 align_blocks 的结果）"""
+        doc_pos = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        for i, (block, text) in enumerate(zip(source_blocks, aligned)):
+            if not block.translatable or not block.content.strip():
+                continue
+            self._segment_count += 1
+            if text is None or not text.strip():
+                self._fixed.setdefault(doc_id, {})[i] = "missing"
+            elif FAILURE_MARKER in text:
+                self._fixed.setdefault(doc_id, {})[i] = "failure_marker"
+            elif self.checker.needs_cjk(block.content):
+                self._refs.append((doc_pos, i))
+                self._texts.append(self.checker.strip_literals(text))
+
+    def detect(self) -> RepairReport:
+        """对已收集的所有片段做一次中文比例检测"""
+        report = RepairReport(segment_count=self._segment_count)
+        for doc_id, blocks in self._fixed.items():
+            report.targets[doc_id] = dict(blocks)
+        ratios = cjk_ratios(self._texts)
+        for (doc_pos, i), ratio in zip(self._refs, ratios):
+            if ratio < self.min_cjk_ratio:
+                report.targets.setdefault(self._doc_ids[doc_pos], {})[i] = "untranslated"
+        report.targets = {doc_id: dict(sorted(blocks.items())) for doc_id, blocks in report.targets.items()}
+        return report
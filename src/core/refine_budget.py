@@ -0,0 +1,190 @@
+"""
+重译预算控制
+按文件和整批的 token 预算、历史收益和评分走势决定是否继续重译，并记录停止原因
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class RefineTracker:
+    """单个文件的重译记录"""
+    budget: "RefineBudget"
+    rounds: List[Dict] = field(default_factory=list)
+    tokens_spent: int = 0
+    stop_reason: str = ""
+
+    def should_refine(self, score: int, has_missing: bool, threshold: int,
+                      estimated_tokens: int, mode: str = "targeted") -> bool:
+        """
+        判断是否进行下一轮重译；不进行时记录停止原因
+
+        Args:
+            score: 当前完整性评分
+            has_missing: 校验是否报告了遗漏内容
+            threshold: 触发重译的评分阈值
+            estimated_tokens: 本轮重译（含复查）的预估 token 数
+            mode: 重译方式，用于查询历史收益
+        """
+        reason = self.budget.check(self, score, has_missing, threshold, estimated_tokens, mode)
+        if reason:
+            self.stop_reason = reason
+            return False
+        return True
+
+    def record(self, mode: str, tokens: int, score_before: int, score_after: int):
+        """记录一轮重译的（预估）花费与评分变化"""
+        self.rounds.append({
+            "mode": mode,
+            "tokens": tokens,
+            "score_before": score_before,
+            "score_after": score_after
+        })
+        self.tokens_spent += tokens
+        self.budget.record(mode, tokens, score_after - score_before)
+
+    def stop(self, reason: str):
+        """记录其他停止原因（如重译未产生改动）"""
+        self.stop_reason = reason
+
+    def to_dict(self) -> Dict:
+        return {
+            "rounds": self.rounds,
+            "tokens_spent": self.tokens_spent,
+            "stop_reason": self.stop_reason or "max_rounds"
+        }
+
+
+class RefineBudget:
+    """
+    重译预算控制器
+
+    - 单文件与整批累计的预估 token 花费不超过预算
+    - 某种重译方式的历史平均收益（评分提升）过低时不再尝试
+    - 上一轮重译的评分提升不足 min_gain 时停止（平台期）
+    - 每个文件最多 max_rounds 轮
+
+    指定 history_file 时历史收益会落盘，供后续运行参考。
+    """
+
+    def __init__(self,
+                 file_token_budget: Optional[int] = 20000,
+                 batch_token_budget: Optional[int] = None,
+                 max_rounds: int = 2,
+                 min_gain: int = 1,
+                 min_history: int = 5,
+                 history_file: Optional[str] = None,
+                 token_counter: Optional[Callable[[str], int]] = None):
+        """
+        初始化预算控制器
+
+        Args:
+            file_token_budget: 单个文件的重译 token 预算（None 表示不限）
+            batch_token_budget: 整批（本实例生命周期内）的重译 token 预算（None 表示不限）
+            max_rounds: 单个文件最多重译轮数
+            min_gain: 一轮重译至少应带来的评分提升
+            min_history: 历史样本数达到该值后才按历史收益跳过重译
+            history_file: 历史收益的落盘路径（可选）
+            token_counter: token 计数函数（默认按字符数粗略估计）
+        """
+        self.file_token_budget = file_token_budget
+        self.batch_token_budget = batch_token_budget
+        self.max_rounds = max_rounds
+        self.min_gain = min_gain
+        self.min_history = min_history
+        self.history_file = Path(history_file) if history_file else None
+        self.token_counter = token_counter or (lambda text: len(text) // 3)
+        self.batch_spent = 0
+        self._lock = threading.Lock()
+        self._history: Dict[str, List[int]] = self._load_history()
+
+    def begin_file(self) -> RefineTracker:
+        """开始一个文件的重译记录"""
+        return RefineTracker(budget=self)
+
+    def estimate(self, refine_texts: List[str], verify_texts: List[str]) -> int:
+        """
+        预估一轮重译的 token 花费：重译片段的输入与输出约为其长度的两倍，再加一次复查的输入
+        """
+        refine_tokens = sum(self.token_counter(t) for t in refine_texts)
+        verify_tokens = sum(self.token_counter(t) for t in verify_texts)
+        return 2 * refine_tokens + verify_tokens
+
+    def expected_gain(self, mode: str) -> Optional[float]:
+        """某种重译方式最近的平均评分提升；样本不足时返回 None"""
+        with self._lock:
+            gains = self._history.get(mode, [])[-20:]
+        if len(gains) < self.min_history:
+            return None
+        return sum(gains) / len(gains)
+
+    def check(self, tracker: RefineTracker, score: int, has_missing: bool,
+              threshold: int, estimated_tokens: int, mode: str) -> str:
+        """返回停止原因；可以继续时返回空字符串"""
+        if score >= threshold and not has_missing:
+            return "passed" if tracker.rounds else "not_needed"
+        if tracker.rounds:
+            last = tracker.rounds[-1]
+            if last["score_after"] - last["score_before"] < self.min_gain:
+                return "plateau"
+        if len(tracker.rounds) >= self.max_rounds:
+            return "max_rounds"
+        if self.file_token_budget is not None and \
+                tracker.tokens_spent + estimated_tokens > self.file_token_budget:
+            return "file_budget"
+        with self._lock:
+            batch_spent = self.batch_spent
+        if self.batch_token_budget is not None and batch_spent + estimated_tokens > self.batch_token_budget:
+            return "batch_budget"
+        gain = self.expected_gain(mode)
+        if gain is not None and gain < self.min_gain:
+            return "low_expected_gain"
+        return ""
+
+    def record(self, mode: str, tokens: int, gain: int):
+        """累计整批花费并记录收益"""
+        with self._lock:
+            self.batch_spent += tokens
+            self._history.setdefault(mode, []).append(gain)
+            self._history[mode] = self._history[mode][-100:]
+            history = {k: list(v) for k, v in self._history.items()}
+        self._save_history(history)
+
+    def get_stats(self) -> Dict:
+        """整批统计"""
+        with self._lock:
+            return {
+                "batch_tokens_spent": self.batch_spent,
+                "batch_token_budget": self.batch_token_budget,
+                "expected_gain": {
+                    mode: round(sum(g[-20:]) / len(g[-20:]), 2) for mode, g in self._history.items() if g
+                }
+            }
+
+    def _load_history(self) -> Dict[str, List[int]]:
+        if not self.history_file or not self.history_file.exists():
+            return {}
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {str(k): [int(g) for g in v] for k, v in data.items()}
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"读取重译历史失败 {self.history_file}: {e}")
+            return {}
+
+    def _save_history(self, history: Dict[str, List[int]]):
+        if not self.history_file:
+            return
+        try:
+            self.history_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.history_file.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(history, f)
+            os.replace(tmp_path, self.history_file)
+        except OSError as e:
+            print(f"写入重译历史失败 {self.history_file}: {e}")
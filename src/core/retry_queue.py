@@ -0,0 +1,102 @@
+"""
+失败单元的延迟重试队列
+翻译失败的块先记入队列，其余块继续翻译；文件结束时按指数退避统一重试
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Tuple
+
+from .text_chunker import TextChunk
+
+
+@dataclass
+class RetryItem:
+    """待重试的翻译单元"""
+    key: Hashable  # 单元在文件中的位置（块下标）
+    chunk: TextChunk
+    attempts: int = 1
+    last_error: str = ""
+
+
+class RetryQueue:
+    """
+    延迟重试队列
+
+    drain 按轮次重试：每轮前等待 base_delay * 2^(轮次-1)（带随机抖动，不超过 max_delay），
+    本轮所有剩余单元并行重试，成功的移出队列，直到全部成功或达到 max_attempts。
+    """
+
+    def __init__(self,
+                 max_attempts: int = 3,
+                 base_delay: float = 2.0,
+                 max_delay: float = 30.0,
+                 max_workers: int = 4):
+        """
+        初始化重试队列
+
+        Args:
+            max_attempts: 每个单元的最大尝试次数（含首次）
+            base_delay: 第一轮重试前的等待秒数
+            max_delay: 单轮等待的上限秒数
+            max_workers: 每轮并行重试的线程数
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_workers = max(1, max_workers)
+        self._items: Dict[Hashable, RetryItem] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, key: Hashable, chunk: TextChunk, error: Exception):
+        """记录一个首次翻译失败的单元"""
+        self._items[key] = RetryItem(key=key, chunk=chunk, last_error=str(error))
+
+    def drain(self, translate: Callable[[TextChunk], str]) -> Tuple[Dict[Hashable, str], List[Dict]]:
+        """
+        重试队列中的所有单元
+
+        Args:
+            translate: 翻译函数，失败时抛出异常
+
+        Returns:
+            (重试成功的 {key: 译文}, 仍然失败的单元列表)
+        """
+        succeeded: Dict[Hashable, str] = {}
+        round_no = 0
+        while self._items:
+            pending = [item for item in self._items.values() if item.attempts < self.max_attempts]
+            if not pending:
+                break
+            round_no += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (round_no - 1))
+            delay *= random.uniform(0.5, 1.0)
+            print(f"第 {round_no} 轮重试 {len(pending)} 个失败单元（等待 {delay:.1f} 秒）")
+            time.sleep(delay)
+
+            def attempt(item: RetryItem):
+                try:
+                    return item, translate(item.chunk), None
+                except Exception as e:
+                    return item, None, e
+
+            workers = min(self.max_workers, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for item, result, error in executor.map(attempt, pending):
+                    item.attempts += 1
+                    if error is None:
+                        succeeded[item.key] = result
+                        del self._items[item.key]
+                    else:
+                        item.last_error = str(error)
+
+        failed = [
+            {"index": item.key, "attempts": item.attempts, "error": item.last_error}
+            for item in self._items.values()
+        ]
+        self._items = {}
+        return succeeded, failed
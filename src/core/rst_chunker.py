@@ -0,0 +1,400 @@
+"""
+RST 分块
+按 reStructuredText 结构切分，供整篇分块翻译使用（与 Markdown 共用打包、并行翻译与区间拼接）
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .rst_processor import RSTProcessor
+from .text_chunker import MarkdownChunker, TextChunk
+
+
+# 节标题的上划线/下划线（同一标点字符重复，从行首开始）
+ADORNMENT_PATTERN = re.compile('^([' + re.escape(RSTProcessor.TITLE_CHARS) + r'])\1+\s*$')
+# 显式标记：指令、注释、脚注、超链接目标、替换定义
+EXPLICIT_MARKUP_PATTERN = re.compile(r'^\s*\.\.(\s|$)')
+# 无序列表与有序列表项（1. / a) / (iv) / #.）
+_ENUMERATOR = r'(?:\d+|#|[a-zA-Z]|[ivxlcdmIVXLCDM]+)'
+LIST_ITEM_PATTERN = re.compile(r'^\s*(?:[-*+•‣⁃]|' + _ENUMERATOR + r'[.)]|\(' + _ENUMERATOR + r'\))(\s|$)')
+# 字段列表项 :name: body
+FIELD_PATTERN = re.compile(r'^\s*:(?![\s:])[^:]*(?<!\s):(\s|$)')
+# 网格表格与简单表格的边框行
+TABLE_BORDER_PATTERN = re.compile(r'^\s*(\+[-=+]+\+|=+( +=+)+)\s*$')
+# 简单表格中的边框行与跨列下划线
+SIMPLE_TABLE_RULE_PATTERN = re.compile(r'^\s*[-=]+( +[-=]+)*\s*$')
+# 网格表格的边框行（不含合并单元格）与内容行
+GRID_BORDER_PATTERN = re.compile(r'^(\s*)\+(?:[-=]+\+)+\s*$')
+GRID_ROW_PATTERN = re.compile(r'^\s*\|.*\|\s*$')
+
+
+@dataclass
+class _TextBlock:
+    """连续的非空行（gap 为其前面的空行）"""
+    start_line: int
+    start_pos: int
+    lines: List[str]
+    gap: List[str] = field(default_factory=list)
+
+    @property
+    def indent(self) -> int:
+        first = self.lines[0]
+        return len(first) - len(first.lstrip())
+
+    def take(self, count: int) -> Tuple["_TextBlock", Optional["_TextBlock"]]:
+        """拆出前 count 行，返回 (前半, 剩余部分)"""
+        if count >= len(self.lines):
+            return self, None
+        head = _TextBlock(self.start_line, self.start_pos, self.lines[:count], self.gap)
+        rest_pos = self.start_pos + sum(len(line) + 1 for line in head.lines)
+        return head, _TextBlock(self.start_line + count, rest_pos, self.lines[count:])
+
+
+class RSTChunker(MarkdownChunker):
+    """
+    RST 分块
+
+    节标题（连同上下划线）单独成块；列表、字段列表、引用连同其缩进续行（可跨空行）为一个块；
+    简单表格最后一列的每个单元格单独成块，网格表格整体为一个块（译文按单元格宽度重排）；
+    指令等显式标记及其缩进内容、`::` 之后的文字块、表格的边框与其余列、分隔线原样保留，
+    不翻译，打包时也不跨越它们。
+    token 预算、保序打包与按区间拼接回原文与 MarkdownChunker 相同。
+    """
+
+    passthrough_types = ('directive', 'literal', 'table', 'transition')
+    unsplit_types = ('code', 'grid_table')
+
+    def iter_structure(self, lines: Iterable[str]) -> Iterator[TextChunk]:
+        """
+        逐行读取（行不含换行符），按 RST 结构产出块（区间不含块尾空行）
+
+        容器块（列表、字段列表、引用）在遇到缩进不足的块时闭合；其中嵌套的指令或文字块
+        会先闭合容器，再作为原样保留的块产出。
+        """
+        styles: List[Tuple[str, bool]] = []  # 标题样式按出现顺序决定级别
+        open_kind = None  # 当前未闭合的块类型
+        open_blocks: List[_TextBlock] = []
+        open_indent = 0  # 容器的标记缩进 / 原样保留块的基准缩进
+        literal_indent: Optional[int] = None  # 上一段以 :: 结尾时的缩进，更深缩进的块为文字块
+
+        for block in self._iter_text_blocks(lines):
+            # 指令内容、文字块：缩进更深的块都属于它（紧跟其后、未缩进的行不属于它）
+            if open_kind in self.passthrough_types:
+                if block.indent > open_indent:
+                    body, block = block.take(self._indented_lines(block.lines, open_indent))
+                    open_blocks.append(body)
+                    if block is None:
+                        continue
+                yield self._make_chunk(open_blocks, open_kind)
+                open_kind = None
+
+            if open_kind is not None:
+                last_line = open_blocks[-1].lines[-1]
+                base = self._literal_base(open_blocks[-1])
+                nested_literal = last_line.rstrip().endswith('::') and block.indent > base
+                if nested_literal or (EXPLICIT_MARKUP_PATTERN.match(block.lines[0]) and block.indent > open_indent):
+                    # 容器中嵌套的文字块或指令：容器到此为止
+                    yield self._make_chunk(open_blocks, open_kind)
+                    open_kind = 'literal' if nested_literal else 'directive'
+                    open_indent = base if nested_literal else block.indent
+                    open_blocks = [block]
+                    continue
+                if self._continues(open_kind, open_indent, block):
+                    open_blocks.append(block)
+                    continue
+                yield self._make_chunk(open_blocks, open_kind)
+                open_kind = None
+
+            if literal_indent is not None:
+                indent, literal_indent = literal_indent, None
+                if block.indent > indent:
+                    open_kind, open_indent, open_blocks = 'literal', indent, [block]
+                    continue
+
+            while block is not None:
+                title_lines = self._title_lines(block.lines)
+                if title_lines:
+                    title, block = block.take(title_lines)
+                    yield self._make_chunk([title], 'heading', self._title_level(styles, title.lines))
+                    continue
+
+                first = block.lines[0]
+                stripped = first.strip()
+                if EXPLICIT_MARKUP_PATTERN.match(first) or stripped == '::':
+                    open_kind = 'directive' if stripped != '::' else 'literal'
+                    open_indent = block.indent
+                    head, block = block.take(1 + self._indented_lines(block.lines[1:], open_indent))
+                    open_blocks = [head]
+                    if block is not None:
+                        yield self._make_chunk(open_blocks, open_kind)
+                        open_kind = None
+                    continue
+                if len(block.lines) == 1 and len(stripped) >= 4 and ADORNMENT_PATTERN.match(first):
+                    yield self._make_chunk([block], 'transition')
+                elif GRID_BORDER_PATTERN.match(first):
+                    yield self._make_chunk([block], 'grid_table')
+                elif TABLE_BORDER_PATTERN.match(first):
+                    yield from self._simple_table_chunks(block)
+                elif LIST_ITEM_PATTERN.match(first):
+                    open_kind, open_indent, open_blocks = 'list', block.indent, [block]
+                elif FIELD_PATTERN.match(first):
+                    open_kind, open_indent, open_blocks = 'field_list', block.indent, [block]
+                elif block.indent > 0:
+                    open_kind, open_indent, open_blocks = 'quote', block.indent, [block]
+                else:
+                    yield self._make_chunk([block], 'paragraph')
+                    if block.lines[-1].rstrip().endswith('::'):
+                        literal_indent = self._literal_base(block)
+                block = None
+
+        if open_kind is not None:
+            yield self._make_chunk(open_blocks, open_kind)
+
+    @staticmethod
+    def _iter_text_blocks(lines: Iterable[str]) -> Iterator[_TextBlock]:
+        """按空行把行分成连续的非空行块，同时累加行号与字符偏移"""
+        current: Optional[_TextBlock] = None
+        gap: List[str] = []
+        offset = 0
+        for i, line in enumerate(lines):
+            if line.strip():
+                if current is None:
+                    current = _TextBlock(i, offset, [], gap)
+                    gap = []
+                current.lines.append(line)
+            else:
+                if current is not None:
+                    yield current
+                    current = None
+                gap.append(line)
+            offset += len(line) + 1
+        if current is not None:
+            yield current
+
+    @staticmethod
+    def _simple_table_chunks(block: _TextBlock) -> Iterator[TextChunk]:
+        """
+        简单表格：最后一列每行的单元格文字（连同其续行）为一个 table_cell 块，
+        其间的边框行与其余各列为原样保留的 table 块，因此各单元格分别请求、不与表格外的正文合并
+
+        最后一列没有右边界，译文合成一行写回后表格仍然合法（见 SINGLE_LINE_TYPES）；
+        第一列为空的行是上一行的续行。
+        """
+        text = '\n'.join(block.lines)
+        border = block.lines[0].expandtabs().rstrip()
+        last_column = border.rfind(' ') + 1
+        rows: List[List[Tuple[int, int]]] = []  # 每个单元格的 [(起点, 终点)]，相对 text
+        offset = 0
+        continued = False
+        for line in block.lines:
+            start, offset = offset, offset + len(line) + 1
+            if SIMPLE_TABLE_RULE_PATTERN.match(line):
+                continued = False
+                continue
+            split = RSTChunker._column_offset(line, last_column)
+            if not continued or line[:split].strip():
+                rows.append([])
+            continued = True
+            cell = line[split:]
+            if cell.strip():
+                rows[-1].append((start + split + len(cell) - len(cell.lstrip()), start + len(line.rstrip())))
+
+        def piece(start: int, end: int, chunk_type: str) -> TextChunk:
+            start_line = block.start_line + text.count('\n', 0, start)
+            return TextChunk(
+                content=text[start:end],
+                chunk_type=chunk_type,
+                start_pos=block.start_pos + start,
+                end_pos=block.start_pos + end,
+                start_line=start_line,
+                end_line=start_line + text.count('\n', start, end) + 1
+            )
+
+        cursor = 0
+        for cell in rows:
+            if not cell:
+                continue
+            yield piece(cursor, cell[0][0], 'table')
+            yield piece(cell[0][0], cell[-1][1], 'table_cell')
+            cursor = cell[-1][1]
+        yield piece(cursor, len(text), 'table')
+
+    @staticmethod
+    def _column_offset(line: str, column: int) -> int:
+        """显示列 column 在行内的字符下标（制表符按 8 列对齐展开，与 docutils 相同）"""
+        if '\t' not in line:
+            return min(column, len(line))
+        width = 0
+        for i, char in enumerate(line):
+            if width >= column:
+                return i
+            width = (width // 8 + 1) * 8 if char == '\t' else width + 1
+        return len(line)
+
+    @staticmethod
+    def _indented_lines(lines: List[str], indent: int) -> int:
+        """开头连续的缩进深于 indent 的行数"""
+        for k, line in enumerate(lines):
+            if len(line) - len(line.lstrip()) <= indent:
+                return k
+        return len(lines)
+
+    @staticmethod
+    def _literal_base(block: _TextBlock) -> int:
+        """以 :: 结尾的段落的正文缩进，缩进比它更深的后续块是文字块（列表项/字段按标记后的正文列计算）"""
+        last = block.lines[-1]
+        marker = LIST_ITEM_PATTERN.match(last) or FIELD_PATTERN.match(last)
+        if marker:
+            body = last[marker.end():]
+            return len(last) - len(body.lstrip())
+        return len(last) - len(last.lstrip())
+
+    @staticmethod
+    def _continues(kind: str, indent: int, block: _TextBlock) -> bool:
+        """block 是否属于当前容器：缩进更深的续行，或同一缩进的下一个列表项/字段"""
+        if kind == 'quote':
+            return block.indent >= indent
+        if block.indent > indent:
+            return True
+        pattern = LIST_ITEM_PATTERN if kind == 'list' else FIELD_PATTERN
+        return block.indent == indent and bool(pattern.match(block.lines[0]))
+
+    @staticmethod
+    def _title_lines(lines: List[str]) -> int:
+        """行块开头的节标题行数（带上划线为 3，仅下划线为 2，不是标题为 0）"""
+        if (len(lines) >= 3 and ADORNMENT_PATTERN.match(lines[0]) and ADORNMENT_PATTERN.match(lines[2])
+                and not ADORNMENT_PATTERN.match(lines[1]) and lines[0][0] == lines[2][0]):
+            return 3
+        if len(lines) >= 2 and ADORNMENT_PATTERN.match(lines[1]) and not ADORNMENT_PATTERN.match(lines[0]):
+            text, underline = lines[0].strip(), lines[1].strip()
+            if (not lines[0][0].isspace() and not EXPLICIT_MARKUP_PATTERN.match(lines[0])
+                    and (len(underline) >= 4 or len(underline) >= len(text))):
+                return 2
+        return 0
+
+    @staticmethod
+    def _title_level(styles: List[Tuple[str, bool]], lines: List[str]) -> int:
+        """标题级别：按样式（装饰字符、是否有上划线）首次出现的顺序"""
+        style = (lines[-1][0], len(lines) == 3)
+        if style not in styles:
+            styles.append(style)
+        return styles.index(style) + 1
+
+    @staticmethod
+    def _make_chunk(blocks: List[_TextBlock], chunk_type: str, level: int = 0) -> TextChunk:
+        """由若干行块生成文本块（块间空行计入内容，首块之前的空行不计入）"""
+        lines = list(blocks[0].lines)
+        for block in blocks[1:]:
+            lines.extend(block.gap)
+            lines.extend(block.lines)
+        content = '\n'.join(lines)
+        start = blocks[0]
+        return TextChunk(
+            content=content,
+            chunk_type=chunk_type,
+            level=level,
+            start_pos=start.start_pos,
+            end_pos=start.start_pos + len(content),
+            start_line=start.start_line,
+            end_line=start.start_line + len(lines)
+        )
+
+    def flatten_table_cells(self, text: str) -> str:
+        """
+        把简单表格里跨多行的单元格合成一行，其余内容原样保留
+        
+        与译文写回后的形状一致（table_cell 属于 SINGLE_LINE_TYPES），
+        修补时用它对齐原文与译文的表格行
+        """
+        chunks = self.chunk_text(text)
+        return self.splice(text, chunks, [
+            chunk.content if chunk.chunk_type == 'table_cell' else None for chunk in chunks
+        ])
+
+    def replace_body(self, original: str, text: Optional[str], chunk_type: Optional[str] = None) -> str:
+        """替换正文，并按译文宽度修正版式（见 fit_translation）"""
+        if text is None:
+            return original
+        return self.fit_translation(MarkdownChunker.replace_body(original, text, chunk_type))
+
+    @classmethod
+    def fit_translation(cls, content: str) -> str:
+        """译文拼接后的版式修正：加长节标题的上下划线，重排网格表格"""
+        return cls.fit_grid_tables(cls.fit_title_adornments(content))
+
+    @staticmethod
+    def fit_title_adornments(content: str) -> str:
+        """
+        把短于标题显示宽度的上划线/下划线加长到标题宽度（中文字符按 2 计）
+
+        译文标题通常比原文更宽，下划线不够长时 docutils 会报错；已经足够长的装饰线保持不变。
+        """
+        lines = content.split('\n')
+        measure = RSTProcessor()._calculate_display_length
+        for i in range(1, len(lines)):
+            title = lines[i - 1]
+            if not ADORNMENT_PATTERN.match(lines[i]) or not title.strip() or ADORNMENT_PATTERN.match(title):
+                continue
+            underline = lines[i].rstrip()
+            width = measure(title.rstrip())
+            if len(underline) >= width:
+                continue
+            lines[i] = underline[0] * width
+            if i >= 2 and ADORNMENT_PATTERN.match(lines[i - 2]) and lines[i - 2][0] == underline[0]:
+                lines[i - 2] = underline[0] * max(width, len(lines[i - 2].rstrip()))
+        return '\n'.join(lines)
+
+    @classmethod
+    def fit_grid_tables(cls, content: str) -> str:
+        """
+        按单元格的显示宽度重排网格表格（中文字符按 2 计）
+
+        译文单元格与原文宽度不同，竖线对不齐时 docutils 无法解析表格。只重排没有合并单元格的表格
+        （各边框行的分段数与各内容行的单元格数相同），其余原样保留；已经够宽的列宽度不变。
+        """
+        lines = content.split('\n')
+        i = 0
+        while i < len(lines):
+            if not GRID_BORDER_PATTERN.match(lines[i]):
+                i += 1
+                continue
+            end = i + 1
+            while end < len(lines) and (GRID_BORDER_PATTERN.match(lines[end]) or GRID_ROW_PATTERN.match(lines[end])):
+                end += 1
+            lines[i:end] = cls._relayout_grid(lines[i:end])
+            i = end
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _relayout_grid(table: List[str]) -> List[str]:
+        """重排一个网格表格（首行为边框行）；不是规则表格时原样返回"""
+        measure = RSTProcessor()._calculate_display_length
+        indent = GRID_BORDER_PATTERN.match(table[0]).group(1)
+        columns = table[0].count('+') - 1
+        rows: List[Tuple[bool, List[str]]] = []  # (是否边框行, 各列的边框段或单元格文字)
+        for line in table:
+            border = bool(GRID_BORDER_PATTERN.match(line))
+            cells = line.strip()[1:-1].split('+' if border else '|')
+            if len(cells) != columns:
+                return table
+            if not border:
+                # 去掉单元格左侧的一个填充空格，更深的缩进属于单元格内容
+                cells = [(cell[1:] if cell.startswith(' ') else cell).rstrip() for cell in cells]
+            rows.append((border, cells))
+        if not rows[-1][0]:
+            return table
+
+        widths = [0] * columns
+        for border, cells in rows:
+            for k, cell in enumerate(cells):
+                widths[k] = max(widths[k], len(cell) if border else measure(cell) + 2)
+        fitted = []
+        for border, cells in rows:
+            if border:
+                fitted.append(indent + '+' + '+'.join(cell[0] * w for cell, w in zip(cells, widths)) + '+')
+            else:
+                fitted.append(indent + '|' + '|'.join(
+                    ' ' + cell + ' ' * (w - 1 - measure(cell)) for cell, w in zip(cells, widths)
+                ) + '|')
+        return fitted
@@ -3,8 +3,17 @@ reStructuredText (RST) 文档处理器
 """
 
 import re
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, NamedTuple
 from .document_processor import DocumentProcessor, DocumentBlock
+from .line_stream import LineWindow
+
+
+class _Line(NamedTuple):
+    """预先分析过的一行：行首（去掉缩进后）第一个字符、缩进宽度、是否为标题装饰线"""
+    text: str
+    head: str
+    indent: int
+    adornment: bool
 
 
 class RSTProcessor(DocumentProcessor):
@@ -19,6 +28,16 @@ class RSTProcessor(DocumentProcessor):
     # 代码块缩进模式
     CODE_INDENT_PATTERN = re.compile(r'^(\s{4,}|\t+)')
     
+    # 标题上划线/下划线：同一标题字符重复至少两次（可带首尾空白）
+    TITLE_UNDERLINE_PATTERN = re.compile(r'\s*([' + re.escape(TITLE_CHARS) + r'])\1+\s*')
+    
+    # 列表项（缩进、标记、文本）
+    LIST_PATTERN = re.compile(r'^(\s*)([-*+]|\d+\.|\w+\))\s+(.+)$')
+    
+    # 按行首第一个字符分派：只对可能以该字符开头的语法做匹配（未列出的字符只可能是列表项或段落）
+    _DIRECTIVE, _TABLE, _LIST = 1, 2, 4
+    LINE_DISPATCH = {'.': _DIRECTIVE, '=': _TABLE, '-': _TABLE | _LIST, '+': _TABLE | _LIST, '*': _LIST}
+    
     def __init__(self):
         self.in_code_block = False
         self.in_directive_block = False
@@ -26,206 +45,226 @@ class RSTProcessor(DocumentProcessor):
     
     def parse(self, content: str) -> List[DocumentBlock]:
         """解析 RST 文档为块"""
-        blocks = []
-        lines = content.split('\n')
+        return list(self.iter_parse(content.split('\n')))
+    
+    def _scan(self, source_lines: Iterable[str]) -> Iterator[_Line]:
+        """逐行做一次预分析，后续判断（包括前后行的标题装饰线）都只读取结果，不再重复 strip"""
+        title_chars = self.TITLE_CHARS
+        underline = self.TITLE_UNDERLINE_PATTERN.fullmatch
+        for text in source_lines:
+            stripped = text.lstrip()
+            head = stripped[:1]
+            yield _Line(text, head, len(text) - len(stripped),
+                        head != '' and head in title_chars and underline(text) is not None)
+    
+    def iter_parse(self, source_lines: Iterable[str]) -> Iterator[DocumentBlock]:
+        """
+        parse 的流式版本：逐行读取（行不含换行符），逐块产出
+        
+        解析最多向前看两行、向后看一行，LineWindow 只保留这几行。
+        """
+        lines = LineWindow(self._scan(source_lines), keep_behind=1)
+        dispatch = self.LINE_DISPATCH
         i = 0
         
-        while i < len(lines):
-            line = lines[i]
-
+        while lines.has(i):
+            lines.release(i)
+            current = lines[i]
+            line = current.text
+            following = lines[i + 1] if lines.has(i + 1) else None
+            
             # 检测 overline + title + underline 组合标题
             # Pattern: ========\nTitle Text\n========
             if (
-                i + 2 < len(lines)
-                and self._is_title_underline(lines[i])
-                and not self._is_title_underline(lines[i + 1])
-                and self._is_title_underline(lines[i + 2])
-                and lines[i].strip()[0] == lines[i + 2].strip()[0]
+                current.adornment
+                and lines.has(i + 2)
+                and not following.adornment
+                and lines[i + 2].adornment
+                and current.head == lines[i + 2].head
             ):
-                underline_char = lines[i].strip()[0]
+                underline_char = current.head
                 level = self._get_title_level(underline_char)
                 # overline
-                blocks.append(DocumentBlock(
+                yield DocumentBlock(
                     type='title_overline',
-                    content=lines[i],
+                    content=line,
                     translatable=False,
                     metadata={'level': level, 'char': underline_char}
-                ))
+                )
                 # title text
-                blocks.append(DocumentBlock(
+                yield DocumentBlock(
                     type='title',
-                    content=lines[i + 1],
+                    content=following.text,
                     translatable=True,
                     metadata={'level': level, 'underline_char': underline_char, 'overline': True}
-                ))
+                )
                 # underline
-                blocks.append(DocumentBlock(
+                yield DocumentBlock(
                     type='title_underline',
-                    content=lines[i + 2],
+                    content=lines[i + 2].text,
                     translatable=False,
                     metadata={'level': level, 'char': underline_char, 'overline': True}
-                ))
+                )
                 i += 3
                 continue
             
             # 检测标题（下划线样式）
-            if i + 1 < len(lines) and self._is_title_underline(lines[i + 1]):
-                level = self._get_title_level(lines[i + 1][0])
-                blocks.append(DocumentBlock(
+            if following is not None and following.adornment:
+                underline = following.text
+                level = self._get_title_level(underline[0])
+                yield DocumentBlock(
                     type='title',
                     content=line,
                     translatable=True,
-                    metadata={'level': level, 'underline_char': lines[i + 1][0]}
-                ))
+                    metadata={'level': level, 'underline_char': underline[0]}
+                )
                 # 记录下划线（不翻译）
-                blocks.append(DocumentBlock(
+                yield DocumentBlock(
                     type='title_underline',
-                    content=lines[i + 1],
+                    content=underline,
                     translatable=False,
                     metadata={'level': level}
-                ))
+                )
                 i += 2
                 continue
             
+            previous = lines[i - 1] if i > 0 else None
+            
             # 上下划线样式的标题
-            if (i > 0 and i + 1 < len(lines) and 
-                self._is_title_underline(lines[i - 1]) and 
-                self._is_title_underline(lines[i + 1]) and
-                lines[i - 1][0] == lines[i + 1][0]):
+            if (previous is not None and previous.adornment and following is not None and
+                following.adornment and previous.text[0] == following.text[0]):
                 # 这种情况在上一次循环已经处理了，跳过
                 i += 1
                 continue
             
+            kinds = dispatch.get(current.head, self._LIST)
+            
             # .. directive::
-            if self.DIRECTIVE_PATTERN.match(line.strip()):
+            if kinds & self._DIRECTIVE and self.DIRECTIVE_PATTERN.match(line[current.indent:]):
                 self.in_directive_block = True
-                self.directive_indent = len(line) - len(line.lstrip())
-                blocks.append(DocumentBlock(
+                self.directive_indent = current.indent
+                yield DocumentBlock(
                     type='directive',
                     content=line,
                     translatable=False
-                ))
+                )
                 i += 1
                 continue
             
             # 缩进的内容
             if self.in_directive_block:
-                current_indent = len(line) - len(line.lstrip()) if line.strip() else 0
-                if line.strip() and current_indent > self.directive_indent:
-                    blocks.append(DocumentBlock(
+                if current.head and current.indent > self.directive_indent:
+                    yield DocumentBlock(
                         type='directive_content',
                         content=line,
                         translatable=False
-                    ))
+                    )
                     i += 1
                     continue
                 else:
                     self.in_directive_block = False
             
             # 代码块（literal block :: 后的缩进内容）
-            if i > 0 and lines[i - 1].rstrip().endswith('::'):
-                if self.CODE_INDENT_PATTERN.match(line) or not line.strip():
+            if previous is not None and previous.text.rstrip().endswith('::'):
+                if not current.head or self.CODE_INDENT_PATTERN.match(line):
                     if not self.in_code_block:
                         self.in_code_block = True
-                    blocks.append(DocumentBlock(
+                    yield DocumentBlock(
                         type='code',
                         content=line,
                         translatable=False
-                    ))
+                    )
                     i += 1
                     continue
             
             # 代码块内容（持续缩进）
             if self.in_code_block:
-                if self.CODE_INDENT_PATTERN.match(line) or not line.strip():
-                    blocks.append(DocumentBlock(
+                if not current.head or self.CODE_INDENT_PATTERN.match(line):
+                    yield DocumentBlock(
                         type='code',
                         content=line,
                         translatable=False
-                    ))
+                    )
                     i += 1
                     continue
                 else:
                     self.in_code_block = False
             
             # 检测表格分隔符
-            if self._is_table_separator(line):
-                blocks.append(DocumentBlock(
+            if kinds & self._TABLE and self._is_table_separator(line):
+                yield DocumentBlock(
                     type='table_separator',
                     content=line,
                     translatable=False
-                ))
+                )
                 i += 1
                 continue
             
             # 检测列表项
-            list_match = re.match(r'^(\s*)([-*+]|\d+\.|\w+\))\s+(.+)$', line)
+            list_match = self.LIST_PATTERN.match(line) if kinds & self._LIST else None
             if list_match:
                 indent, marker, text = list_match.groups()
-                blocks.append(DocumentBlock(
+                yield DocumentBlock(
                     type='list_item',
                     content=line,
                     translatable=True,
                     metadata={'indent': len(indent), 'marker': marker, 'text': text}
-                ))
+                )
                 i += 1
                 continue
             
             # 空行
-            if not line.strip():
-                blocks.append(DocumentBlock(
+            if not current.head:
+                yield DocumentBlock(
                     type='blank',
                     content=line,
                     translatable=False
-                ))
+                )
                 i += 1
                 continue
             
             # 普通段落
-            blocks.append(DocumentBlock(
+            yield DocumentBlock(
                 type='paragraph',
                 content=line,
                 translatable=True
-            ))
+            )
             i += 1
-        
-        return blocks
     
     def reconstruct(self, blocks: List[DocumentBlock]) -> str:
         """从块重构 RST 文档"""
-        lines = []
+        return '\n'.join(self.iter_reconstruct(blocks))
+    
+    def iter_reconstruct(self, blocks: Iterable[DocumentBlock]) -> Iterator[str]:
+        """reconstruct 的流式版本：逐块产出输出行（标题需要看到下一块才能输出下划线）"""
+        prev = None
+        pending_title = None
         
-        for i, block in enumerate(blocks):
-            if block.type == 'title_overline': # overline 原样保留，后续 title_underline 会再输出
-                lines.append(block.content)
-                continue
-            if block.type == 'title':
-                lines.append(block.content)
-                # 如果是 overline+underline 结构，直接保留后续 underline，不重新生成
-                if i + 1 < len(blocks) and blocks[i + 1].type == 'title_underline':
-                    underline_block = blocks[i + 1]
-                    if block.metadata.get('overline'):
+        for block in blocks:
+            if pending_title is not None:
+                title, pending_title = pending_title, None
+                if block.type == 'title_underline':
+                    if title.metadata.get('overline'):
                         # 已存在 overline/underline，保持不变
-                        lines.append(underline_block.content)
-                        continue
+                        yield block.content
                     else:
                         # 仅 underline 结构，重新计算长度
-                        underline_char = block.metadata.get('underline_char', '=')
-                        display_length = self._calculate_display_length(block.content)
-                        lines.append(underline_char * display_length)
-                        continue
+                        underline_char = title.metadata.get('underline_char', '=')
+                        yield underline_char * self._calculate_display_length(title.content)
+                    prev = block
+                    continue
+            
+            if block.type == 'title':
+                yield block.content
+                pending_title = block
             elif block.type == 'title_underline':
                 # 如果上一个不是标题，说明需要单独处理
-                if i == 0 or blocks[i - 1].type != 'title':
-                    lines.append(block.content)
-            elif block.type == 'list_item':
-                # 保持列表项的格式
-                lines.append(block.content)
+                if prev is None or prev.type != 'title':
+                    yield block.content
             else:
-                # 其他类型直接输出
-                lines.append(block.content)
-        
-        return '\n'.join(lines)
+                # 其他类型（含 overline、列表项）直接输出
+                yield block.content
+            prev = block
     
     def get_translatable_content(self, blocks: List[DocumentBlock]) -> str:
         """提取所有可翻译的内容"""
@@ -283,13 +322,7 @@ class RSTProcessor(DocumentProcessor):
     
     def _is_title_underline(self, line: str) -> bool:
         """检查是否为标题下划线"""
-        if not line.strip():
-            return False
-        stripped = line.strip()
-        if len(stripped) < 2:
-            return False
-        chars = set(stripped)
-        return len(chars) == 1 and chars.pop() in self.TITLE_CHARS
+        return self.TITLE_UNDERLINE_PATTERN.fullmatch(line) is not None
     
     def _get_title_level(self, char: str) -> int:
         """根据字符获取标题级别"""
@@ -0,0 +1,202 @@
+"""
+文档片段倒排索引
+用 BM25 将中文“遗漏内容”描述定位到原文片段，不需要调用 LLM
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# 英文单词/标识符与数字（含版本号形式）
+TOKEN_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)*')
+CAMEL_PATTERN = re.compile(r'[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])')
+
+# 不参与检索的高频英文虚词
+STOP_WORDS = frozenset(
+    "a an the and or of to in on for with by as at from is are was were be been "
+    "this that these those it its into than then there which who when where how "
+    "not no can may will should must also such".split()
+)
+
+# 中文描述 -> 英文原文中可能出现的词（技术文档常用术语）
+DEFAULT_GLOSSARY: Dict[str, List[str]] = {
+    "驱动": ["driver"],
+    "设备": ["device"],
+    "总线": ["bus"],
+    "内核": ["kernel"],
+    "模块": ["module"],
+    "函数": ["function"],
+    "结构体": ["struct", "structure"],
+    "接口": ["interface"],
+    "中断": ["interrupt", "irq"],
+    "内存": ["memory"],
+    "寄存器": ["register"],
+    "地址": ["address"],
+    "配置": ["config", "configuration"],
+    "参数": ["parameter", "argument"],
+    "属性": ["attribute"],
+    "示例": ["example"],
+    "例子": ["example"],
+    "命令": ["command"],
+    "文件": ["file"],
+    "目录": ["directory"],
+    "路径": ["path"],
+    "节点": ["node"],
+    "类": ["class"],
+    "电源": ["power"],
+    "热插拔": ["hotplug"],
+    "主设备": ["master"],
+    "从设备": ["slave"],
+    "搜索": ["search"],
+    "温度": ["temperature"],
+    "传感器": ["sensor"],
+    "固件": ["firmware"],
+    "硬件": ["hardware"],
+    "软件": ["software"],
+    "平台": ["platform"],
+    "协议": ["protocol"],
+    "网络": ["network"],
+    "数据": ["data"],
+    "读取": ["read"],
+    "写入": ["write"],
+    "复位": ["reset"],
+    "初始化": ["init", "initialize", "initialization"],
+    "注册": ["register", "registration"],
+    "注销": ["unregister"],
+    "回调": ["callback"],
+    "探测": ["probe"],
+    "枚举": ["enumerate", "enumeration"],
+    "线程": ["thread"],
+    "锁": ["lock"],
+    "定时器": ["timer"],
+    "缓冲区": ["buffer"],
+    "队列": ["queue"],
+    "用户": ["user"],
+    "系统": ["system"],
+    "文档": ["document", "documentation"],
+    "版本": ["version"],
+    "作者": ["author"],
+    "许可": ["license"],
+    "链接": ["link"],
+    "警告": ["warning"],
+    "注意": ["note"],
+    "错误": ["error"],
+    "表格": ["table"],
+    "列表": ["list"],
+    "标题": ["title"],
+    "代码": ["code"],
+    "注释": ["comment"],
+}
+
+
+def _normalize(token: str) -> str:
+    """小写并做最简单的复数归一（drivers -> driver）"""
+    token = token.lower()
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss') and token.isalpha():
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分检索词：英文单词、完整标识符及其组成部分、数字
+
+    W1_SKIP_ROM 会同时产生 w1_skip_rom、w1、skip、rom；
+    getDeviceId 会产生 getdeviceid、get、device、id。
+    """
+    terms = []
+    for raw in TOKEN_PATTERN.findall(text):
+        term = _normalize(raw)
+        if term in STOP_WORDS or (len(term) < 2 and not term.isdigit()):
+            continue
+        terms.append(term)
+        if raw[0].isdigit():
+            continue
+        parts = [p for p in raw.split('_') if p]
+        if len(parts) == 1:
+            parts = CAMEL_PATTERN.findall(raw)
+        if len(parts) > 1:
+            terms.extend(
+                _normalize(p) for p in parts
+                if len(p) > 1 and p.lower() not in STOP_WORDS
+            )
+    return terms
+
+
+class SegmentIndex:
+    """
+    文档片段倒排索引（BM25）
+
+    每个文档构建一次：词项 -> {片段位置: 词频}。查询时先从中文描述中取出英文词、
+    标识符和数字，再用双语术语表把中文术语映射为英文词，只访问命中词项的倒排表，
+    不扫描全部片段。
+    """
+
+    def __init__(self,
+                 texts: Iterable[str],
+                 glossary: Optional[Dict[str, List[str]]] = None,
+                 k1: float = 1.5,
+                 b: float = 0.75):
+        """
+        构建索引
+
+        Args:
+            texts: 原文片段列表
+            glossary: 额外的中文 -> 英文术语表（与 DEFAULT_GLOSSARY 合并）
+            k1: BM25 词频饱和参数
+            b: BM25 长度归一参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.glossary = dict(DEFAULT_GLOSSARY)
+        if glossary:
+            self.glossary.update(glossary)
+
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: List[int] = []
+        for pos, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[pos] = tf
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def query_terms(self, description: str) -> List[str]:
+        """从（中文）描述中提取检索词：英文词/标识符/数字 + 术语表命中的中文术语"""
+        terms = tokenize(description)
+        for zh, english in self.glossary.items():
+            if zh in description:
+                terms.extend(_normalize(word) for word in english)
+        return list(dict.fromkeys(terms))
+
+    def search(self, description: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """
+        按 BM25 得分返回最相关的片段
+
+        Args:
+            description: 遗漏内容描述
+            top_k: 返回数量上限
+
+        Returns:
+            [(片段位置, 得分)]，按得分降序；没有命中时为空列表
+        """
+        if not self.lengths:
+            return []
+        total = len(self.lengths)
+        scores: Dict[int, float] = {}
+        for term in self.query_terms(description):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for pos, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[pos] / (self.avg_length or 1))
+                scores[pos] = scores.get(pos, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
@@ -3,14 +3,17 @@
 使用LangChain实现文本摘要功能
 """
 
-from typing import List
+from typing import List, Optional, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import BaseOutputParser
 from langchain.schema.runnable import RunnablePassthrough
 import os
 import re
-from .text_chunker import TextChunk
-from ..utils.llm_factory import LLMFactory
+import json
+from .text_chunker import TextChunk, MarkdownChunker
+from ..utils.llm_factory import LLMFactory, UsageRecorder
+from ..utils.cache import ResultCache
 
 
 class SummaryOutputParser(BaseOutputParser):
@@ -23,7 +26,30 @@ class SummaryGenerator:
     """摘要生成器"""
     
     def __init__(self, model_name: str = "gpt-3.5-turbo", temperature: float = 0.2, provider: str = None,
-                 openai_api_key: str = None, openai_base_url: str = None, qwen_api_key: str = None):
+                 openai_api_key: str = None, openai_base_url: str = None, qwen_api_key: str = None,
+                 map_reduce: bool = True, map_reduce_threshold: int = 6000,
+                 map_chunk_tokens: int = 3000, reduce_budget: int = 3000, max_workers: int = 4,
+                 cache: Optional[ResultCache] = None, verify_token_budget: int = 12000,
+                 usage_recorder: Optional[UsageRecorder] = None):
+        """
+        Args:
+            map_reduce: 超长文档是否使用分块摘要 + 分层归并模式
+            map_reduce_threshold: 原文超过该token数时启用 map-reduce
+            map_chunk_tokens: map 阶段每个分块的token上限
+            reduce_budget: reduce 阶段每组摘要的token预算（每一层都遵守）
+            max_workers: 并行摘要的最大线程数
+            cache: 摘要/比较结果缓存（默认仅在内存中缓存本次运行的结果）
+            verify_token_budget: 结构化校验直接发送原文+译文的token上限，超出时改为发送双方摘要
+            usage_recorder: API 用量记录函数（可选，见 LLMFactory.create_llm）
+        """
+        self.model_name = model_name
+        self.cache = cache if cache is not None else ResultCache()
+        self.map_reduce = map_reduce
+        self.map_reduce_threshold = map_reduce_threshold
+        self.reduce_budget = reduce_budget
+        self.verify_token_budget = verify_token_budget
+        self.max_workers = max(1, max_workers)
+        self.chunker = MarkdownChunker(max_tokens=map_chunk_tokens, model=model_name)
 
         self.llm = LLMFactory.create_llm(
             model_name=model_name,
@@ -31,7 +57,8 @@ class SummaryGenerator:
             temperature=temperature,
             openai_api_key=openai_api_key,
             openai_base_url=openai_base_url,
-            qwen_api_key=qwen_api_key
+            qwen_api_key=qwen_api_key,
+            usage_recorder=usage_recorder
         )
         
         # 原文摘要prompt
@@ -91,6 +118,41 @@ class SummaryGenerator:
 请严格按照上述格式输出："""
         )
         
+        # 分块摘要归并prompt（map-reduce 的 reduce 阶段）
+        self.reduce_summary_template = ChatPromptTemplate.from_template(
+            """你是一个专业的文档分析师。以下是同一篇英文文档按顺序各部分的中文摘要，请将它们合并为一个连贯的中文摘要。
+
+要求：
+1. 保持各部分的先后顺序和层次结构
+2. 保留所有重要的概念、术语和细节，不要遗漏任何部分的要点
+3. 合并重复内容，使用简洁清晰的中文表达
+
+分部分摘要：
+{summaries}
+
+请生成合并后的中文摘要："""
+        )
+
+        # 摘要压缩prompt（单个摘要超出 reduce 预算时使用）
+        self.condense_summary_template = ChatPromptTemplate.from_template(
+            """你是一个专业的文档分析师。以下中文摘要过长，请在保留所有重要概念、术语和先后顺序的前提下，将其压缩到原长度的{ratio}以内。
+
+摘要：
+{summary}
+
+请生成压缩后的中文摘要："""
+        )
+
+        # 结构化校验prompt（单次调用，JSON 输出）
+        self.structured_verify_template = ChatPromptTemplate.from_template(
+            """你是一个专业的翻译质量检查员。请对照{material}，检查译文是否完整覆盖了原文的全部信息。
+
+{content}
+
+请只输出一个 JSON 对象，不要输出任何其他文字，格式如下：
+{{"completeness_score": 整数(0-10，10表示完全一致), "missing_items": [遗漏内容的中文描述字符串列表，无遗漏时为空列表], "affected_segments": [存在遗漏或错误的片段编号整数列表，如 [3, 7]；无法定位或无片段编号时为空列表], "suggestions": "对翻译改进的具体建议，无则为空字符串"}}"""
+        )
+
         # 创建处理链
         self.original_summary_chain = (
             self.original_summary_template 
@@ -109,6 +171,24 @@ class SummaryGenerator:
             | self.llm 
             | SummaryOutputParser()
         )
+
+        self.reduce_summary_chain = (
+            self.reduce_summary_template
+            | self.llm
+            | SummaryOutputParser()
+        )
+
+        self.condense_summary_chain = (
+            self.condense_summary_template
+            | self.llm
+            | SummaryOutputParser()
+        )
+
+        self.structured_verify_chain = (
+            self.structured_verify_template
+            | self.llm
+            | SummaryOutputParser()
+        )
     
     def generate_original_summary(self, content: str) -> str:
         """
@@ -120,14 +200,27 @@ class SummaryGenerator:
         Returns:
             中文摘要
         """
-        try:
-            summary = self.original_summary_chain.invoke({
-                "content": content
-            })
-            return summary
-        except Exception as e:
-            print(f"生成原文摘要时出错: {e}")
-            return f"摘要生成失败: {str(e)}"
+        key = self._summary_key("original_summary", content)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        complete = True
+        if self.map_reduce and self.chunker.count_tokens(content) > self.map_reduce_threshold:
+            summary, complete = self._map_reduce_summary(content)
+        else:
+            try:
+                summary = self.original_summary_chain.invoke({
+                    "content": content
+                })
+            except Exception as e:
+                print(f"生成原文摘要时出错: {e}")
+                return f"摘要生成失败: {str(e)}"
+
+        # 有分块摘要失败时结果不完整，不缓存（下次运行重新生成）
+        if complete and "摘要生成失败" not in summary:
+            self.cache.set(key, summary)
+        return summary
     
     def generate_translated_summary(self, content: str) -> str:
         """
@@ -139,14 +232,26 @@ class SummaryGenerator:
         Returns:
             中文摘要
         """
+        key = self._summary_key("translated_summary", content)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
             summary = self.translated_summary_chain.invoke({
                 "content": content
             })
+            self.cache.set(key, summary)
             return summary
         except Exception as e:
             print(f"生成译文摘要时出错: {e}")
             return f"摘要生成失败: {str(e)}"
+
+    def _summary_key(self, kind: str, content: str) -> str:
+        """摘要的缓存键：map-reduce 与分块参数不同时生成的摘要不同，一并计入"""
+        params = (f"map_reduce={self.map_reduce}|threshold={self.map_reduce_threshold}"
+                  f"|chunk_tokens={self.chunker.request_budget}|reduce_budget={self.reduce_budget}")
+        return self.cache.make_key(kind, self.model_name, params, content)
     
     def compare_summaries(self, original_summary: str, translated_summary: str) -> dict:
         """
@@ -159,6 +264,11 @@ class SummaryGenerator:
         Returns:
             包含比较结果的字典
         """
+        key = self.cache.make_key("comparison", self.model_name, original_summary, translated_summary)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
         try:
             comparison_result = self.comparison_chain.invoke({
                 "original_summary": original_summary,
@@ -176,6 +286,7 @@ class SummaryGenerator:
             
             current_section = None
             content_buffer = []
+            score_parsed = False
             
             for line in lines:
                 line_stripped = line.strip()
@@ -194,6 +305,7 @@ class SummaryGenerator:
                             # 如果有多个数字（如8/10），取第一个
                             score = numbers[0]
                             result["completeness_score"] = score
+                            score_parsed = True
                     except:
                         pass
                     current_section = None
@@ -232,7 +344,10 @@ class SummaryGenerator:
             elif current_section == "suggestions" and content_buffer:
                 result["suggestions"] = '\n'.join(content_buffer).strip()
             
-            return result
+            # 没有解析出评分的结果不缓存，下次重新比较
+            if score_parsed:
+                self.cache.set(key, result)
+            return dict(result)
             
         except Exception as e:
             print(f"比较摘要时出错: {e}")
@@ -243,18 +358,330 @@ class SummaryGenerator:
                 "raw_result": f"比较失败: {str(e)}"
             }
     
+    def verify_translation(self, original_content: str, translated_content: str,
+                           original_segments: Optional[List[str]] = None,
+                           translated_segments: Optional[List[str]] = None) -> Dict:
+        """
+        单次调用的结构化完整性校验，失败时回退到 摘要+摘要+比较 流程
+        
+        Args:
+            original_content: 英文原文
+            translated_content: 中文译文
+            original_segments: 原文片段列表（可选，提供时可定位有问题的片段）
+            translated_segments: 与原文片段一一对应的译文片段列表
+            
+        Returns:
+            {"original_summary", "translated_summary", "comparison_result"}，
+            其中 comparison_result 与 compare_summaries 的返回格式兼容，
+            并额外包含 missing_items、affected_segments（0起始的片段下标）和 verify_mode
+        """
+        original_summary = ""
+        translated_summary = ""
+        use_segments = bool(original_segments) and translated_segments is not None \
+            and len(original_segments) == len(translated_segments)
+
+        total_tokens = (self.chunker.count_tokens(original_content)
+                        + self.chunker.count_tokens(translated_content))
+        if total_tokens <= self.verify_token_budget:
+            if use_segments:
+                material = "原文片段与译文片段（按 [S编号] 一一对应）"
+                content = "\n\n".join(
+                    f"[S{i + 1}]\n原文：\n{src}\n译文：\n{tgt}"
+                    for i, (src, tgt) in enumerate(zip(original_segments, translated_segments))
+                )
+                segment_count = len(original_segments)
+            else:
+                material = "英文原文与中文译文"
+                content = f"原文：\n{original_content}\n\n译文：\n{translated_content}"
+                segment_count = 0
+            verify_mode = "structured"
+        else:
+            # 内容过长时改为比较双方摘要（摘要有缓存），此时无法定位片段
+            original_summary = self.generate_original_summary(original_content)
+            translated_summary = self.generate_translated_summary(translated_content)
+            material = "原文摘要与译文摘要"
+            content = f"原文摘要：\n{original_summary}\n\n译文摘要：\n{translated_summary}"
+            segment_count = 0
+            verify_mode = "structured_summary"
+
+        comparison_result = self._structured_verify(material, content, segment_count)
+        if comparison_result is not None:
+            comparison_result["verify_mode"] = verify_mode
+            return {
+                "original_summary": original_summary,
+                "translated_summary": translated_summary,
+                "comparison_result": comparison_result
+            }
+
+        print("结构化校验结果无效，回退到摘要比较流程")
+        original_summary = original_summary or self.generate_original_summary(original_content)
+        translated_summary = translated_summary or self.generate_translated_summary(translated_content)
+        comparison_result = self.compare_summaries(original_summary, translated_summary)
+        comparison_result["verify_mode"] = "summary"
+        return {
+            "original_summary": original_summary,
+            "translated_summary": translated_summary,
+            "comparison_result": comparison_result
+        }
+
+    def verify_chunk(self, original_chunk: str, translated_chunk: str) -> Optional[Dict]:
+        """
+        单个块的结构化校验（用于块级并行校验）
+        
+        Returns:
+            校验结果字典；调用失败或输出无效时返回 None
+        """
+        content = f"原文：\n{original_chunk}\n\n译文：\n{translated_chunk}"
+        return self._structured_verify("英文原文与中文译文", content, 0)
+
+    def _structured_verify(self, material: str, content: str, segment_count: int) -> Optional[Dict]:
+        """发送结构化校验请求并严格校验 JSON，无效时返回 None"""
+        key = self.cache.make_key("structured_verify", self.model_name, material, content)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        try:
+            raw = self.structured_verify_chain.invoke({
+                "material": material,
+                "content": content
+            })
+        except Exception as e:
+            print(f"结构化校验调用出错: {e}")
+            return None
+
+        try:
+            result = self.parse_verification_json(raw, segment_count)
+        except ValueError as e:
+            print(f"结构化校验输出不符合格式: {e}")
+            return None
+
+        self.cache.set(key, result)
+        return dict(result)
+
+    @staticmethod
+    def parse_verification_json(raw: str, segment_count: int) -> Dict:
+        """
+        严格解析结构化校验输出
+        
+        Args:
+            raw: 模型输出（允许包裹在 ```json 代码围栏中）
+            segment_count: 片段数量；affected_segments 中超出 1..segment_count 的编号被丢弃
+                （为 0 时没有片段编号，affected_segments 恒为空）
+            
+        Returns:
+            与 compare_summaries 兼容的结果字典
+            
+        Raises:
+            ValueError: 输出不是合法 JSON 或字段类型/取值不符合约定
+        """
+        text = raw.strip()
+        fence_match = re.match(r'^```(?:json)?\s*(.*?)\s*```$', text, re.DOTALL)
+        if fence_match:
+            text = fence_match.group(1)
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"不是合法的 JSON: {e}")
+        if not isinstance(data, dict):
+            raise ValueError("顶层必须是 JSON 对象")
+
+        score = data.get("completeness_score")
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or score != int(score):
+            raise ValueError(f"completeness_score 必须是整数: {score!r}")
+        score = int(score)
+        if not 0 <= score <= 10:
+            raise ValueError(f"completeness_score 超出范围: {score}")
+
+        missing_items = data.get("missing_items")
+        if not isinstance(missing_items, list) or not all(isinstance(m, str) for m in missing_items):
+            raise ValueError("missing_items 必须是字符串列表")
+        missing_items = [m.strip() for m in missing_items if m.strip() and m.strip() != "无"]
+
+        affected = data.get("affected_segments", [])
+        if not isinstance(affected, list) or not all(
+                isinstance(a, int) and not isinstance(a, bool) for a in affected):
+            raise ValueError("affected_segments 必须是整数列表")
+        # 无法定位的片段编号不影响评分与遗漏内容
+        affected = [a for a in affected if 1 <= a <= segment_count]
+
+        suggestions = data.get("suggestions", "")
+        if not isinstance(suggestions, str):
+            raise ValueError("suggestions 必须是字符串")
+
+        return {
+            "completeness_score": score,
+            "missing_content": "\n".join(missing_items) if missing_items else "无",
+            "suggestions": suggestions.strip(),
+            "raw_result": raw,
+            "missing_items": missing_items,
+            "affected_segments": sorted(set(a - 1 for a in affected))
+        }
+
+    def _summarize_chunk(self, chunk: TextChunk) -> str:
+        """生成单个块的摘要（代码块不调用LLM）"""
+        if chunk.chunk_type == 'code':
+            return f"代码块：{chunk.content[:100]}..." if len(chunk.content) > 100 else f"代码块：{chunk.content}"
+        try:
+            return self.original_summary_chain.invoke({
+                "content": chunk.content
+            })
+        except Exception as e:
+            print(f"生成块摘要时出错: {e}")
+            return f"摘要生成失败: {str(e)}"
+
     def generate_chunk_summaries(self, chunks: List[TextChunk]) -> List[str]:
 
         summaries = []
         
         for i, chunk in enumerate(chunks):
             print(f"正在生成第 {i+1}/{len(chunks)} 个块的摘要...")
+            summaries.append(self._summarize_chunk(chunk))
+        
+        return summaries
+
+    def generate_chunk_summaries_parallel(self, chunks: List[TextChunk],
+                                          max_workers: Optional[int] = None) -> List[str]:
+        """
+        并行生成各块摘要，返回顺序与输入块一致
+        
+        Args:
+            chunks: 文本块列表
+            max_workers: 并发线程数（默认使用初始化时的 max_workers）
             
-            if chunk.chunk_type == 'code':
-                summary = f"代码块：{chunk.content[:100]}..." if len(chunk.content) > 100 else f"代码块：{chunk.content}"
-            else:
-                summary = self.generate_original_summary(chunk.content)
+        Returns:
+            摘要列表
+        """
+        if not chunks:
+            return []
+        workers = min(max_workers or self.max_workers, len(chunks))
+        print(f"正在并行生成 {len(chunks)} 个块的摘要（并发 {workers}）...")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._summarize_chunk, chunks))
+
+    def generate_map_reduce_summary(self, content: str) -> str:
+        """
+        map-reduce 摘要：先并行生成各块摘要，再按 reduce_budget 分组逐层归并，
+        直到只剩一个摘要。超出预算的单个摘要先压缩（仍超出时截断）再分组，
+        每一层的每次归并请求都不超过 token 预算，
+        因此文档变长时只增加并行宽度和少量层数，而不会超出上下文窗口。
+        
+        Args:
+            content: 英文原文内容
             
-            summaries.append(summary)
+        Returns:
+            中文摘要
+        """
+        return self._map_reduce_summary(content)[0]
+
+    def _map_reduce_summary(self, content: str) -> Tuple[str, bool]:
+        """
+        map-reduce 摘要；生成失败的分块摘要不参与归并
         
-        return summaries
\ No newline at end of file
+        Returns:
+            (摘要, 是否所有分块摘要都生成成功)；全部失败时摘要为失败信息
+        """
+        chunks = self.chunker.chunk_text(content)
+        print(f"文档较长，使用 map-reduce 摘要模式（{len(chunks)} 个块）")
+        summaries = self.generate_chunk_summaries_parallel(chunks)
+        failed = [summary for summary in summaries if summary.startswith("摘要生成失败")]
+        if failed:
+            print(f"{len(failed)}/{len(summaries)} 个块的摘要生成失败，不参与归并")
+            summaries = [summary for summary in summaries if not summary.startswith("摘要生成失败")]
+            if not summaries:
+                return failed[0], False
+
+        level = 0
+        while len(summaries) > 1:
+            level += 1
+            summaries = self._fit_summaries(summaries, self.reduce_budget)
+            groups = self._group_by_budget(summaries, self.reduce_budget)
+            if len(groups) == len(summaries):
+                # 相邻两个摘要都放不进一组时无法继续归并：压缩到预算的一半，保证两两成组且不超预算
+                summaries = self._fit_summaries(summaries, max(1, self.reduce_budget // 2))
+                groups = self._group_by_budget(summaries, self.reduce_budget)
+            print(f"第 {level} 层归并: {len(summaries)} -> {len(groups)}")
+            summaries = self._reduce_groups(groups)
+
+        return (summaries[0] if summaries else ""), not failed
+
+    def _fit_summaries(self, summaries: List[str], budget: int) -> List[str]:
+        """并行压缩超出预算的摘要，未超出的原样保留"""
+        oversized = [i for i, summary in enumerate(summaries) if self.chunker.count_tokens(summary) > budget]
+        if not oversized:
+            return summaries
+        print(f"压缩 {len(oversized)} 个超出预算（{budget} tokens）的摘要")
+        fitted = list(summaries)
+        workers = min(self.max_workers, len(oversized))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(lambda i: self._fit_summary(summaries[i], budget), oversized)
+            for i, summary in zip(oversized, results):
+                fitted[i] = summary
+        return fitted
+
+    def _fit_summary(self, summary: str, budget: int) -> str:
+        """将单个摘要压缩到预算以内；压缩失败或结果仍超出时按 token 截断"""
+        tokens = self.chunker.count_tokens(summary)
+        try:
+            condensed = self.condense_summary_chain.invoke({
+                "summary": summary,
+                "ratio": f"{max(1, budget * 90 // tokens)}%"
+            })
+            if condensed and self.chunker.count_tokens(condensed) < tokens:
+                summary = condensed
+        except Exception as e:
+            print(f"压缩摘要时出错: {e}")
+        return self._truncate_to_budget(summary, budget)
+
+    def _truncate_to_budget(self, text: str, budget: int) -> str:
+        """按 token 数截断文本（二分查找字符位置，尽量在换行处截断）"""
+        if self.chunker.count_tokens(text) <= budget:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.chunker.count_tokens(text[:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        cut = text.rfind('\n', 0, low)
+        return text[:cut if cut > low // 2 else low].rstrip()
+
+    def _group_by_budget(self, summaries: List[str], budget: int) -> List[List[str]]:
+        """按顺序将摘要分组，使每组的token总数不超过预算"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 0
+        for summary in summaries:
+            tokens = self.chunker.count_tokens(summary)
+            if current and current_tokens + tokens > budget:
+                groups.append(current)
+                current = []
+                current_tokens = 0
+            current.append(summary)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _reduce_group(self, group: List[str]) -> str:
+        """归并一组摘要；单个摘要直接透传"""
+        if len(group) == 1:
+            return group[0]
+        summaries_text = "\n\n".join(
+            f"第{i + 1}部分：\n{summary}" for i, summary in enumerate(group)
+        )
+        try:
+            return self.reduce_summary_chain.invoke({
+                "summaries": summaries_text
+            })
+        except Exception as e:
+            print(f"归并摘要时出错: {e}")
+            # 归并失败时保留原始分段摘要，避免丢失信息
+            return "\n\n".join(group)
+
+    def _reduce_groups(self, groups: List[List[str]]) -> List[str]:
+        """并行归并同一层的所有分组"""
+        workers = min(self.max_workers, len(groups))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._reduce_group, groups))
@@ -3,10 +3,30 @@
 """
 
 import re
-import tiktoken
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Tuple, Optional, Iterable, Iterator
 from dataclasses import dataclass
 
+from .document_processor import DocumentBlock
+from .tokenizer import get_estimator, get_tokenizer
+
+
+# 模型单次输出 token 上限（按模型名前缀匹配，越具体的前缀越靠前）
+OUTPUT_TOKEN_LIMITS = (
+    ('gpt-4o', 16384),
+    ('gpt-4', 4096),
+    ('gpt-3.5', 4096),
+    ('qwen', 8192),
+)
+DEFAULT_OUTPUT_TOKEN_LIMIT = 4096
+# 不编码时块间分隔符对合并后 token 数的影响（_join_cost 的典型值）
+JOIN_ESTIMATE = 1
+# 打包窗口（以请求预算为单位）：整篇分块与流式分块使用同一窗口，对同一输入产生相同的请求
+PACK_WINDOW = 8
+# 字母后紧跟空格处：各编码的预切分都在此断开（字母串不含空格，空白串不含字母）
+WORD_BREAK_PATTERN = re.compile(r'[A-Za-z] ')
+# 译文合成一行写回的块类型（RST 简单表格最后一列的单元格：续行须对齐到列起点，写成一行总是合法的）
+SINGLE_LINE_TYPES = ('table_cell',)
+
 
 @dataclass
 class TextChunk:
@@ -14,17 +34,41 @@ class TextChunk:
     content: str
     chunk_type: str  # 'heading', 'paragraph', 'list', 'code', 'quote'
     level: int = 0   # 标题级别（用于heading）
-    start_pos: int = 0
+    start_pos: int = 0   # 在原文中的字符偏移 [start_pos, end_pos)
     end_pos: int = 0
+    start_line: int = 0  # 在原文中的行号 [start_line, end_line)，从 0 开始
+    end_line: int = 0
+    block_range: Optional[Tuple[int, int]] = None  # 由文档块分块时对应的文档块下标区间 [start, end)
 
 
 class MarkdownChunker:
     """Markdown分块"""
     
-    def __init__(self, max_tokens: int = 1000, model: str = "gpt-3.5-turbo"):
-
+    # 原样保留的块类型：不翻译，打包时作为分隔（合并组不跨越），也不产出
+    passthrough_types: Tuple[str, ...] = ()
+    # 超出请求预算时也不按句子切分的块类型
+    unsplit_types: Tuple[str, ...] = ('code',)
+    # 文档块类型 -> 结构块类型（由文档块直接分块时使用，其余为 paragraph）
+    BLOCK_CHUNK_TYPES = {'heading': 'heading', 'list_item': 'list', 'blockquote': 'quote'}
+    
+    def __init__(self, max_tokens: int = 1000, model: str = "gpt-3.5-turbo",
+                 max_output_tokens: Optional[int] = None, output_expansion: float = 1.6,
+                 exact: bool = True):
+        """
+        Args:
+            max_tokens: 每个请求的最大输入 token 数
+            model: 模型名称（决定编码器和默认的输出上限；同一编码器在进程内共享）
+            max_output_tokens: 模型单次输出上限（默认按模型名查 OUTPUT_TOKEN_LIMITS）
+            output_expansion: 中文译文相对英文原文的 token 膨胀系数
+            exact: 是否按精确 token 数打包；为 False 时完全按估计器的估计值打包，不做 BPE 编码，
+                用于批量预估请求数
+        """
         self.max_tokens = max_tokens
-        self.encoding = self._get_encoding(model)
+        self.exact = exact
+        self.tokenizer = get_tokenizer(model)
+        self.estimator = get_estimator(model)
+        self.max_output_tokens = max_output_tokens or self._get_output_limit(model)
+        self.output_expansion = output_expansion
         
         # 编译正则表达式模式
         self.patterns = {
@@ -35,272 +79,561 @@ class MarkdownChunker:
             'paragraph': re.compile(r'^(.+)$', re.MULTILINE)
         }
     
-    def _get_encoding(self, model: str):
-
-        try:
-            return tiktoken.encoding_for_model(model)
-        except KeyError:
-            if model.lower().startswith('qwen'):
-                # Qwen模型使用cl100k_base编码器
-                return tiktoken.get_encoding("cl100k_base")
-            elif model.lower().startswith('gpt-4'):
-                return tiktoken.get_encoding("cl100k_base")
-            elif model.lower().startswith('gpt-3.5'):
-                return tiktoken.get_encoding("cl100k_base")
-            else:
-                # 默认cl100k_base
-                return tiktoken.get_encoding("cl100k_base")
+    @staticmethod
+    def _get_output_limit(model: str) -> int:
+        lower_model = model.lower()
+        for prefix, limit in OUTPUT_TOKEN_LIMITS:
+            if lower_model.startswith(prefix):
+                return limit
+        return DEFAULT_OUTPUT_TOKEN_LIMIT
+    
+    @property
+    def request_budget(self) -> int:
+        """单个请求的原文 token 上限：不超过 max_tokens，且译文膨胀后不超过模型输出上限"""
+        return max(1, min(self.max_tokens, int(self.max_output_tokens / self.output_expansion)))
     
     def count_tokens(self, text: str) -> int:
         """计算文本的token数量"""
-        return len(self.encoding.encode(text))
+        return self.tokenizer.count(text)
+    
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        精确计数一批文本（encode_batch 多线程编码），估计器样本未满时结果同时用于校准
+        
+        exact 为 False 时返回估计值
+        """
+        if not self.exact:
+            return [self.estimator.estimate(text) for text in texts]
+        if len(texts) == 1:
+            counts = [self.tokenizer.count(texts[0])]
+        else:
+            counts = [len(ids) for ids in self.tokenizer.encode_batch(texts)]
+        if not self.estimator.calibrated:
+            for text, tokens in zip(texts, counts):
+                self.estimator.observe(text, tokens)
+        return counts
+    
+    def estimate_tokens(self, text: str) -> int:
+        """快速估计 token 数（不编码）"""
+        return self.estimator.estimate(text)
     
     def split_by_structure(self, content: str) -> List[TextChunk]:
-
-        chunks = []
-        lines = content.split('\n')
+        """
+        按 Markdown 结构（标题、代码块、列表、引用、段落）切分
+        
+        每个块记录其在原文中的精确字符区间与行区间，content == 原文[start_pos:end_pos]，
+        便于把译文按区间拼接回原文。
+        """
+        return list(self.iter_structure(content.split('\n')))
+    
+    def iter_structure(self, lines: Iterable[str]) -> Iterator[TextChunk]:
+        """
+        split_by_structure 的流式版本：逐行读取（行不含换行符），每个结构块一闭合就产出
+        
+        单遍扫描并随行累加字符偏移，内存中只保留当前未闭合的块。
+        """
         current_chunk = []
         current_type = None
         current_level = 0
-        start_pos = 0
+        chunk_start_line = 0
+        chunk_start_pos = 0
+        code_lines = None
+        code_start_line = 0
+        code_start_pos = 0
+        
+        def make_chunk(chunk_lines: List[str], start_line: int, start_pos: int,
+                       chunk_type: str, level: int) -> TextChunk:
+            chunk_content = '\n'.join(chunk_lines)
+            return TextChunk(
+                content=chunk_content,
+                chunk_type=chunk_type,
+                level=level,
+                start_pos=start_pos,
+                end_pos=start_pos + len(chunk_content),
+                start_line=start_line,
+                end_line=start_line + len(chunk_lines)
+            )
         
-        i = 0
-        while i < len(lines):
-            line = lines[i]
+        offset = 0
+        for i, line in enumerate(lines):
+            line_start = offset
+            offset += len(line) + 1
+            
+            if code_lines is not None:
+                code_lines.append(line)
+                if line.strip().startswith('```'):
+                    yield make_chunk(code_lines, code_start_line, code_start_pos, 'code', 0)
+                    code_lines = None
+                continue
+            
             stripped_line = line.strip()
             
             if stripped_line.startswith('```'): #代码
                 if current_chunk:
-                    chunk_content = '\n'.join(current_chunk)
-                    chunks.append(TextChunk(
-                        content=chunk_content,
-                        chunk_type=current_type or 'paragraph',
-                        level=current_level,
-                        start_pos=start_pos,
-                        end_pos=start_pos + len(chunk_content)
-                    ))
+                    yield make_chunk(current_chunk, chunk_start_line, chunk_start_pos, current_type or 'paragraph', current_level)
                     current_chunk = []
 
                 code_lines = [line]
-                i += 1
-                while i < len(lines):
-                    code_lines.append(lines[i])
-                    if lines[i].strip().startswith('```'):
-                        break
-                    i += 1
-                
-                code_content = '\n'.join(code_lines)
-                chunks.append(TextChunk(
-                    content=code_content,
-                    chunk_type='code',
-                    start_pos=start_pos,
-                    end_pos=start_pos + len(code_content)
-                ))
-                start_pos += len(code_content) + 1
+                code_start_line = i
+                code_start_pos = line_start
                 current_type = None
                 current_level = 0
-                i += 1
                 continue
             
-            heading_match = re.match(r'^(#{1,6})\s+(.+)$', line)
+            heading_match = self.patterns['heading'].match(line)
             if heading_match:
                 if current_chunk:
-                    chunk_content = '\n'.join(current_chunk)
-                    chunks.append(TextChunk(
-                        content=chunk_content,
-                        chunk_type=current_type or 'paragraph',
-                        level=current_level,
-                        start_pos=start_pos,
-                        end_pos=start_pos + len(chunk_content)
-                    ))
-                    current_chunk = []
+                    yield make_chunk(current_chunk, chunk_start_line, chunk_start_pos, current_type or 'paragraph', current_level)
                 
-                level = len(heading_match.group(1))
                 current_chunk = [line]
                 current_type = 'heading'
-                current_level = level
-                start_pos = sum(len(chunk.content) + 1 for chunk in chunks)
-                i += 1
+                current_level = len(heading_match.group(1))
+                chunk_start_line = i
+                chunk_start_pos = line_start
                 continue
 
-            list_match = re.match(r'^(\s*)([-*+]|\d+\.)\s+(.+)$', line)
+            list_match = self.patterns['list_item'].match(line)
             if list_match:
                 if current_type != 'list':
                     if current_chunk:
-                        chunk_content = '\n'.join(current_chunk)
-                        chunks.append(TextChunk(
-                            content=chunk_content,
-                            chunk_type=current_type or 'paragraph',
-                            level=current_level,
-                            start_pos=start_pos,
-                            end_pos=start_pos + len(chunk_content)
-                        ))
+                        yield make_chunk(current_chunk, chunk_start_line, chunk_start_pos, current_type or 'paragraph', current_level)
                         current_chunk = []
                     
                     current_type = 'list'
                     current_level = 0
-                    start_pos = sum(len(chunk.content) + 1 for chunk in chunks)
                 
+                if not current_chunk:
+                    chunk_start_line = i
+                    chunk_start_pos = line_start
                 current_chunk.append(line)
-                i += 1
                 continue
 
             if line.startswith('>'):
                 if current_type != 'quote':
                     if current_chunk:
-                        chunk_content = '\n'.join(current_chunk)
-                        chunks.append(TextChunk(
-                            content=chunk_content,
-                            chunk_type=current_type or 'paragraph',
-                            level=current_level,
-                            start_pos=start_pos,
-                            end_pos=start_pos + len(chunk_content)
-                        ))
+                        yield make_chunk(current_chunk, chunk_start_line, chunk_start_pos, current_type or 'paragraph', current_level)
                         current_chunk = []
                     
                     current_type = 'quote'
                     current_level = 0
-                    start_pos = sum(len(chunk.content) + 1 for chunk in chunks)
                 
+                if not current_chunk:
+                    chunk_start_line = i
+                    chunk_start_pos = line_start
                 current_chunk.append(line)
-                i += 1
                 continue
             
             if not stripped_line:
                 if current_chunk:
                     current_chunk.append(line)
-                i += 1
                 continue
             
             if current_type != 'paragraph':
                 
                 if current_chunk:
-                    chunk_content = '\n'.join(current_chunk)
-                    chunks.append(TextChunk(
-                        content=chunk_content,
-                        chunk_type=current_type or 'paragraph',
-                        level=current_level,
-                        start_pos=start_pos,
-                        end_pos=start_pos + len(chunk_content)
-                    ))
+                    yield make_chunk(current_chunk, chunk_start_line, chunk_start_pos, current_type or 'paragraph', current_level)
                     current_chunk = []
                 
                 current_type = 'paragraph'
                 current_level = 0
-                start_pos = sum(len(chunk.content) + 1 for chunk in chunks)
             
+            if not current_chunk:
+                chunk_start_line = i
+                chunk_start_pos = line_start
             current_chunk.append(line)
-            i += 1
         
+        if code_lines is not None:
+            # 未闭合的代码块
+            yield make_chunk(code_lines, code_start_line, code_start_pos, 'code', 0)
         if current_chunk:
-            chunk_content = '\n'.join(current_chunk)
-            chunks.append(TextChunk(
+            yield make_chunk(current_chunk, chunk_start_line, chunk_start_pos, current_type or 'paragraph', current_level)
+    
+    def split_by_blocks(self, segments: Iterable[Tuple[int, DocumentBlock, str]]) -> Iterator[TextChunk]:
+        """
+        由文档块直接生成结构块，不再对可翻译内容重新做正则切分
+        
+        segments 为文档处理器产出的 (块下标, 文档块, 可翻译文本)，可翻译内容即各文本以换行连接；
+        下标相邻的同类块（中间没有空行、代码等其他块）合为一个结构块，标题单独成块。
+        块的区间指向可翻译内容，block_range 为对应的文档块下标区间。
+        """
+        pending: List[str] = []
+        kind = None
+        level = 0
+        first_index = prev_index = 0
+        start_pos = start_line = 0
+        pos = line = 0
+        
+        def make_chunk() -> TextChunk:
+            chunk_content = '\n'.join(pending)
+            return TextChunk(
                 content=chunk_content,
-                chunk_type=current_type or 'paragraph',
-                level=current_level,
+                chunk_type=kind,
+                level=level,
                 start_pos=start_pos,
-                end_pos=start_pos + len(chunk_content)
-            ))
+                end_pos=start_pos + len(chunk_content),
+                start_line=start_line,
+                end_line=start_line + len(pending),
+                block_range=(first_index, prev_index + 1)
+            )
         
-        return chunks
+        for index, block, text in segments:
+            chunk_type = self.BLOCK_CHUNK_TYPES.get(block.type, 'paragraph')
+            if pending and (chunk_type == 'heading' or chunk_type != kind or index != prev_index + 1):
+                yield make_chunk()
+                pending = []
+            if not pending:
+                kind = chunk_type
+                level = block.metadata.get('level', 0) if chunk_type == 'heading' else 0
+                first_index = index
+                start_pos = pos
+                start_line = line
+            pending.append(text)
+            prev_index = index
+            pos += len(text) + 1
+            line += 1
+        
+        if pending:
+            yield make_chunk()
+    
+    def chunk_blocks(self, segments: Iterable[Tuple[int, DocumentBlock, str]]) -> List[TextChunk]:
+        """由文档块分块（split_by_blocks 后按预算打包），与对可翻译内容调用 chunk_text 相比少一遍解析"""
+        return list(self.iter_merged(self.split_by_blocks(segments)))
     
-    def merge_small_chunks(self, chunks: List[TextChunk]) -> List[TextChunk]:
+    def merge_small_chunks(self, chunks: List[TextChunk], source: Optional[str] = None) -> List[TextChunk]:
         """
         合并小文本块
+        
+        超过请求预算的块单独按句子切分；其余相邻块交给 _plan_groups 做保序的最优打包。
+        每个结构块只编码一次，合并后的 token 数由计数相加再加上分隔符处的精确修正（见 _join_cost）；
+        估计下界已超出预算的大块不整体编码，直接按句子切分；passthrough_types 中的块不产出，其前后分别打包。
+        提供分块时的原文 source 时，合并块的内容就是原文中的对应区间（块间空行原样保留）。
+        """
+        slice_source = (lambda start, end: source[start:end]) if source is not None else None
+        return list(self.iter_merged(chunks, source=slice_source))
+    
+    def iter_merged(self, chunks: Iterable[TextChunk], window: Optional[int] = None,
+                    source: Optional[Callable[[int, int], str]] = None) -> Iterator[TextChunk]:
+        """
+        merge_small_chunks 的流式版本
+        
+        Args:
+            chunks: 结构块（可以是 iter_structure 产出的生成器）
+            window: 累积的待打包块超过 window 个请求预算时，先对已累积部分打包并产出除最后一组外的结果，
+                最后一组留待与后续块一起打包；为 None 时整段一起打包（与 merge_small_chunks 一致）
+            source: 按字符区间取原文的函数（如 SourceBuffer.slice），用于取相邻块之间的原文；
+                合并块的内容 = 各块内容以原文中的间隔连接，与其区间的原文完全一致。
+                未提供时用等长的换行填充间隔（间隔只含空行时两者相同）
         """
-        merged_chunks = []
-        current_merged = None
+        budget = self.request_budget
+        run: List[Tuple[TextChunk, int, str]] = []  # (块, token 数, 与上一块之间的原文)
+        run_tokens = 0
         
         for chunk in chunks:
-            chunk_tokens = self.count_tokens(chunk.content)
-            
-            if chunk_tokens > self.max_tokens:
-                if current_merged:
-                    merged_chunks.append(current_merged)
-                    current_merged = None
-
-                split_chunks = self._split_large_chunk(chunk)
-                merged_chunks.extend(split_chunks)
+            if chunk.chunk_type in self.passthrough_types:
+                yield from self._merge_groups(run, self._plan_groups(run, budget))
+                run = []
+                run_tokens = 0
                 continue
-
-            if current_merged is None:
-                current_merged = TextChunk(
-                    content=chunk.content,
-                    chunk_type=chunk.chunk_type,
-                    level=chunk.level,
-                    start_pos=chunk.start_pos,
-                    end_pos=chunk.end_pos
-                )
+            content = chunk.content
+            # 短文本编码本身很快，只对长文本先估计（字符数不超过预算时 token 数一般也不会超）
+            count = self.estimator.bounds(content) if len(content) > budget or not self.exact else None
+            if count is not None and count.low > budget:
+                chunk_tokens = count.low
+            elif self.exact:
+                chunk_tokens = self.count_tokens_batch([content])[0]
+            else:
+                chunk_tokens = count.estimate
+            
+            if chunk_tokens > budget:
+                yield from self._merge_groups(run, self._plan_groups(run, budget))
+                run = []
+                run_tokens = 0
+                yield from self._split_large_chunk(chunk)
                 continue
-
-            merged_content = current_merged.content + '\n\n' + chunk.content
-            merged_tokens = self.count_tokens(merged_content)
+            run.append((chunk, chunk_tokens, self._gap_before(run[-1][0], chunk, source) if run else ''))
+            run_tokens += chunk_tokens
             
-            if merged_tokens <= self.max_tokens:
-
-                current_merged.content = merged_content
-                current_merged.end_pos = chunk.end_pos
-            else:
-
-                merged_chunks.append(current_merged)
-                current_merged = TextChunk(
-                    content=chunk.content,
-                    chunk_type=chunk.chunk_type,
-                    level=chunk.level,
-                    start_pos=chunk.start_pos,
-                    end_pos=chunk.end_pos
-                )
-        
-        if current_merged:
-            merged_chunks.append(current_merged)
-        
-        return merged_chunks
+            if window is not None and run_tokens > window * budget:
+                groups = self._plan_groups(run, budget)
+                yield from self._merge_groups(run, groups[:-1])
+                run = run[groups[-1][0]:]
+                run_tokens = sum(tokens for _, tokens, _ in run)
+        
+        yield from self._merge_groups(run, self._plan_groups(run, budget))
+    
+    @staticmethod
+    def _gap_before(previous: TextChunk, chunk: TextChunk,
+                    source: Optional[Callable[[int, int], str]]) -> str:
+        """相邻两块之间的原文（空行等）；没有原文时按区间长度用换行填充，没有区间时为一个空行"""
+        gap = chunk.start_pos - previous.end_pos
+        if gap <= 0:
+            return '\n\n'
+        return source(previous.end_pos, chunk.start_pos) if source is not None else '\n' * gap
+    
+    @staticmethod
+    def _merge_groups(run: List[Tuple[TextChunk, int, str]], groups: List[Tuple[int, int]]) -> Iterator[TextChunk]:
+        """按分组 [(i, j)] 合并 run[i:j] 中的块（含正文的组不标记为 code，以免只翻译注释）"""
+        for i, j in groups:
+            first, last = run[i][0], run[j - 1][0]
+            chunk_type = next((chunk.chunk_type for chunk, _, _ in run[i:j] if chunk.chunk_type != 'code'), 'code')
+            block_range = None
+            if first.block_range and last.block_range:
+                block_range = (first.block_range[0], last.block_range[1])
+            parts = [first.content]
+            for chunk, _, gap in run[i + 1:j]:
+                parts.append(gap)
+                parts.append(chunk.content)
+            yield TextChunk(
+                content=''.join(parts),
+                chunk_type=chunk_type,
+                level=first.level,
+                start_pos=first.start_pos,
+                end_pos=last.end_pos,
+                start_line=first.start_line,
+                end_line=last.end_line,
+                block_range=block_range
+            )
+    
+    def _plan_groups(self, run: List[Tuple[TextChunk, int, str]], budget: int) -> List[Tuple[int, int]]:
+        """
+        保序最优打包（动态规划），返回分组 [(i, j)]，每组为 run[i:j]
+        
+        把相邻块划分为若干组，每组合并后不超过 budget，按字典序最小化
+        (请求数, 不在标题处断开的次数, 各组 token 数平方和)：
+        请求数与贪心打包相同（贪心对保序划分的组数已是最优），在此前提下尽量在标题前断开，
+        并使各请求大小均衡，避免出现一个很满、一个很空的请求。
+        """
+        n = len(run)
+        if n == 0:
+            return []
+        
+        # prefix[k]: 前 k 块的 token 数之和；joins[k]: 第 k-1 与第 k 块之间分隔符的修正量累计
+        prefix = [0] * (n + 1)
+        joins = [0] * n
+        for k, (chunk, tokens, gap) in enumerate(run):
+            prefix[k + 1] = prefix[k] + tokens
+            if k > 0:
+                join = self._join_cost(run[k - 1][0].content, chunk.content, gap) if self.exact else JOIN_ESTIMATE
+                joins[k] = joins[k - 1] + join
+        
+        def group_tokens(i: int, j: int) -> int:
+            """块 i..j-1 合并后的 token 数"""
+            return prefix[j] - prefix[i] + joins[j - 1] - joins[i]
+        
+        best: List[Optional[Tuple[int, int, int]]] = [None] * (n + 1)
+        best[0] = (0, 0, 0)
+        cut = [0] * (n + 1)
+        for j in range(1, n + 1):
+            for i in range(j - 1, -1, -1):
+                tokens = group_tokens(i, j)
+                if tokens > budget:
+                    break
+                groups, misaligned, squares = best[i]
+                misaligned += 1 if i > 0 and run[i][0].chunk_type != 'heading' else 0
+                candidate = (groups + 1, misaligned, squares + tokens * tokens)
+                if best[j] is None or candidate < best[j]:
+                    best[j] = candidate
+                    cut[j] = i
+        
+        bounds = []
+        j = n
+        while j > 0:
+            bounds.append((cut[j], j))
+            j = cut[j]
+        return bounds[::-1]
+    
+    def _join_cost(self, left: str, right: str, separator: str = '\n\n') -> int:
+        """
+        计算 count_tokens(left + separator + right) - count_tokens(left) - count_tokens(right)
+        
+        tiktoken 先用正则预切分再逐段做 BPE，预切分结果只在拼接处附近变化：
+        left 最后一个内容行之前的换行、right 第一个内容行之后的空白（到最后一个换行为止）都是
+        稳定的切分点。因此只需编码两侧的边界行，代价与块长度无关，结果与整体编码完全一致。
+        Markdown 段落常为一整行长文本，行内字母与其后空格之间同样是稳定的切分点，取离拼接处更近者。
+        """
+        tail = left[max(self._last_line_start(left), self._last_word_break(left)):]
+        head = right[:min(self._first_line_end(right), self._first_word_break(right))]
+        return self.count_tokens(tail + separator + head) - self.count_tokens(tail) - self.count_tokens(head)
+    
+    @staticmethod
+    def _last_line_start(text: str) -> int:
+        """最后一个内容行的起始位置（其前面紧邻换行）；没有内容时为 0"""
+        last = len(text.rstrip()) - 1
+        if last < 0:
+            return 0
+        return text.rfind('\n', 0, last) + 1
+    
+    @staticmethod
+    def _last_word_break(text: str) -> int:
+        """最后一个“字母 + 空格”中空格的位置；没有时为 0"""
+        pos = text.rfind(' ')
+        while pos > 0:
+            if WORD_BREAK_PATTERN.match(text, pos - 1):
+                return pos
+            pos = text.rfind(' ', 0, pos - 1)
+        return 0
+    
+    @staticmethod
+    def _first_word_break(text: str) -> int:
+        """第一个“字母 + 空格”中空格的位置；没有时为文本长度"""
+        match = WORD_BREAK_PATTERN.search(text)
+        return match.start() + 1 if match else len(text)
+    
+    @staticmethod
+    def _first_line_end(text: str) -> int:
+        """第一个内容行及其后空白中最后一个换行之后的位置；其后没有内容时为文本长度"""
+        stripped = text.lstrip()
+        if not stripped:
+            return len(text)
+        newline = text.find('\n', len(text) - len(stripped))
+        if newline < 0:
+            return len(text)
+        end = newline
+        while end < len(text) and text[end].isspace():
+            end += 1
+        if end == len(text):
+            return len(text)
+        return text.rfind('\n', newline, end) + 1
     
     def _split_large_chunk(self, chunk: TextChunk) -> List[TextChunk]:
         """
         分割大文本块
+        
+        按句子边界切分，每个子块是原文中的一段连续区间（保留句间原有的空白与换行）
         """
-        if chunk.chunk_type == 'code':
-            # 代码块不分
+        if chunk.chunk_type in self.unsplit_types:
+            # 代码块等不分
             return [chunk]
         
-        sentences = re.split(r'(?<=[.!?])\s+', chunk.content)
+        text = chunk.content
+        sentences = []
+        pos = 0
+        for match in re.finditer(r'(?<=[.!?])\s+', text):
+            sentences.append((pos, match.start()))
+            pos = match.end()
+        sentences.append((pos, len(text)))
+        
         split_chunks = []
-        current_content = []
+        line = chunk.start_line
+        cursor = 0
+        
+        def make_piece(start: int, end: int) -> TextChunk:
+            # 行号按已扫描位置递增累加，整个块只扫描一遍
+            nonlocal line, cursor
+            line += text.count('\n', cursor, start)
+            cursor = start
+            end_line = line + text.count('\n', start, end) + 1
+            block_range = None
+            if chunk.block_range:
+                # 结构块的各行依次对应相邻的文档块
+                first_block = chunk.block_range[0] - chunk.start_line
+                block_range = (first_block + line, first_block + end_line)
+            return TextChunk(
+                content=text[start:end],
+                chunk_type=chunk.chunk_type,
+                level=chunk.level,
+                start_pos=chunk.start_pos + start,
+                end_pos=chunk.start_pos + end,
+                start_line=line,
+                end_line=end_line,
+                block_range=block_range
+            )
+        
+        # 各句一次批量精确计数（不再编码整个大块）
+        sentences = [(start, end) for start, end in sentences if start != end]
+        counts = self.count_tokens_batch([text[start:end] for start, end in sentences])
+        
+        piece_start = None
+        piece_end = 0
         current_tokens = 0
         
-        for sentence in sentences:
-            sentence_tokens = self.count_tokens(sentence)
-            
-            if current_tokens + sentence_tokens > self.max_tokens and current_content:
+        for (start, end), sentence_tokens in zip(sentences, counts):
+            if current_tokens + sentence_tokens > self.request_budget and piece_start is not None:
                 # 生成新块
-                split_chunks.append(TextChunk(
-                    content=' '.join(current_content),
-                    chunk_type=chunk.chunk_type,
-                    level=chunk.level
-                ))
-                current_content = [sentence]
+                split_chunks.append(make_piece(piece_start, piece_end))
+                piece_start = start
                 current_tokens = sentence_tokens
             else:
-                current_content.append(sentence)
+                if piece_start is None:
+                    piece_start = start
                 current_tokens += sentence_tokens
+            piece_end = end
         
-        if current_content:
-            split_chunks.append(TextChunk(
-                content=' '.join(current_content),
-                chunk_type=chunk.chunk_type,
-                level=chunk.level
-            ))
+        if piece_start is not None:
+            split_chunks.append(make_piece(piece_start, piece_end))
         
         return split_chunks if split_chunks else [chunk]
     
+    def splice(self, source: str, chunks: List[TextChunk], replacements: List[str]) -> str:
+        """
+        把译文按区间拼接回原文
+        
+        块之间的原文（空行等）原样保留，每个块首尾的空白也保留，只替换块内的正文；
+        替换为 None 的块保留原文，可用于局部替换。
+        
+        Args:
+            source: 分块时的原文
+            chunks: 带有精确区间的文本块（按原文顺序）
+            replacements: 与 chunks 一一对应的替换文本
+        """
+        pieces = []
+        prev = 0
+        for chunk, text in zip(chunks, replacements):
+            original = source[chunk.start_pos:chunk.end_pos]
+            pieces.append(source[prev:chunk.start_pos])
+            pieces.append(self.replace_body(original, text, chunk.chunk_type))
+            prev = chunk.end_pos
+        pieces.append(source[prev:])
+        return ''.join(pieces)
+    
+    @staticmethod
+    def replace_body(original: str, text: Optional[str], chunk_type: Optional[str] = None) -> str:
+        """
+        用 text 替换 original 的正文，保留其首尾空白；text 为 None 时返回原文
+        
+        chunk_type 属于 SINGLE_LINE_TYPES 时，译文各行去掉首尾空白后合成一行
+        """
+        if text is None:
+            return original
+        body = original.strip()
+        lead = original[:len(original) - len(original.lstrip())] if body else ''
+        trail = original[len(original.rstrip()):] if body else original
+        text = text.strip()
+        if chunk_type in SINGLE_LINE_TYPES:
+            text = ' '.join(line.strip() for line in text.split('\n') if line.strip())
+        return lead + text + trail
+    
+    @staticmethod
+    def has_spans(source: str, chunks: List[TextChunk]) -> bool:
+        """块是否带有可用于拼接的区间（按顺序、互不重叠且不超出原文）"""
+        prev = 0
+        for chunk in chunks:
+            if chunk.end_pos <= chunk.start_pos or chunk.start_pos < prev or chunk.end_pos > len(source):
+                return False
+            prev = chunk.end_pos
+        return bool(chunks)
+    
+    def iter_chunks(self, lines: Iterable[str], window: int = PACK_WINDOW,
+                    source: Optional[Callable[[int, int], str]] = None) -> Iterator[TextChunk]:
+        """
+        流式分块：逐行读入，结构块闭合后即参与打包，累积约 window 个请求的内容就开始产出
+        
+        Args:
+            lines: 行迭代器（不含换行符，如 line_stream.iter_lines）
+            window: 打包窗口（以请求预算为单位）
+            source: 按区间取原文的函数（同 iter_merged，如包装 lines 的 SourceBuffer.slice）
+        """
+        return self.iter_merged(self.iter_structure(lines), window=window, source=source)
+    
     def chunk_text(self, content: str) -> List[TextChunk]:
         """
         主要的分块方法
-        """
-        # 按结构分块
-        structural_chunks = self.split_by_structure(content)
-        # 合并小块
-        optimized_chunks = self.merge_small_chunks(structural_chunks)
         
-        return optimized_chunks
\ No newline at end of file
+        与流式分块 iter_chunks 使用相同的打包窗口，并同样按区间从原文取合并块的内容，
+        因此同一输入在两种模式下发出完全相同的请求
+        """
+        # 按结构分块，再合并小块
+        return list(self.iter_merged(
+            self.split_by_structure(content), window=PACK_WINDOW,
+            source=lambda start, end: content[start:end]
+        ))
\ No newline at end of file
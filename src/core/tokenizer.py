@@ -0,0 +1,400 @@
+"""
+分词器
+按模型加载 token 编码器：BPE 文件缓存在本地目录，离线环境可预先放入；Qwen 可选加载本地 tokenizer.json。
+每种编码在进程内只加载一次，由所有分块器共享；TokenCalibration 把本地计数与 API 报告的用量对比
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import tiktoken
+
+from ..utils.config import config_manager
+
+
+DEFAULT_TOKENIZER_DIR = Path.home() / ".cache" / "lt" / "tokenizers"
+# tiktoken 按下载地址的 sha1 命名缓存文件
+TIKTOKEN_BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class TiktokenTokenizer:
+    """tiktoken 编码器（特殊 token 按普通文本计数）"""
+
+    def __init__(self, encoding: "tiktoken.Encoding"):
+        self.encoding = encoding
+        self.name = encoding.name
+
+    def encode(self, text: str) -> List[int]:
+        return self.encoding.encode_ordinary(text)
+
+    def encode_batch(self, texts: List[str], num_threads: int = 8) -> List[List[int]]:
+        # 线程数不超过 CPU 数；单核时线程池只有开销
+        num_threads = min(num_threads, os.cpu_count() or 1)
+        if num_threads <= 1 or len(texts) < 2:
+            return [self.encoding.encode_ordinary(text) for text in texts]
+        return self.encoding.encode_ordinary_batch(texts, num_threads=num_threads)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+
+class HFTokenizer:
+    """本地 tokenizer.json 编码器（HuggingFace tokenizers，如 Qwen）"""
+
+    def __init__(self, tokenizer, name: str):
+        self.tokenizer = tokenizer
+        self.name = name
+
+    def encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_special_tokens=False).ids
+
+    def encode_batch(self, texts: List[str], num_threads: int = 8) -> List[List[int]]:
+        # tokenizers 在 Rust 侧自行并行
+        return [e.ids for e in self.tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+    def count(self, text: str) -> int:
+        return len(self.encode(text))
+
+
+_tokenizers: Dict[str, object] = {}  # 编码键 -> 编码器
+_model_tokenizers: Dict[str, object] = {}  # 模型名 -> 编码器
+_tokenizers_lock = threading.Lock()
+_warned: set = set()
+
+
+def tokenizer_dir() -> Path:
+    """分词器本地缓存目录（LT_TOKENIZER_DIR / config.ini [tokenizer] cache_dir / 默认目录）"""
+    configured = config_manager.get_tokenizer_config()['cache_dir']
+    return Path(configured).expanduser() if configured else DEFAULT_TOKENIZER_DIR
+
+
+def get_tokenizer(model: str):
+    """
+    获取模型对应的编码器（进程内单例）
+
+    - Qwen：配置了本地 tokenizer.json（或缓存目录下存在 qwen/tokenizer.json）且安装了 tokenizers 时使用它，
+      否则按 cl100k_base 近似计数
+    - 其他模型：tiktoken 对应的编码，未知模型使用 cl100k_base
+    """
+    tokenizer = _model_tokenizers.get(model)
+    if tokenizer is not None:
+        return tokenizer
+    key, loader = _resolve(model)
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(key)
+        if tokenizer is None:
+            tokenizer = loader()
+            _tokenizers[key] = tokenizer
+        _model_tokenizers[model] = tokenizer
+    return tokenizer
+
+
+def _resolve(model: str):
+    """返回 (单例键, 加载函数)"""
+    lower_model = model.lower()
+    if lower_model.startswith('qwen'):
+        path = _qwen_tokenizer_file()
+        if path is not None:
+            try:
+                from tokenizers import Tokenizer
+            except ImportError:
+                _warn_once("tokenizers", f"未安装 tokenizers，无法加载 {path}，Qwen 按 {DEFAULT_ENCODING} 近似计数")
+            else:
+                return f"hf:{path}", lambda: HFTokenizer(Tokenizer.from_file(str(path)), name=f"qwen:{path.name}")
+        else:
+            _warn_once("qwen", f"未找到本地 Qwen 分词器文件，Qwen 按 {DEFAULT_ENCODING} 近似计数")
+        name = DEFAULT_ENCODING
+    else:
+        try:
+            name = tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            name = DEFAULT_ENCODING
+    return f"tiktoken:{name}", lambda: TiktokenTokenizer(_load_tiktoken(name))
+
+
+def _qwen_tokenizer_file() -> Optional[Path]:
+    configured = config_manager.get_tokenizer_config()['qwen_tokenizer_file']
+    path = Path(configured).expanduser() if configured else tokenizer_dir() / "qwen" / "tokenizer.json"
+    return path if path.is_file() else None
+
+
+def _load_tiktoken(name: str) -> "tiktoken.Encoding":
+    """
+    加载 tiktoken 编码，BPE 文件缓存在本地目录而不是系统临时目录
+
+    缓存目录下的 <name>.tiktoken（如从联网机器拷贝的文件）会先放入 tiktoken 的缓存，
+    由 tiktoken 校验哈希，因此离线环境不会触发下载。
+    未设置 TIKTOKEN_CACHE_DIR 时只在加载期间指向本地缓存目录，加载后恢复（调用方持有 _tokenizers_lock）。
+    """
+    directory = tokenizer_dir()
+    previous = os.environ.get("TIKTOKEN_CACHE_DIR")
+    cache_setting = previous if previous is not None else str(directory / "tiktoken")
+    cache_dir = Path(cache_setting)
+    local_file = directory / f"{name}.tiktoken"
+    if local_file.is_file() and cache_setting:  # 空字符串表示禁用 tiktoken 缓存
+        cached = cache_dir / hashlib.sha1(TIKTOKEN_BPE_URL.format(name=name).encode()).hexdigest()
+        if not cached.exists():
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(local_file, cached)
+    if previous is None:
+        os.environ["TIKTOKEN_CACHE_DIR"] = cache_setting
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        raise RuntimeError(
+            f"无法加载编码 {name}: {e}\n"
+            f"离线环境请将 {name}.tiktoken 放入 {directory}（或拷贝联网机器上的 {cache_dir} 目录）"
+        ) from e
+    finally:
+        if previous is None:
+            os.environ.pop("TIKTOKEN_CACHE_DIR", None)
+
+
+def _warn_once(key: str, message: str):
+    with _tokenizers_lock:
+        if key in _warned:
+            return
+        _warned.add(key)
+    print(message)
+
+
+@dataclass
+class _CalibrationStats:
+    """单个模型的校准样本统计"""
+    tokenizer: str
+    samples: int = 0
+    local_prompt: int = 0
+    api_prompt: int = 0
+    local_completion: int = 0
+    api_completion: int = 0
+    abs_error: float = 0.0  # 各次请求输入 token 相对误差之和
+    # 最小二乘拟合 api = scale * local + overhead 所需的累计量
+    sx: float = 0.0
+    sy: float = 0.0
+    sxx: float = 0.0
+    sxy: float = 0.0
+
+
+class TokenCalibration:
+    """
+    分词器校准
+
+    每次调用后用本地编码器计数提示词与输出，与 API 报告的 prompt_tokens / completion_tokens 对比；
+    report 给出各模型的总量比例、平均相对误差，以及拟合出的比例系数与每次请求的固定开销（聊天模板等）。
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, _CalibrationStats] = {}
+        self._lock = threading.Lock()
+
+    def recorder(self, model: str) -> Callable[[str, str, int, int], None]:
+        """返回供 LLMFactory 使用的记录函数 (提示词, 输出, API 输入 token 数, API 输出 token 数)"""
+        def record(prompt_text: str, output_text: str, prompt_tokens: int, completion_tokens: int):
+            self.record(model, prompt_text, output_text, prompt_tokens, completion_tokens)
+        return record
+
+    def record(self, model: str, prompt_text: str, output_text: str,
+               prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        """记录一次调用（API 未报告用量时忽略）"""
+        if not prompt_tokens:
+            return
+        tokenizer = get_tokenizer(model)
+        local_prompt = tokenizer.count(prompt_text)
+        local_completion = tokenizer.count(output_text or "")
+        with self._lock:
+            stats = self._stats.setdefault(model, _CalibrationStats(tokenizer=tokenizer.name))
+            stats.samples += 1
+            stats.local_prompt += local_prompt
+            stats.api_prompt += prompt_tokens
+            stats.local_completion += local_completion
+            stats.api_completion += completion_tokens or 0
+            stats.abs_error += abs(prompt_tokens - local_prompt) / prompt_tokens
+            stats.sx += local_prompt
+            stats.sy += prompt_tokens
+            stats.sxx += local_prompt * local_prompt
+            stats.sxy += local_prompt * prompt_tokens
+
+    def report(self) -> Dict[str, Dict]:
+        """各模型的校准结果"""
+        with self._lock:
+            items = [(model, _CalibrationStats(**vars(stats))) for model, stats in self._stats.items()]
+        result = {}
+        for model, stats in items:
+            n = stats.samples
+            denominator = n * stats.sxx - stats.sx * stats.sx
+            if n > 1 and denominator:
+                scale = (n * stats.sxy - stats.sx * stats.sy) / denominator
+                overhead = (stats.sy - scale * stats.sx) / n
+            else:
+                scale, overhead = None, None
+            result[model] = {
+                "tokenizer": stats.tokenizer,
+                "samples": n,
+                "local_prompt_tokens": stats.local_prompt,
+                "api_prompt_tokens": stats.api_prompt,
+                "prompt_ratio": round(stats.api_prompt / stats.local_prompt, 3) if stats.local_prompt else None,
+                "mean_abs_error": round(stats.abs_error / n, 3),
+                "local_completion_tokens": stats.local_completion,
+                "api_completion_tokens": stats.api_completion,
+                "completion_ratio": (
+                    round(stats.api_completion / stats.local_completion, 3) if stats.local_completion else None
+                ),
+                "fitted_scale": round(scale, 3) if scale is not None else None,
+                "fitted_overhead": round(overhead, 1) if overhead is not None else None
+            }
+        return result
+
+
+# 估计器特征：ASCII 字母、空格、换行、ASCII 标点、数字、非 ASCII 多出的字节数、常数项
+_PUNCTUATION = '!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'
+_DROP_PUNCTUATION = str.maketrans('', '', _PUNCTUATION)
+_DROP_DIGITS = str.maketrans('', '', '0123456789')
+# cl100k_base 上英文技术文档的粗略系数，用于精确计数样本不足时
+DEFAULT_COEFFICIENTS = (0.2, 0.05, 0.5, 0.7, 0.4, 0.5, 1.0)
+
+
+@dataclass
+class TokenCount:
+    """token 数的估计值与上下界（精确值时三者相等）"""
+    estimate: int
+    low: int
+    high: int
+
+    @classmethod
+    def of(cls, tokens: int) -> "TokenCount":
+        return cls(tokens, tokens, tokens)
+
+
+class TokenEstimator:
+    """
+    快速 token 数估计器
+
+    按字符类别与 UTF-8 字节长度的线性模型估计 token 数，只用 str 的内置方法（C 实现）计算特征，
+    比 BPE 编码快一个数量级以上。误差界 [估计 * (1 - margin) - slack, 估计 * (1 + margin) + slack]
+    供打包时判断：上界不超过预算时一定放得下，下界超过预算时一定放不下，只有跨越预算的情况才需要精确计数。
+
+    精确计数通过 observe 反馈给估计器（样本满 max_samples 之前，或显式 calibrate）：新样本数达到已有样本数（至少 min_samples）时用最小二乘
+    重新拟合系数，并按最近样本的最大误差设置 margin；精确值落在误差界之外时立即放宽 margin。
+    """
+
+    def __init__(self,
+                 coefficients: Tuple[float, ...] = DEFAULT_COEFFICIENTS,
+                 margin: float = 0.5,
+                 slack: int = 4,
+                 min_samples: int = 32,
+                 max_samples: int = 512):
+        """
+        Args:
+            coefficients: 各特征的初始系数
+            margin: 初始相对误差界（拟合后按样本误差更新）
+            slack: 绝对误差余量（token），覆盖很短文本的取整误差
+            min_samples: 开始拟合所需的精确计数样本数
+            max_samples: 保留用于拟合的最近样本数
+        """
+        self.coefficients = tuple(coefficients)
+        self.margin = margin
+        self.slack = slack
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self._samples: List[Tuple[Tuple[int, ...], int]] = []
+        self._since_fit = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def features(text: str) -> Tuple[int, ...]:
+        chars = len(text)
+        extra_bytes = len(text.encode('utf-8')) - chars
+        spaces = text.count(' ') + text.count('\t')
+        newlines = text.count('\n')
+        without_punctuation = text.translate(_DROP_PUNCTUATION)
+        punctuation = chars - len(without_punctuation)
+        digits = len(without_punctuation) - len(without_punctuation.translate(_DROP_DIGITS))
+        # 非 ASCII 字符大多是 3 字节的 CJK 字符
+        letters = max(0, chars - spaces - newlines - punctuation - digits - extra_bytes // 2)
+        return (letters, spaces, newlines, punctuation, digits, extra_bytes, 1)
+
+    def _estimate(self, features: Tuple[int, ...]) -> float:
+        return max(0.0, sum(c * f for c, f in zip(self.coefficients, features)))
+
+    def estimate(self, text: str) -> int:
+        """估计 token 数"""
+        return round(self._estimate(self.features(text))) if text else 0
+
+    def bounds(self, text: str) -> TokenCount:
+        """估计值与误差界"""
+        if not text:
+            return TokenCount.of(0)
+        value = self._estimate(self.features(text))
+        return TokenCount(
+            estimate=round(value),
+            low=max(0, int(value * (1 - self.margin)) - self.slack),
+            high=int(value * (1 + self.margin)) + 1 + self.slack
+        )
+
+    @property
+    def calibrated(self) -> bool:
+        """样本是否已满（之后的精确计数可以不再反馈）"""
+        return len(self._samples) >= self.max_samples
+
+    def observe(self, text: str, tokens: int):
+        """反馈一个精确计数"""
+        features = self.features(text)
+        with self._lock:
+            value = self._estimate(features)
+            if value > 0:
+                error = (abs(tokens - value) - self.slack) / value
+                if error > self.margin:
+                    self.margin = error * 1.25
+            self._samples.append((features, tokens))
+            if len(self._samples) > self.max_samples:
+                del self._samples[:len(self._samples) - self.max_samples]
+            self._since_fit += 1
+            if self._since_fit >= max(self.min_samples, len(self._samples) - self._since_fit):
+                self._fit()
+
+    def calibrate(self, texts: List[str], tokenizer) -> "TokenEstimator":
+        """用一批文本的精确计数（encode_batch 多线程编码）校准"""
+        texts = [text for text in texts if text]
+        for text, ids in zip(texts, tokenizer.encode_batch(texts)):
+            self.observe(text, len(ids))
+        with self._lock:
+            if self._since_fit and len(self._samples) >= self.min_samples:
+                self._fit()
+        return self
+
+    def _fit(self):
+        """最小二乘拟合系数（非负），margin 取样本上的最大相对误差"""
+        import numpy as np
+        x = np.array([features for features, _ in self._samples], dtype=float)
+        y = np.array([tokens for _, tokens in self._samples], dtype=float)
+        # 没有出现过的特征不参与拟合，保留原系数
+        used = (x[:, :-1] != 0).any(axis=0).tolist() + [True]
+        columns = [k for k, flag in enumerate(used) if flag]
+        solution, *_ = np.linalg.lstsq(x[:, columns], y, rcond=None)
+        coefficients = list(self.coefficients)
+        for k, value in zip(columns, solution.tolist()):
+            coefficients[k] = max(0.0, value)
+        self.coefficients = tuple(coefficients)
+        values = np.maximum(x @ np.array(self.coefficients), 1e-9)
+        errors = (np.abs(y - values) - self.slack) / values
+        self.margin = max(0.05, float(errors.max()) * 1.25)
+        self._since_fit = 0
+
+
+_estimators: Dict[object, TokenEstimator] = {}  # 编码器 -> 估计器
+
+
+def get_estimator(model: str) -> TokenEstimator:
+    """获取模型编码器对应的估计器（与编码器一样在进程内共享，校准结果也共享）"""
+    tokenizer = get_tokenizer(model)
+    estimator = _estimators.get(tokenizer)
+    if estimator is None:
+        with _tokenizers_lock:
+            estimator = _estimators.setdefault(tokenizer, TokenEstimator())
+    return estimator
@@ -22,7 +22,9 @@ class TranslationAgent:
                  provider: str = None,
                  openai_api_key: str = None,
                  openai_base_url: str = None,
-                 qwen_api_key: str = None):
+                 qwen_api_key: str = None,
+                 cache_dir: str = None,
+                 verification_method: str = "summary"):
         """
         初始化翻译代理
         """
@@ -34,7 +36,9 @@ class TranslationAgent:
             model_name, provider=provider,
             openai_api_key=openai_api_key,
             openai_base_url=openai_base_url,
-            qwen_api_key=qwen_api_key
+            qwen_api_key=qwen_api_key,
+            cache_dir=cache_dir,
+            verification_method=verification_method
         )
         
     def translate_file(self, 
@@ -204,17 +208,13 @@ class TranslationAgent:
         _, original_content = self.parser.parse_file(original_file)
         _, translated_content = self.parser.parse_file(translated_file)
         
-        # 生成摘要并比较
-        original_summary = self.translator.summary_generator.generate_original_summary(original_content)
-        translated_summary = self.translator.summary_generator.generate_translated_summary(translated_content)
-        
-        comparison_result = self.translator.summary_generator.compare_summaries(
-            original_summary, translated_summary
-        )
+        # 生成摘要并比较（structured 模式下为单次结构化校验）
+        verification = self.translator.verify_translation(original_content, translated_content)
+        comparison_result = verification["comparison_result"]
         
         return {
-            "original_summary": original_summary,
-            "translated_summary": translated_summary,
+            "original_summary": verification["original_summary"],
+            "translated_summary": verification["translated_summary"],
             "comparison_result": comparison_result,
             "validation_score": comparison_result["completeness_score"]
         }
\ No newline at end of file
@@ -2,17 +2,30 @@
 翻译器
 """
 
-from typing import List, Dict, Tuple
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple, Optional, TypeVar
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import BaseOutputParser
 from tqdm import tqdm
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import random
 import re
 import os
+import threading
 
 from .text_chunker import TextChunk, MarkdownChunker
 from .summary_generator import SummaryGenerator
 from .markdown_parser import Metadata
-from ..utils.llm_factory import LLMFactory
+from .integrity_checker import StructuralIntegrityChecker, IntegrityReport, FAILURE_MARKER
+from .segment_index import SegmentIndex
+from .refine_budget import RefineBudget
+from .retry_queue import RetryQueue
+from .tokenizer import TokenCalibration
+from ..utils.llm_factory import LLMFactory, UsageRecorder
+from ..utils.cache import ResultCache
+
+
+T = TypeVar("T")
 
 
 class TranslationOutputParser(BaseOutputParser):
@@ -27,12 +40,58 @@ class TranslationOutputParser(BaseOutputParser):
             return str(text).strip()
 
 
+# 校验策略
+VERIFY_MODES = ("off", "local", "sampled", "full")
+
+# 可以通过拆分文本块重试解决的错误（上下文长度超限、超时）
+SPLIT_RETRY_MARKERS = (
+    "context length", "context_length", "maximum context", "too long", "too many tokens",
+    "token limit", "range of input length", "timeout", "timed out",
+)
+
+
 class SmartTranslator:
     """翻译"""
     
     def __init__(self, model_name: str = "gpt-3.5-turbo", temperature: float = 0.1, provider: str = None, 
-                 openai_api_key: str = None, openai_base_url: str = None, qwen_api_key: str = None):
+                 openai_api_key: str = None, openai_base_url: str = None, qwen_api_key: str = None,
+                 cache_dir: str = None, verification_method: str = "summary",
+                 chunk_verify: bool = False, refine_threshold: int = 8, max_workers: int = 4,
+                 local_gate: bool = False, verify_mode: str = "full", sample_rate: float = 0.2,
+                 sample_seed: int = None, refine_token_budget: int = 20000,
+                 batch_refine_token_budget: int = None, max_refine_rounds: int = 2,
+                 escalation_model: str = None, short_segment_tokens: int = 40,
+                 max_split_depth: int = 4, retry_attempts: int = 3, retry_base_delay: float = 2.0):
+        """
+        Args:
+            cache_dir: 摘要/比较结果的磁盘缓存目录（可选）
+            verification_method: 完整性校验方式，summary 为 摘要+摘要+比较 三次调用，
+                structured 为单次 JSON 结构化校验（失败时回退到 summary）
+            chunk_verify: 是否在每个块翻译完成后立即并行校验该块，并只重译被标记的块
+            refine_threshold: 触发重译的完整性评分阈值（0-10）
+            max_workers: 并行翻译与校验的最大线程数
+            local_gate: 是否先运行本地结构检查；检查通过时跳过 LLM 校验，
+                不通过时直接重译被标记的块
+            verify_mode: 校验策略，off 不校验；local 仅本地结构检查；
+                sampled 本地检查后对有风险的文件/块及随机抽样部分做 LLM 校验；full 全量 LLM 校验
+            sample_rate: sampled 模式下本地检查通过的文件/块被抽中做 LLM 校验的概率
+            sample_seed: 抽样随机种子（可选，便于复现）
+            refine_token_budget: 单个文件重译的预估 token 预算（None 表示不限）
+            batch_refine_token_budget: 本实例处理的所有文件重译的预估 token 预算（None 表示不限）
+            max_refine_rounds: 单个文件最多重译轮数（评分不再提升时提前停止）
+            escalation_model: 模型级联的升级模型（如 qwen-max）。设置后 model_name 作为首轮的廉价模型，
+                本地检查或逐片段校验未通过的片段改用该模型重译
+            short_segment_tokens: 级联时短于该 token 数的片段（以及标题、列表项）只做本地检查
+            max_split_depth: 上下文超长或超时时递归拆分重试的最大深度
+            retry_attempts: 失败单元的最大尝试次数（含首次），其余尝试在文件末尾统一进行
+            retry_base_delay: 延迟重试第一轮前的等待秒数（之后每轮翻倍）
+        """
 
+        # 本地 token 计数与 API 报告用量的对比
+        self.token_calibration = TokenCalibration()
+        # 各模型层级的 API 用量（翻译、校验、重译等全部调用）
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._usage_lock = threading.Lock()
         # 使用LLM_factory创建模型实例
         self.llm = LLMFactory.create_llm(
             model_name=model_name,
@@ -40,14 +99,53 @@ class SmartTranslator:
             temperature=temperature,
             openai_api_key=openai_api_key,
             openai_base_url=openai_base_url,
-            qwen_api_key=qwen_api_key
+            qwen_api_key=qwen_api_key,
+            usage_recorder=self._usage_recorder(model_name)
         )
         self.model_name = model_name
+        self.escalation_llm = None
+        self.escalation_model = escalation_model
+        if escalation_model:
+            self.escalation_llm = LLMFactory.create_llm(
+                model_name=escalation_model,
+                provider=provider,
+                temperature=temperature,
+                openai_api_key=openai_api_key,
+                openai_base_url=openai_base_url,
+                qwen_api_key=qwen_api_key,
+                usage_recorder=self._usage_recorder(escalation_model)
+            )
+        self.short_segment_tokens = short_segment_tokens
+        self._splits: List[Dict] = []
+        self.max_split_depth = max_split_depth
+        self.retry_attempts = retry_attempts
+        self.retry_base_delay = retry_base_delay
+        if verification_method not in ("summary", "structured"):
+            raise ValueError(f"不支持的校验方式: {verification_method}")
+        self.verification_method = verification_method
+        self.chunk_verify = chunk_verify
+        self.refine_threshold = refine_threshold
+        self.max_workers = max(1, max_workers)
+        self.local_gate = local_gate
+        if verify_mode not in VERIFY_MODES:
+            raise ValueError(f"不支持的校验策略: {verify_mode}")
+        self.verify_mode = verify_mode
+        self.sample_rate = sample_rate
+        self._rng = random.Random(sample_seed)
+        self.integrity_checker = StructuralIntegrityChecker()
         
         self.chunker = MarkdownChunker(max_tokens=800, model=model_name)
+        self.refine_budget = RefineBudget(
+            file_token_budget=refine_token_budget,
+            batch_token_budget=batch_refine_token_budget,
+            max_rounds=max_refine_rounds,
+            history_file=os.path.join(cache_dir, "refine_history.json") if cache_dir else None,
+            token_counter=self.chunker.count_tokens
+        )
         self.summary_generator = SummaryGenerator(
             model_name, temperature=0.2, provider=provider,
-            openai_api_key=openai_api_key, openai_base_url=openai_base_url, qwen_api_key=qwen_api_key
+            openai_api_key=openai_api_key, openai_base_url=openai_base_url, qwen_api_key=qwen_api_key,
+            cache=ResultCache(cache_dir), usage_recorder=self._usage_recorder(model_name)
         )
         
         # 翻译prompt模板
@@ -56,7 +154,7 @@ class SmartTranslator:
 
 翻译要求：
 1. 准确传达原文的含义和语调
-2. 保持Markdown格式完全不变（标题、列表、代码块、链接等）
+2. 保持Markdown / reStructuredText格式完全不变（标题及其下划线、列表、代码块、链接、指令等）
 3. 使用地道的中文表达，符合中文阅读习惯
 4. 保持专业术语的准确性和一致性
 5. 对于代码、URL、专有名词等，保持原文不变
@@ -100,30 +198,198 @@ class SmartTranslator:
             | self.llm 
             | TranslationOutputParser()
         )
+        
+        # 模型级联：升级模型使用同一翻译模板
+        self.escalation_chain = None
+        if self.escalation_llm is not None:
+            self.escalation_chain = (
+                self.translation_template
+                | self.escalation_llm
+                | TranslationOutputParser()
+            )
+        
+        # 单片段改进prompt模板（定向重译时每个片段连同上下文单独请求，并行执行）
+        self.segment_refine_template = ChatPromptTemplate.from_template(
+            """你是专业的英译汉翻译专家。请改进“待改进片段”的中文译文，确保包含以下可能遗漏的信息：
+{missing_content}
+
+要求：
+1. 保持{doc_format}格式完全不变（标题、列表、行内代码、链接等）
+2. 上文和下文仅供理解语境，不要翻译或输出
+3. 如果当前译文已经完整准确，原样输出当前译文
+4. 只输出待改进片段的完整中文译文，不要添加任何解释或说明
+
+上文：
+{before}
+
+待改进片段原文：
+{source}
+
+当前译文：
+{translation}
+
+下文：
+{after}
+
+改进后的译文："""
+        )
+        
+        self.segment_refine_chain = (
+            self.segment_refine_template
+            | self.llm
+            | TranslationOutputParser()
+        )
     
-    def translate_chunk(self, chunk: TextChunk) -> str:
+    def translate_chunk(self, chunk: TextChunk, escalate: bool = False) -> str:
         """
         翻译单个文本块
+        
+        上下文超长或超时时按结构（段落、行、句子）递归拆分后并行重试，再按原分隔符合并；
+        最终失败时返回带失败标记的原文
+        
+        Args:
+            chunk: 文本块
+            escalate: 是否使用级联的升级模型（未配置时忽略）
         """
         try:
-            if chunk.chunk_type == 'code':
-                # 代码块特殊处理 - 只翻译注释
-                return self._translate_code_block(chunk.content)
-            
-            translation = self.translation_chain.invoke({
-                "content": chunk.content
-            })
-            
-            return translation
-            
+            return self._translate_with_split(chunk, escalate)
         except Exception as e:
             print(f"翻译文本块时出错: {e}")
-            return f"翻译失败: {chunk.content}"
-    
-    def _translate_code_block(self, code_content: str) -> str:
+            return f"{FAILURE_MARKER} {chunk.content}"
+
+    def _translate_with_split(self, chunk: TextChunk, escalate: bool = False) -> str:
+        """翻译单个文本块，超长或超时时拆分重试；仍然失败时抛出异常"""
+        try:
+            return self._translate_once(chunk, escalate)
+        except Exception as e:
+            if not self._is_split_retryable(e):
+                raise
+            print(f"文本块过长或超时，拆分后重试: {e}")
+            translation, depth, failed = self._split_and_translate(chunk, escalate, 1)
+            self._record_split(len(chunk.content), depth, failed)
+            if failed:
+                raise RuntimeError(f"拆分重试后仍有片段失败: {e}")
+            return translation
+
+    def _translate_once(self, chunk: TextChunk, escalate: bool = False) -> str:
+        """单次翻译调用，出错时抛出异常"""
+        if escalate and self.escalation_chain is not None:
+            chain = self.escalation_chain
+        else:
+            chain = self.translation_chain
+        
+        if chunk.chunk_type == 'code':
+            # 代码块特殊处理 - 只翻译注释
+            return self._translate_code_block(chunk.content, chain)
+        
+        return chain.invoke({
+            "content": chunk.content
+        })
+
+    @staticmethod
+    def _is_split_retryable(error: Exception) -> bool:
+        """上下文长度超限或超时错误可以通过拆分重试解决"""
+        if isinstance(error, TimeoutError) or 'timeout' in type(error).__name__.lower():
+            return True
+        message = str(error).lower()
+        return any(marker in message for marker in SPLIT_RETRY_MARKERS)
+
+    @staticmethod
+    def _split_for_retry(text: str) -> Tuple[List[str], str]:
         """
-        翻译代码块，只翻译注释部分
+        按结构将文本拆成前后两半：优先空行（段落），其次换行（行、列表项），再次句子边界
+        
+        Returns:
+            (片段列表, 合并时使用的分隔符)；无法再拆分时片段列表为空
         """
+        for pattern, separator in ((r'\n\s*\n', '\n\n'), (r'\n', '\n'), (r'(?<=[.!?;:])\s+', ' ')):
+            units = [u for u in re.split(pattern, text.strip('\n')) if u.strip()]
+            if len(units) < 2:
+                continue
+            # 按长度分成大致相等的两半
+            total = sum(len(u) for u in units)
+            running = 0
+            cut = 1
+            for i, unit in enumerate(units[:-1], 1):
+                running += len(unit)
+                cut = i
+                if running >= total / 2:
+                    break
+            return [separator.join(units[:cut]), separator.join(units[cut:])], separator
+        return [], ''
+
+    def _split_and_translate(self, chunk: TextChunk, escalate: bool, depth: int) -> Tuple[str, int, bool]:
+        """
+        递归拆分并并行翻译
+        
+        Returns:
+            (合并后的译文, 实际拆分深度, 是否仍有片段失败)
+        """
+        pieces, separator = self._split_for_retry(chunk.content)
+        if not pieces or depth > self.max_split_depth:
+            return f"{FAILURE_MARKER} {chunk.content}", depth - 1, True
+        
+        def run(piece: str) -> Tuple[str, int, bool]:
+            sub_chunk = TextChunk(piece, chunk.chunk_type, chunk.level)
+            try:
+                return self._translate_once(sub_chunk, escalate), depth, False
+            except Exception as e:
+                if self._is_split_retryable(e):
+                    return self._split_and_translate(sub_chunk, escalate, depth + 1)
+                print(f"拆分片段翻译出错: {e}")
+                return f"{FAILURE_MARKER} {piece}", depth, True
+        
+        with ThreadPoolExecutor(max_workers=len(pieces)) as executor:
+            results = list(executor.map(run, pieces))
+        return (
+            separator.join(text for text, _, _ in results),
+            max(d for _, d, _ in results),
+            any(failed for _, _, failed in results)
+        )
+
+    def _record_split(self, chars: int, depth: int, failed: bool):
+        """记录一次拆分重试"""
+        with self._usage_lock:
+            self._splits.append({"chars": chars, "depth": depth, "failed": failed})
+
+    def get_split_stats(self) -> Dict:
+        """拆分重试统计"""
+        with self._usage_lock:
+            splits = list(self._splits)
+        return {
+            "count": len(splits),
+            "max_depth": max((s["depth"] for s in splits), default=0),
+            "failed": sum(1 for s in splits if s["failed"]),
+            "events": splits
+        }
+
+    def _usage_recorder(self, model: str) -> UsageRecorder:
+        """模型层级的用量记录函数：按 API 报告的 token 数累计（含提示词模板），并交给分词器校准"""
+        calibrate = self.token_calibration.recorder(model)
+
+        def record(prompt_text: str, output_text: str, prompt_tokens: int, completion_tokens: int):
+            with self._usage_lock:
+                usage = self._usage.setdefault(model, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+                usage["calls"] += 1
+                usage["input_tokens"] += prompt_tokens
+                usage["output_tokens"] += completion_tokens
+            calibrate(prompt_text, output_text, prompt_tokens, completion_tokens)
+        return record
+
+    def get_token_usage(self) -> Dict[str, Dict[str, int]]:
+        """各模型层级累计的 API token 用量（翻译、校验、重译等全部调用）"""
+        with self._usage_lock:
+            return {model: dict(usage) for model, usage in self._usage.items()}
+
+    def get_token_calibration(self) -> Dict[str, Dict]:
+        """本地 token 计数与 API 报告用量的校准报告（按模型）"""
+        return self.token_calibration.report()
+
+    def _translate_code_block(self, code_content: str, chain=None) -> str:
+        """
+        翻译代码块，只翻译注释部分（chain 为使用的翻译链，默认首轮模型）
+        """
+        chain = chain or self.translation_chain
         lines = code_content.split('\n')
         translated_lines = []
         
@@ -131,7 +397,7 @@ class SmartTranslator:
             # 如果是注释行，进行翻译
             if line.strip().startswith('#') or line.strip().startswith('//'):
                 try:
-                    comment_translation = self.translation_chain.invoke({
+                    comment_translation = chain.invoke({
                         "content": line.strip()
                     })
                     # 保持原有的缩进
@@ -144,206 +410,605 @@ class SmartTranslator:
         
         return '\n'.join(translated_lines)
     
-    def translate_content(self, content: str) -> Tuple[str, Dict]:
+    def translate_content(self, content: str, verify_mode: str = None,
+                          chunks: Optional[List[TextChunk]] = None) -> Tuple[str, Dict]:
         """
         翻译完整内容
+        
+        Args:
+            content: 原文
+            verify_mode: 本次使用的校验策略（默认使用初始化时的 verify_mode）
+            chunks: 预先分好的块（区间指向 content，如由文档块直接分块或 RSTChunker 的结果）；
+                默认用 Markdown 分块器对 content 分块
         """
+        verify_mode = verify_mode or self.verify_mode
         print("开始分析和翻译文档")
 
-        print("生成原文摘要")
-        original_summary = self.summary_generator.generate_original_summary(content)
+        original_summary = None
+        if (verify_mode == "full" and self.verification_method == "summary"
+                and not (self.chunk_verify or self.local_gate)):
+            print("生成原文摘要")
+            original_summary = self.summary_generator.generate_original_summary(content)
+
+        chunks, translated_chunks, chunk_results, failed_units = self._translate_chunks(content, verify_mode, chunks)
+        translated_content, stats = self.verify_and_refine(
+            content, chunks, translated_chunks, verify_mode, original_summary, chunk_results
+        )
+        stats["failed_units"] = failed_units
+        return translated_content, stats
 
-        print("正在分割文本")
-        chunks = self.chunker.chunk_text(content)
+    def translate_first_pass(self, content: str,
+                             chunks: Optional[List[TextChunk]] = None) -> Tuple[List[TextChunk], List[str], List[Dict]]:
+        """
+        只做首轮翻译，不做校验（chunks 同 translate_content）
+        
+        Returns:
+            (文本块列表, 译文块列表, 重试后仍失败的单元)，译文可稍后交给 verify_and_refine 校验与改进
+        """
+        chunks, translated_chunks, _, failed_units = self._translate_chunks(content, "off", chunks)
+        return chunks, translated_chunks, failed_units
+
+    def translate_stream(self, items: Iterable[T],
+                         to_chunk: Optional[Callable[[T], Optional[TextChunk]]] = None,
+                         window: Optional[int] = None) -> Iterator[Tuple[T, Optional[str]]]:
+        """
+        流式翻译：按输入顺序产出 (输入项, 译文)
+        
+        输入只在需要时读取，同时在途的请求不超过 window 个（默认 max_workers 的两倍），
+        前面的项翻译完成后立即产出，内存占用与文件大小无关。失败的块保留失败标记，
+        可事后用 repair 命令补译。
+        
+        Args:
+            items: 输入项（文本块或文档块等）的迭代器
+            to_chunk: 将输入项转为待翻译的文本块，返回 None 的项不翻译（译文为 None）；默认输入项即文本块
+            window: 在途请求上限
+        """
+        to_chunk = to_chunk or (lambda item: item)
+        window = max(1, window or self.max_workers * 2)
+        pending = deque()
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for item in items:
+                chunk = to_chunk(item)
+                future = executor.submit(self.translate_chunk, chunk) if chunk is not None else None
+                pending.append((item, future))
+                # 队首已完成（或无需翻译）时立即产出；在途过多时等待队首
+                while pending and (len(pending) > window or pending[0][1] is None or pending[0][1].done()):
+                    head, head_future = pending.popleft()
+                    yield head, head_future.result() if head_future else None
+            while pending:
+                head, head_future = pending.popleft()
+                yield head, head_future.result() if head_future else None
+
+    def _translate_chunks(self, content: str, verify_mode: str,
+                          chunks: Optional[List[TextChunk]] = None) -> Tuple[List[TextChunk], List[str], Optional[Dict[int, Optional[Dict]]], List[Dict]]:
+        """
+        分块并并行翻译（最多 max_workers 个请求同时进行）；启用块级校验时，按块顺序在每块译完后
+        立即提交校验，与其余块的翻译共用线程池
+        
+        失败的块先记入重试队列，其余块继续翻译，全部翻译完成后按退避策略统一重试
+        
+        Returns:
+            (文本块列表, 译文块列表, 块级校验结果, 重试后仍失败的单元)
+        """
+        if chunks is None:
+            print("正在分割文本")
+            chunks = self.chunker.chunk_text(content)
         print(f"文本已分割为 {len(chunks)} 个块")
         
         print("正在翻译各个文本块")
         translated_chunks = []
+        verify_futures = {}
+        chunk_verify = self.chunk_verify and verify_mode in ("sampled", "full")
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        
+        retry_queue = RetryQueue(
+            max_attempts=self.retry_attempts, base_delay=self.retry_base_delay, max_workers=self.max_workers
+        )
         
-        for i, chunk in enumerate(tqdm(chunks, desc="翻译进度")):
-            translated_content = self.translate_chunk(chunk)
-            translated_chunks.append(translated_content)
+        def submit_verify(i: int):
+            # 块级校验与后续块的翻译并行进行
+            chunk = chunks[i]
+            if chunk_verify and chunk.chunk_type != 'code' and \
+                    self._select_chunk_for_verification(chunk, translated_chunks[i], verify_mode):
+                verify_futures[i] = executor.submit(
+                    self.summary_generator.verify_chunk, chunk.content, translated_chunks[i]
+                )
+        
+        try:
+            futures = [executor.submit(self._translate_with_split, chunk) for chunk in chunks]
+            # 按块顺序取结果，抽样校验的选择与翻译完成的先后无关
+            for i, (chunk, future) in enumerate(zip(chunks, tqdm(futures, desc="翻译进度"))):
+                try:
+                    translated_chunks.append(future.result())
+                except Exception as e:
+                    print(f"文本块 {i} 翻译失败，稍后重试: {e}")
+                    retry_queue.add(i, chunk, e)
+                    translated_chunks.append(f"{FAILURE_MARKER} {chunk.content}")
+                    continue
+                submit_verify(i)
+            
+            failed_units = []
+            if len(retry_queue):
+                recovered, failed_units = retry_queue.drain(self._translate_with_split)
+                for i, translated_content in recovered.items():
+                    translated_chunks[i] = translated_content
+                    submit_verify(i)
+                if failed_units:
+                    print(f"{len(failed_units)} 个文本块重试后仍然失败: {[u['index'] for u in failed_units]}")
+            chunk_results = {i: future.result() for i, future in verify_futures.items()}
+        finally:
+            # 中途出错时不再发出排队中的请求
+            executor.shutdown(wait=True, cancel_futures=True)
 
-        translated_content = self._merge_translated_chunks(translated_chunks)
+        return chunks, translated_chunks, chunk_results if chunk_verify else None, failed_units
 
-        print("正在生成译文摘要")
-        translated_summary = self.summary_generator.generate_translated_summary(translated_content)
+    def _verify_chunks(self, chunks: List[TextChunk], translated_chunks: List[str],
+                       verify_mode: str) -> Dict[int, Optional[Dict]]:
+        """对已完成首轮翻译的块并行做块级校验（verify-later 模式使用）"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            verify_futures = {
+                i: executor.submit(self.summary_generator.verify_chunk, chunk.content, translated)
+                for i, (chunk, translated) in enumerate(zip(chunks, translated_chunks))
+                if chunk.chunk_type != 'code'
+                and self._select_chunk_for_verification(chunk, translated, verify_mode)
+            }
+            return {i: future.result() for i, future in verify_futures.items()}
 
-        print("正在检查翻译完整性")
-        comparison_result = self.summary_generator.compare_summaries(
-            original_summary, translated_summary
+    def verify_and_refine(self,
+                          content: str,
+                          chunks: List[TextChunk],
+                          translated_chunks: List[str],
+                          verify_mode: str = None,
+                          original_summary: Optional[str] = None,
+                          chunk_results: Optional[Dict[int, Optional[Dict]]] = None) -> Tuple[str, Dict]:
+        """
+        按校验策略检查首轮译文，必要时重译
+        
+        Args:
+            content: 原文
+            chunks: 文本块列表
+            translated_chunks: 首轮译文块列表
+            verify_mode: 校验策略（默认使用初始化时的 verify_mode）
+            original_summary: 已生成的原文摘要（可选）
+            chunk_results: 翻译过程中已完成的块级校验结果（可选）
+            
+        Returns:
+            (最终译文, 统计信息)
+        """
+        verify_mode = verify_mode or self.verify_mode
+        cascade = None
+        if self.escalation_chain is not None and verify_mode != "off":
+            translated_chunks, cascade = self.escalate_segments(
+                [chunk.content for chunk in chunks], translated_chunks,
+                [chunk.chunk_type for chunk in chunks], verify_mode
+            )
+            if cascade["escalated"]:
+                # 块级校验结果对应的是升级前的译文
+                chunk_results = None
+        translated_content, stats = self._verify_and_refine(
+            content, chunks, translated_chunks, verify_mode, original_summary, chunk_results
         )
+        if cascade is not None:
+            stats["cascade"] = cascade
+        return translated_content, stats
+
+    def escalate_segments(self,
+                          sources: List[str],
+                          translations: List[str],
+                          segment_types: List[str],
+                          verify_mode: str) -> Tuple[List[str], Dict]:
+        """
+        模型级联：找出首轮（廉价模型）译文中未通过检查的片段，交给升级模型重译
+        
+        - 所有片段先做本地结构检查
+        - 标题、列表项及短片段只做本地检查；其余片段在 sampled/full 策略下再做逐片段 LLM 校验
+          （sampled 时按 sample_rate 抽样）
+        - 升级结果通过本地检查（或问题更少）才采用
         
-        # 修改重译条件：只要有遗漏内容或评分低于8分，就触发重译
-        has_missing_content = (comparison_result["missing_content"] and 
-                              comparison_result["missing_content"].strip() and 
-                              comparison_result["missing_content"] != "无")
+        Returns:
+            (更新后的译文列表, 级联统计)
+        """
+        report = self.integrity_checker.check_segments(sources, translations, segment_types=segment_types)
+        flagged = {i: "local" for i in report.flagged_indices}
+        
+        llm_targets = []
+        if verify_mode in ("sampled", "full"):
+            llm_targets = [
+                i for i, source in enumerate(sources)
+                if i not in flagged and source.strip() and segment_types[i] != 'code'
+                and not self._is_short_segment(source, segment_types[i])
+                and (verify_mode == "full" or self._rng.random() < self.sample_rate)
+            ]
+        if llm_targets:
+            workers = min(self.max_workers, len(llm_targets))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    lambda i: self.summary_generator.verify_chunk(sources[i], translations[i]), llm_targets
+                )
+                for i, result in zip(llm_targets, results):
+                    if result and (result["completeness_score"] < self.refine_threshold or result["missing_items"]):
+                        flagged[i] = "verify"
         
-        if comparison_result["completeness_score"] < 8 or has_missing_content:
-            print(f"检测到翻译需要改进，完整性评分: {comparison_result['completeness_score']}/10")
+        targets = sorted(flagged)
+        escalated = []
+        updated = list(translations)
+        if targets:
+            print(f"模型级联: {len(targets)} 个片段升级到 {self.escalation_model} 重译")
+            workers = min(self.max_workers, len(targets))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    lambda i: self.translate_chunk(TextChunk(sources[i], segment_types[i]), escalate=True),
+                    targets
+                )
+                for i, result in zip(targets, results):
+                    if self._accept_refinement(sources[i], translations[i], result.strip(), segment_types[i]):
+                        updated[i] = result.strip()
+                        escalated.append(i)
+        
+        return updated, {
+            "model": self.model_name,
+            "escalation_model": self.escalation_model,
+            "llm_verified": len(llm_targets),
+            "flagged": {i: reason for i, reason in sorted(flagged.items())},
+            "escalated": escalated
+        }
+
+    def _is_short_segment(self, source: str, segment_type: str) -> bool:
+        """标题、列表项和短片段：级联时只做本地检查"""
+        if segment_type in ('heading', 'title', 'list', 'list_item'):
+            return True
+        return self.chunker.count_tokens(source) < self.short_segment_tokens
+
+    def _verify_and_refine(self,
+                           content: str,
+                           chunks: List[TextChunk],
+                           translated_chunks: List[str],
+                           verify_mode: str,
+                           original_summary: Optional[str] = None,
+                           chunk_results: Optional[Dict[int, Optional[Dict]]] = None) -> Tuple[str, Dict]:
+        """verify_and_refine 的校验与重译部分（级联之后）"""
+        if verify_mode == "off":
+            return self._merge_translated_chunks(translated_chunks, chunks, content), self._unverified_stats(len(chunks))
+
+        chunk_verify = self.chunk_verify and verify_mode in ("sampled", "full")
+        if chunk_verify:
+            if chunk_results is None:
+                chunk_results = self._verify_chunks(chunks, translated_chunks, verify_mode)
+            translated_chunks, stats = self._refine_flagged_chunks(chunks, translated_chunks, chunk_results)
+            if verify_mode == "sampled":
+                stats["sampling"] = {
+                    "verified_chunks": sorted(i for i, result in chunk_results.items() if result is not None),
+                    "total_chunks": len(chunks)
+                }
+            return self._merge_translated_chunks(translated_chunks, chunks, content), stats
+
+        local_report = None
+        sampling = None
+        if verify_mode in ("local", "sampled") or self.local_gate:
+            translated_chunks, local_report = self._local_check_and_repair(chunks, translated_chunks)
+            if verify_mode == "sampled":
+                sampling = self._sample_decision(local_report)
+            skip_llm = (verify_mode == "local"
+                        or (sampling is not None and not sampling["selected"])
+                        or (verify_mode == "full" and local_report.clean))
+            if skip_llm:
+                print("本地结构检查完成，跳过 LLM 校验")
+                stats = self._local_stats(local_report, len(chunks))
+                if sampling is not None:
+                    stats["sampling"] = sampling
+                return self._merge_translated_chunks(translated_chunks, chunks, content), stats
+
+        translated_content = self._merge_translated_chunks(translated_chunks, chunks, content)
+
+        print("正在检查翻译完整性")
+        verification = self.verify_translation(
+            content, translated_content,
+            [chunk.content for chunk in chunks], translated_chunks, original_summary
+        )
+        comparison_result = verification["comparison_result"]
+        
+        # 重译条件：有遗漏内容或评分低于阈值；轮数与花费由预算控制器决定
+        tracker = self.refine_budget.begin_file()
+        while True:
+            score_before = comparison_result["completeness_score"]
+            has_missing_content = self._has_missing(comparison_result["missing_content"])
+            targets = [i for i in comparison_result.get("affected_segments") or [] if 0 <= i < len(chunks)]
+            estimate = self.refine_budget.estimate(
+                [text for i in (targets or range(min(3, len(chunks))))
+                 for text in (chunks[i].content, translated_chunks[i])],
+                [content, translated_content]
+            )
+            if not tracker.should_refine(score_before, has_missing_content, self.refine_threshold, estimate):
+                break
+            print(f"检测到翻译需要改进，完整性评分: {score_before}/10")
             if has_missing_content:
                 print(f"遗漏内容: {comparison_result['missing_content']}")
             print("正在重新翻译")
             
-            retranslated_content = self._retranslate_with_focus(
+            retranslated_content, updated_chunks = self._retranslate_with_focus(
                 content, comparison_result["missing_content"], 
-                chunks=chunks, translated_chunks=translated_chunks
+                chunks=chunks, translated_chunks=translated_chunks,
+                target_indices=targets
             )
-            
-            if retranslated_content:
-                translated_content = retranslated_content
+            if not retranslated_content or retranslated_content == translated_content:
+                tracker.stop("no_change")
+                break
+            translated_content = retranslated_content
 
-                translated_summary = self.summary_generator.generate_translated_summary(translated_content)
-                
-                comparison_result = self.summary_generator.compare_summaries(
-                    original_summary, translated_summary
+            if updated_chunks is not None:
+                translated_chunks = updated_chunks
+                verification = self.verify_translation(
+                    content, translated_content, [chunk.content for chunk in chunks], translated_chunks,
+                    original_summary=verification["original_summary"] or None
+                )
+            else:
+                # 回退重译后片段边界已变化，只做整体校验，且不再继续下一轮
+                verification = self.verify_translation(
+                    content, translated_content, original_summary=verification["original_summary"] or None
                 )
-                print(f"重新翻译后的完整性评分: {comparison_result['completeness_score']}/10")
+            comparison_result = verification["comparison_result"]
+            print(f"重新翻译后的完整性评分: {comparison_result['completeness_score']}/10")
+            tracker.record("targeted", estimate, score_before, comparison_result["completeness_score"])
+            if updated_chunks is None:
+                tracker.stop("chunks_unaligned")
+                break
+        if tracker.rounds:
+            print(f"重译结束（{tracker.to_dict()['stop_reason']}），预估花费 {tracker.tokens_spent} tokens")
         
         stats = {
-            "original_summary": original_summary,
-            "translated_summary": translated_summary,
+            "original_summary": verification["original_summary"],
+            "translated_summary": verification["translated_summary"],
             "comparison_result": comparison_result,
             "chunk_count": len(chunks),
-            "completeness_score": comparison_result["completeness_score"]
+            "completeness_score": comparison_result["completeness_score"],
+            "verification_method": comparison_result.get("verify_mode", self.verification_method)
         }
+        stats["refine_control"] = tracker.to_dict()
+        if local_report is not None:
+            stats["local_check"] = local_report.to_dict()
+        if sampling is not None:
+            stats["sampling"] = sampling
         
         return translated_content, stats
+
+    @staticmethod
+    def _has_missing(missing_content: Optional[str]) -> bool:
+        """校验结果是否报告了遗漏内容"""
+        return bool(missing_content and missing_content.strip() and missing_content.strip() != "无")
+
+    def _sample_decision(self, local_report: IntegrityReport) -> Dict:
+        """
+        sampled 模式下决定是否做 LLM 校验：本地检查未通过的必选（风险），
+        其余按 sample_rate 随机抽样（随机样本用于估计未校验部分的通过率）
+        """
+        if not local_report.clean:
+            return {"selected": True, "reason": "risk"}
+        if self._rng.random() < self.sample_rate:
+            return {"selected": True, "reason": "random"}
+        return {"selected": False, "reason": "not_sampled"}
+
+    def _select_chunk_for_verification(self, chunk: TextChunk, translated: str, verify_mode: str) -> bool:
+        """块级校验是否覆盖该块：full 全部覆盖，sampled 对有风险的块及随机抽中的块覆盖"""
+        if verify_mode == "full":
+            return True
+        report = self.integrity_checker.check_segments([chunk.content], [translated])
+        return not report.clean or self._rng.random() < self.sample_rate
+
+    def _local_check_and_repair(self, chunks: List[TextChunk],
+                                translated_chunks: List[str]) -> Tuple[List[str], IntegrityReport]:
+        """
+        本地结构检查；存在问题时只重译被点名的块并复查一次
+        
+        Returns:
+            (更新后的译文块列表, 最终检查报告)
+        """
+        sources = [chunk.content for chunk in chunks]
+        types = [chunk.chunk_type for chunk in chunks]
+        report = self.integrity_checker.check_segments(sources, translated_chunks, segment_types=types)
+        if report.clean:
+            return translated_chunks, report
+
+        print(f"本地结构检查发现 {len(report.issues)} 个问题块: {report.flagged_indices}")
+        try:
+            translated_chunks = self._retranslate_chunks(
+                chunks, translated_chunks, report.flagged_indices, report.describe()
+            )
+        except Exception as e:
+            print(f"重译问题块失败: {e}")
+            return translated_chunks, report
+        report = self.integrity_checker.check_segments(sources, translated_chunks, segment_types=types)
+        return translated_chunks, report
+
+    @staticmethod
+    def _unverified_stats(chunk_count: int) -> Dict:
+        """跳过完整性校验时的统计信息"""
+        return {
+            "original_summary": "",
+            "translated_summary": "",
+            "comparison_result": {},
+            "chunk_count": chunk_count,
+            "completeness_score": None,
+            "verification_method": "none"
+        }
+
+    @staticmethod
+    def _local_stats(report: IntegrityReport, chunk_count: int) -> Dict:
+        """仅做本地检查时的统计信息（未调用 LLM 校验），评分按无问题片段的比例折算"""
+        if report.clean or not report.segment_count:
+            score = 10
+        else:
+            score = max(0, round(10 * (1 - len(report.issues) / report.segment_count)))
+        comparison_result = {
+            "completeness_score": score,
+            "missing_content": report.describe(),
+            "suggestions": "",
+            "raw_result": "",
+            "verify_mode": "local"
+        }
+        return {
+            "original_summary": "",
+            "translated_summary": "",
+            "comparison_result": comparison_result,
+            "chunk_count": chunk_count,
+            "completeness_score": comparison_result["completeness_score"],
+            "verification_method": "local",
+            "local_check": report.to_dict()
+        }
+
+    def _refine_flagged_chunks(self, chunks: List[TextChunk], translated_chunks: List[str],
+                               chunk_results: Dict[int, Dict]) -> Tuple[List[str], Dict]:
+        """
+        根据块级校验结果只重译被标记的块（含校验失败的块），并重新校验这些块
+        
+        Returns:
+            (更新后的译文块列表, 统计信息)
+        """
+        flagged = self._flagged_chunks(chunk_results)
+        refined = []
+        if flagged:
+            print(f"块级校验标记了 {len(flagged)} 个块需要重译: {flagged}")
+            missing_content = self._aggregate_chunk_results(chunk_results, flagged)["missing_content"]
+            try:
+                translated_chunks = self._retranslate_chunks(
+                    chunks, translated_chunks, flagged, missing_content
+                )
+                refined = flagged
+                workers = min(self.max_workers, len(flagged))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    rechecked = executor.map(
+                        lambda i: self.summary_generator.verify_chunk(chunks[i].content, translated_chunks[i]),
+                        flagged
+                    )
+                    for i, result in zip(flagged, rechecked):
+                        chunk_results[i] = result
+            except Exception as e:
+                print(f"块级重译失败: {e}")
+
+        comparison_result = self._aggregate_chunk_results(chunk_results, self._flagged_chunks(chunk_results))
+        unverified = comparison_result["unverified_segments"]
+        if comparison_result["completeness_score"] is None:
+            print(f"块级校验全部失败（{len(unverified)} 个块），无法给出完整性评分")
+        else:
+            print(f"块级校验完整性评分: {comparison_result['completeness_score']}/10")
+            if unverified:
+                print(f"{len(unverified)} 个块校验失败，未计入评分: {unverified}")
+        stats = {
+            "original_summary": "",
+            "translated_summary": "",
+            "comparison_result": comparison_result,
+            "chunk_count": len(chunks),
+            "completeness_score": comparison_result["completeness_score"],
+            "verification_method": "chunk",
+            "chunk_scores": {
+                i: result["completeness_score"] for i, result in chunk_results.items() if result
+            },
+            "refined_chunks": refined,
+            "unverified_chunks": unverified
+        }
+        return translated_chunks, stats
+
+    def _flagged_chunks(self, chunk_results: Dict[int, Dict]) -> List[int]:
+        """评分低于阈值、存在遗漏内容或校验失败（结果为 None）的块"""
+        return sorted(
+            i for i, result in chunk_results.items()
+            if result is None or result["completeness_score"] < self.refine_threshold or result["missing_items"]
+        )
+
+    def _aggregate_chunk_results(self, chunk_results: Dict[int, Dict], flagged: List[int]) -> Dict:
+        """
+        将块级校验结果汇总为与 compare_summaries 兼容的文档级结果
+        
+        评分只取校验成功的块的平均值，校验失败的块列入 unverified_segments；没有任何块得到评分时评分为 None
+        """
+        scores = [result["completeness_score"] for result in chunk_results.values() if result is not None]
+        missing_lines = []
+        for i in flagged:
+            for item in (chunk_results[i] or {}).get("missing_items", []):
+                missing_lines.append(f"块{i}: {item}")
+        return {
+            "completeness_score": round(sum(scores) / len(scores)) if scores else None,
+            "missing_content": "\n".join(missing_lines) if missing_lines else "无",
+            "suggestions": "",
+            "raw_result": "",
+            "missing_items": missing_lines,
+            "affected_segments": flagged,
+            "unverified_segments": sorted(i for i, result in chunk_results.items() if result is None),
+            "verify_mode": "chunk"
+        }
+
+    def verify_translation(self, original_content: str, translated_content: str,
+                           original_segments: List[str] = None, translated_segments: List[str] = None,
+                           original_summary: str = None) -> Dict:
+        """
+        按配置的校验方式检查译文完整性
+        
+        Args:
+            original_content: 原文
+            translated_content: 译文
+            original_segments: 原文片段（structured 模式下用于定位问题片段）
+            translated_segments: 与原文片段一一对应的译文片段
+            original_summary: 已生成的原文摘要（summary 模式下复用）
+        
+        Returns:
+            {"original_summary", "translated_summary", "comparison_result"}
+        """
+        if self.verification_method == "structured":
+            return self.summary_generator.verify_translation(
+                original_content, translated_content, original_segments, translated_segments
+            )
+
+        if original_summary is None:
+            original_summary = self.summary_generator.generate_original_summary(original_content)
+        print("正在生成译文摘要")
+        translated_summary = self.summary_generator.generate_translated_summary(translated_content)
+        comparison_result = self.summary_generator.compare_summaries(
+            original_summary, translated_summary
+        )
+        return {
+            "original_summary": original_summary,
+            "translated_summary": translated_summary,
+            "comparison_result": comparison_result
+        }
     
-    def _merge_translated_chunks(self, translated_chunks: List[str]) -> str:
+    def _merge_translated_chunks(self, translated_chunks: List[str],
+                                 chunks: Optional[List[TextChunk]] = None,
+                                 source: Optional[str] = None) -> str:
         """
         合并文本块
+        
+        提供原文与带区间的文本块时，把译文按区间拼接回原文，块间的空行等原样保留；
+        否则用双换行简单连接
         """
-        # 简单合并，用双换行分隔
+        if chunks is not None and source is not None and len(chunks) == len(translated_chunks) \
+                and self.chunker.has_spans(source, chunks):
+            return self.chunker.splice(source, chunks, translated_chunks)
         return '\n\n'.join(chunk.strip() for chunk in translated_chunks if chunk.strip())
     
     def _retranslate_with_focus(self, original_content: str, missing_content: str, 
-                                chunks: List[TextChunk] = None, translated_chunks: List[str] = None) -> str:
+                                chunks: List[TextChunk] = None, translated_chunks: List[str] = None,
+                                target_indices: List[int] = None) -> Tuple[Optional[str], Optional[List[str]]]:
         """
-        定向重新翻译缺失内容：
-        1) 将中文遗漏内容描述翻译回英文
-        2) 在chunk列表中定位包含缺失内容的chunk
-        3) 扩展上下文窗口（左右各1-2个chunk）
-        4) 只对相关片段进行重新翻译
-        5) 将重译结果替换回原译文中
+        定向重新翻译缺失内容，返回 (新译文, 更新后的译文块列表)；回退到整体重译时块列表为 None：
+        1) 定位包含缺失内容的chunk（优先使用校验给出的 target_indices，否则查倒排索引）
+        2) 每个相关chunk连同前后文单独重译，并行执行
+        3) 逐个校验，通过的结果替换回原译文中
         """
         try:
             # 如果没有提供chunks，重新分块
             if chunks is None:
                 chunks = self.chunker.chunk_text(original_content)
             if translated_chunks is None:
-                return None
-            
-            # 步骤1: 将中文遗漏内容描述翻译回英文关键词
-            print("正在将遗漏内容描述转换为英文关键词...")
-            reverse_translation_prompt = ChatPromptTemplate.from_template("""
-你是一个专业的翻译分析专家。请将以下中文描述的遗漏内容转换为对应的英文关键词或短语。
-只输出关键的英文词汇，用逗号分隔，不要有其他解释。
-
-中文描述：
-{missing_content}
-
-请提取出可能在英文原文中出现的关键词（如人名、术语、技术名词等）：
-""")
-            
-            reverse_chain = reverse_translation_prompt | self.llm | TranslationOutputParser()
+                return None, None
             
-            try:
-                english_keywords_str = reverse_chain.invoke({
-                    "missing_content": missing_content
-                })
-                # 提取关键词
-                english_keywords = [kw.strip() for kw in english_keywords_str.split(',') if kw.strip()]
-                print(f"提取的英文关键词: {english_keywords}")
-            except Exception as e:
-                print(f"关键词提取失败，使用备用方案: {e}")
-                # 备用方案：提取已有的英文词汇
-                english_keywords = re.findall(r'[A-Za-z][A-Za-z0-9\-_\.@]+', missing_content)
-            
-            # 步骤2: 在原文chunk中查找包含这些关键词的部分
-            relevant_indices = []
-            
-            print(f"在 {len(chunks)} 个chunk中搜索关键词...")
-            for i, chunk in enumerate(chunks):
-                chunk_lower = chunk.content.lower()
-                
-                # 检查是否包含任何关键词
-                matches = sum(1 for keyword in english_keywords if keyword.lower() in chunk_lower)
-                if matches > 0:
-                    relevant_indices.append((i, matches))
-                    print(f"✓ Chunk {i} 匹配了 {matches} 个关键词")
+            relevant_indices = [i for i in (target_indices or []) if 0 <= i < len(chunks)]
+            if not relevant_indices:
+                relevant_indices = self._locate_relevant_chunks(missing_content, chunks)
             
-            # 按匹配度排序，取最相关的chunk
-            if relevant_indices:
-                relevant_indices.sort(key=lambda x: x[1], reverse=True)
-                relevant_indices = [idx for idx, _ in relevant_indices[:3]]  # 取前3个最相关的
-                print(f"找到相关chunk索引: {relevant_indices}")
-            else:
-                # 如果没有找到相关chunk，使用前几个chunk作为回退
-                print("未找到相关chunk，使用前3个chunk进行重译")
-                relevant_indices = list(range(min(3, len(chunks))))
-            
-            # 扩展上下文窗口
-            expanded_indices = set()
-            context_window = 1  # 左右各1个chunk
-            
-            for idx in relevant_indices:
-                start = max(0, idx - context_window)
-                end = min(len(chunks), idx + context_window + 1)
-                for i in range(start, end):
-                    expanded_indices.add(i)
-            
-            expanded_indices = sorted(list(expanded_indices))
-            
-            # 提取需要重译的片段
-            segments_to_retranslate = []
-            for idx in expanded_indices:
-                segments_to_retranslate.append({
-                    'index': idx,
-                    'content': chunks[idx].content
-                })
-            
-            print(f"正在重新翻译 {len(segments_to_retranslate)} 个相关片段...")
-            
-            # 构建重译的prompt
-            segments_text = "\n\n---片段分隔---\n\n".join(
-                f"片段{i+1}:\n{seg['content']}" 
-                for i, seg in enumerate(segments_to_retranslate)
+            updated_chunks = self._retranslate_chunks(
+                chunks, translated_chunks, relevant_indices, missing_content
             )
-            
-            retranslation_prompt = ChatPromptTemplate.from_template("""
-你是专业的英译汉翻译专家。请重新翻译以下片段，特别注意包含这些缺失信息：{missing_content}
-
-要求：
-1. 保持Markdown格式不变
-2. 确保包含所有重要信息
-3. 使用地道的中文表达
-4. 对每个片段分别翻译，用"---译文分隔---"分隔
-
-原文片段：
-{segments}
-
-只输出翻译结果：
-""")
-            
-            retranslation_chain = retranslation_prompt | self.llm | TranslationOutputParser()
-            
-            retranslated_text = retranslation_chain.invoke({
-                "missing_content": missing_content,
-                "segments": segments_text
-            })
-            
-            retranslated_segments = retranslated_text.split("---译文分隔---")
-            # 如果分割数量不匹配，尝试按段落分割
-            if len(retranslated_segments) != len(segments_to_retranslate):
-                retranslated_segments = [seg.strip() for seg in retranslated_text.split('\n\n') if seg.strip()]
-            
-            updated_chunks = translated_chunks.copy()
-            for i, seg_info in enumerate(segments_to_retranslate):
-                if i < len(retranslated_segments):
-                    updated_chunks[seg_info['index']] = retranslated_segments[i].strip()
-
-            return self._merge_translated_chunks(updated_chunks)
+            return self._merge_translated_chunks(updated_chunks, chunks, original_content), updated_chunks
             
         except Exception as e:
             print(f"定向重译时出错: {e}")
@@ -355,10 +1020,119 @@ class SmartTranslator:
                     "original_text": limited_content,
                     "missing_content": missing_content
                 })
-                return retranslated
+                return retranslated, None
             except Exception as e2:
                 print(f"回退重译也失败: {e2}")
+                return None, None
+
+    def _retranslate_chunks(self, chunks: List[TextChunk], translated_chunks: List[str],
+                            indices: List[int], missing_content: str) -> List[str]:
+        """
+        重译指定下标的块，返回更新后的译文块列表（不修改传入列表）
+        """
+        patches = self.refine_segments(
+            [chunk.content for chunk in chunks], translated_chunks, indices, missing_content,
+            segment_types=[chunk.chunk_type for chunk in chunks]
+        )
+        updated_chunks = translated_chunks.copy()
+        for idx, text in patches.items():
+            updated_chunks[idx] = text
+        return updated_chunks
+
+    def refine_segments(self,
+                        sources: List[str],
+                        translations: List[str],
+                        targets: List[int],
+                        missing_content: str,
+                        doc_format: str = "Markdown",
+                        segment_types: Optional[List[str]] = None) -> Dict[int, str]:
+        """
+        逐片段并行改进译文
+        
+        每个目标片段连同前后相邻原文单独请求，结果逐个经本地结构检查校验，
+        某个片段失败不影响其他片段。
+        
+        Args:
+            sources: 原文片段列表
+            translations: 与原文一一对应的当前译文
+            targets: 需要改进的片段下标
+            missing_content: 遗漏内容描述
+            doc_format: 文档格式名称（写入提示词）
+            segment_types: 片段类型（可选，'code' 片段不检查中文比例）
+            
+        Returns:
+            {片段下标: 改进后的译文}，只包含通过校验的片段
+        """
+        targets = sorted({i for i in targets if 0 <= i < len(sources) and sources[i].strip()})
+        if not targets:
+            return {}
+        print(f"正在并行改进 {len(targets)} 个片段...")
+        
+        def refine(i: int) -> Optional[str]:
+            try:
+                return self.segment_refine_chain.invoke({
+                    "missing_content": missing_content or "无",
+                    "doc_format": doc_format,
+                    "before": self._neighbour_source(sources, i, -1),
+                    "source": sources[i],
+                    "translation": translations[i],
+                    "after": self._neighbour_source(sources, i, 1)
+                })
+            except Exception as e:
+                print(f"片段 {i} 改进失败: {e}")
                 return None
+        
+        workers = min(self.max_workers, len(targets))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(refine, targets))
+        
+        patches = {}
+        for i, refined in zip(targets, results):
+            segment_type = segment_types[i] if segment_types else None
+            if refined and self._accept_refinement(sources[i], translations[i], refined.strip(), segment_type):
+                patches[i] = refined.strip()
+        print(f"{len(patches)}/{len(targets)} 个片段的改进通过校验")
+        return patches
+
+    @staticmethod
+    def _neighbour_source(sources: List[str], index: int, step: int, max_chars: int = 500) -> str:
+        """取相邻的非空原文片段作为上下文（过长时截断）"""
+        i = index + step
+        while 0 <= i < len(sources):
+            if sources[i].strip():
+                text = sources[i].strip()
+                return text if len(text) <= max_chars else (text[:max_chars] if step > 0 else text[-max_chars:])
+            i += step
+        return "（无）"
+
+    def _accept_refinement(self, source: str, old: str, new: str, segment_type: Optional[str] = None) -> bool:
+        """改进结果通过本地结构检查，或问题比原译文少时才采用"""
+        if not new or FAILURE_MARKER in new:
+            return False
+        types = [segment_type] if segment_type else None
+        new_report = self.integrity_checker.check_segments([source], [new], segment_types=types)
+        if new_report.clean:
+            return True
+        old_report = self.integrity_checker.check_segments([source], [old], segment_types=types)
+        return bool(old_report.issues) and len(new_report.issues[0].reasons) < len(old_report.issues[0].reasons)
+
+    def _locate_relevant_chunks(self, missing_content: str, chunks: List[TextChunk]) -> List[int]:
+        """
+        根据遗漏内容描述定位相关chunk：
+        在原文chunk的倒排索引上用 BM25 检索描述中的英文词、标识符、数字及术语表映射出的英文术语
+        """
+        index = SegmentIndex(chunk.content for chunk in chunks)
+        ranked = index.search(missing_content, top_k=3)
+        
+        if ranked:
+            relevant_indices = [idx for idx, _ in ranked]
+            print(f"找到相关chunk索引: {relevant_indices}")
+        else:
+            # 如果没有找到相关chunk，使用前几个chunk作为回退
+            print("未找到相关chunk，使用前3个chunk进行重译")
+            relevant_indices = list(range(min(3, len(chunks))))
+        
+        return relevant_indices
     
     def translate_with_context(self, content: str, context: str = "") -> str:
         """
@@ -3,7 +3,9 @@
 """
 
 import os
-from typing import Dict, Optional, List, Tuple
+import time
+from itertools import chain
+from typing import Dict, Iterator, Optional, List, Tuple
 from pathlib import Path
 import json
 
@@ -12,10 +14,36 @@ from .translator import SmartTranslator
 from .markdown_parser import Metadata
 from langchain.prompts import ChatPromptTemplate
 from .translator import TranslationOutputParser
-from .text_chunker import TextChunk
+from .text_chunker import TextChunk, MarkdownChunker
+from .rst_chunker import RSTChunker
+from .line_stream import iter_lines, SourceBuffer
+from .integrity_checker import IntegrityReport
+from .batch_anomaly import LengthRatioDetector
+from .segment_index import SegmentIndex
+from .retry_queue import RetryQueue
+from .partial_repair import PartialTranslationScanner, align_blocks
+from .integrity_checker import FAILURE_MARKER
 from datetime import datetime
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, Future
 import re as _re
 
+@dataclass
+class TranslatedDocument:
+    """单个文档的翻译结果（写出前）"""
+    input_file: str
+    file_ext: str
+    processor: DocumentProcessor
+    metadata: Optional[Dict]
+    blocks: List[DocumentBlock]
+    translated_blocks: List[DocumentBlock]
+    stats: Dict
+    # 只做首轮翻译时（verify-later、批量异常检测）保留分块结果，供之后的校验与重译使用
+    source_content: Optional[str] = None
+    chunks: Optional[List[TextChunk]] = None
+    translated_chunks: Optional[List[str]] = None
+
+
 class UniversalTranslator:
     """通用文档翻译器 - 支持多种文档格式"""
     
@@ -28,7 +56,20 @@ class UniversalTranslator:
                  openai_base_url: str = None,
                  qwen_api_key: str = None,
                  refine_threshold: int = 8,
-                 enable_refine: bool = True):
+                 enable_refine: bool = True,
+                 cache_dir: Optional[str] = None,
+                 verification_method: str = "summary",
+                 chunk_verify: bool = False,
+                 local_gate: bool = False,
+                 verify_mode: str = "full",
+                 sample_rate: float = 0.2,
+                 sample_seed: Optional[int] = None,
+                 verify_later: bool = False,
+                 refine_token_budget: Optional[int] = 20000,
+                 batch_refine_token_budget: Optional[int] = None,
+                 max_refine_rounds: int = 2,
+                 escalation_model: Optional[str] = None,
+                 rst_mode: str = "chunks"):
         """初始化通用翻译器
         Args:
             model_name: 模型名称
@@ -40,11 +81,32 @@ class UniversalTranslator:
             qwen_api_key: 通义千问 API 密钥
             refine_threshold: 触发重译的完整性评分阈值（0-10）
             enable_refine: 是否启用缺失内容自动改进流程
+            cache_dir: 摘要/比较结果的磁盘缓存目录（可选，为空时仅缓存在内存中）
+            verification_method: 完整性校验方式（summary: 摘要比较三次调用；structured: 单次 JSON 结构化校验）
+            chunk_verify: 是否启用块级并行校验（Markdown 整篇分块路径），只重译被标记的块
+            local_gate: 是否先运行本地结构检查，通过则跳过 LLM 校验，不通过则只重译被点名的块
+            verify_mode: 校验策略（off / local / sampled / full），full 与以往行为一致
+            sample_rate: sampled 模式下的随机抽样比例
+            sample_seed: 抽样随机种子（可选）
+            verify_later: 是否先写出首轮译文，再在后台线程中校验与重译并回写文件
+            refine_token_budget: 单个文件重译的预估 token 预算（None 表示不限）
+            batch_refine_token_budget: 整批重译的预估 token 预算（None 表示不限）
+            max_refine_rounds: 单个文件最多重译轮数
+            escalation_model: 模型级联的升级模型（如 qwen-max）；设置后 model_name 作为首轮廉价模型（如 qwen-turbo），
+                只有未通过本地检查或逐片段校验的片段才交给升级模型
+            rst_mode: RST 翻译方式（chunks: 按 RST 结构分块，与 Markdown 共用整篇分块并行翻译；
+                blocks: 逐块翻译）
         """
+        if rst_mode not in ("chunks", "blocks"):
+            raise ValueError(f"不支持的 RST 翻译方式: {rst_mode}")
         self.translator_id = translator_id
         self.model_name = model_name
+        self.rst_mode = rst_mode
         self.refine_threshold = refine_threshold
         self.enable_refine = enable_refine
+        self.verify_later = verify_later
+        self._background: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Future] = []
         if provider in (None, '', 'auto'):
             guessed = None
             lower_model = model_name.lower()
@@ -62,16 +124,60 @@ class UniversalTranslator:
             temperature=0.1,
             openai_api_key=openai_api_key,
             openai_base_url=openai_base_url,
-            qwen_api_key=qwen_api_key
+            qwen_api_key=qwen_api_key,
+            cache_dir=cache_dir,
+            verification_method=verification_method,
+            chunk_verify=chunk_verify,
+            refine_threshold=refine_threshold,
+            local_gate=local_gate,
+            verify_mode=verify_mode,
+            sample_rate=sample_rate,
+            sample_seed=sample_seed,
+            refine_token_budget=refine_token_budget,
+            batch_refine_token_budget=batch_refine_token_budget,
+            max_refine_rounds=max_refine_rounds,
+            escalation_model=escalation_model
         )
+        self.rst_chunker = RSTChunker(max_tokens=self.translator.chunker.max_tokens, model=model_name)
     
     def translate_file(self,
                       input_file: str,
                       output_file: Optional[str] = None,
-                      save_stats: bool = True) -> Dict:
+                      save_stats: bool = True,
+                      verify_mode: Optional[str] = None) -> Dict:
         """
         翻译文件（自动识别格式）
         
+        Args:
+            input_file: 输入文件路径
+            output_file: 输出文件路径（可选）
+            save_stats: 是否保存统计信息
+            verify_mode: 本次使用的校验策略（默认使用初始化时的策略；批量异常检测模式下为 off）
+            
+        Returns:
+            翻译统计信息（verify-later 模式下后台校验完成后会原地更新）
+        """
+        verify_mode = verify_mode or self.translator.verify_mode
+        if self.verify_later and verify_mode != "off":
+            document = self._translate_document(input_file, verify_mode="off", defer=True)
+            stats = self._finish_document(document, output_file, save_stats, verification_status="pending")
+            self._schedule_verification(document, stats, verify_mode, save_stats)
+            return stats
+
+        document = self._translate_document(input_file, verify_mode=verify_mode)
+        return self._finish_document(document, output_file, save_stats)
+
+    def translate_file_streaming(self,
+                                 input_file: str,
+                                 output_file: Optional[str] = None,
+                                 save_stats: bool = True) -> Dict:
+        """
+        流式翻译文件（适用于超大文件）
+        
+        逐行读取输入，结构块一闭合就分块并提交翻译，译文按原文顺序边翻译边写出，
+        内存中只保留读取位置附近的原文与在途的请求。不做整篇校验与重译；
+        失败的块保留失败标记，可事后用 repair 命令补译。
+        
         Args:
             input_file: 输入文件路径
             output_file: 输出文件路径（可选）
@@ -80,6 +186,265 @@ class UniversalTranslator:
         Returns:
             翻译统计信息
         """
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"输入文件不存在: {input_file}")
+        file_path = Path(input_file)
+        file_ext = file_path.suffix
+        if not ProcessorFactory.is_supported(file_ext):
+            supported = ', '.join(ProcessorFactory.get_supported_extensions())
+            raise ValueError(
+                f"不支持的文件格式: {file_ext}\n"
+                f"支持的格式: {supported}"
+            )
+        if output_file is None:
+            output_file = str(file_path.parent / f"{file_path.stem}_translated{file_ext}")
+        
+        print(f"正在流式处理文件: {input_file}")
+        processor = ProcessorFactory.create(file_ext)
+        stats = {"chunk_count": 0, "failed_units": [], "first_chunk_seconds": None}
+        started = time.time()
+        
+        with open(input_file, 'r', encoding='utf-8') as src, \
+                open(output_file, 'w', encoding='utf-8') as out:
+            metadata_dict, body_lines = self._split_stream_head(iter_lines(src), file_ext, processor)
+            if metadata_dict:
+                print(f"检测到元数据: {list(metadata_dict.keys())}")
+                out.write(processor.format_with_metadata(self._update_metadata(metadata_dict), ''))
+            
+            if file_ext in ['.rst'] and self.rst_mode == "blocks":
+                pieces = self._stream_rst_body(body_lines, processor, stats)
+            else:
+                pieces = self._stream_chunked_body(body_lines, self._chunker_for(file_ext), stats)
+            for piece in pieces:
+                if stats["first_chunk_seconds"] is None and stats["chunk_count"]:
+                    stats["first_chunk_seconds"] = round(time.time() - started, 2)
+                out.write(piece)
+            
+            out.write(self._append_translation_signature('', file_ext))
+        
+        if stats["failed_units"]:
+            print(f"{len(stats['failed_units'])} 个单元翻译失败: {[u['index'] for u in stats['failed_units']]}")
+        print(f"翻译完成，输出文件: {output_file}")
+        
+        stats.update({
+            "input_file": input_file,
+            "output_file": output_file,
+            "translator_id": self.translator_id,
+            "file_format": file_ext,
+            "streaming": True,
+            "elapsed_seconds": round(time.time() - started, 2),
+            "token_usage": self.translator.get_token_usage(),
+            "tokenizer_calibration": self.translator.get_token_calibration(),
+            "split_retries": self.translator.get_split_stats()
+        })
+        if save_stats:
+            self._save_translation_stats(stats, str(Path(output_file).with_suffix('.stats.json')))
+        return stats
+
+    @staticmethod
+    def _split_stream_head(lines: Iterator[str], file_ext: str,
+                           processor: DocumentProcessor) -> Tuple[Optional[Dict], Iterator[str]]:
+        """
+        从行迭代器中读出文首元数据（Markdown front matter / RST 字段列表）
+        
+        Returns:
+            (元数据, 正文行迭代器)；正文与 extract_metadata 去除元数据后的结果一致
+            （不含开头空行；没有元数据时为原文全部行）
+        """
+        head: List[str] = []
+        first_body_line: List[str] = []
+        if file_ext in ['.rst']:
+            for line in lines:
+                if line.strip() and processor.extract_metadata(line)[0] is None:
+                    first_body_line.append(line)
+                    break
+                head.append(line)
+        else:
+            for line in lines:
+                head.append(line)
+                if line.strip():
+                    break
+            if head and head[-1].strip() == '---':
+                for line in lines:
+                    head.append(line)
+                    if line.startswith('---'):
+                        break
+        
+        metadata_dict, _ = processor.extract_metadata('\n'.join(head)) if head else (None, '')
+        if not metadata_dict:
+            return None, chain(head, first_body_line, lines)
+        # 跳过元数据与正文之间的空行
+        body = chain(first_body_line, lines)
+        for line in body:
+            if line.strip():
+                return metadata_dict, chain([line], body)
+        return metadata_dict, iter([])
+
+    def _stream_chunked_body(self, lines: Iterator[str], chunker: MarkdownChunker,
+                             stats: Dict) -> Iterator[str]:
+        """Markdown / RST 正文：流式分块翻译，块之间的原文原样写出"""
+        source = SourceBuffer(lines)
+        # 合并块的内容按区间从原文缓冲中取，与整篇分块（chunk_text）相同
+        chunks = chunker.iter_chunks(source, source=source.slice)
+        written = 0
+        
+        def to_chunk(chunk: TextChunk) -> Optional[TextChunk]:
+            # 纯代码块不翻译
+            return None if chunk.chunk_type == 'code' else chunk
+        
+        for chunk, translation in self.translator.translate_stream(chunks, to_chunk):
+            original = source.slice(chunk.start_pos, chunk.end_pos)
+            if translation is not None:
+                self._record_stream_result(stats, translation)
+            yield source.slice(written, chunk.start_pos)
+            yield chunker.replace_body(original, translation, chunk.chunk_type)
+            written = chunk.end_pos
+            source.discard(written)
+        yield source.slice(written)
+
+    def _stream_rst_body(self, lines: Iterator[str], processor: DocumentProcessor,
+                         stats: Dict) -> Iterator[str]:
+        """RST 正文：流式解析并逐块翻译，重构后逐行写出"""
+        def to_chunk(block: DocumentBlock) -> Optional[TextChunk]:
+            if block.translatable and block.content.strip():
+                return TextChunk(block.content, 'paragraph')
+            return None
+        
+        def translated_blocks() -> Iterator[DocumentBlock]:
+            for block, translation in self.translator.translate_stream(processor.iter_parse(lines), to_chunk):
+                if translation is None:
+                    yield block
+                    continue
+                self._record_stream_result(stats, translation)
+                yield DocumentBlock(
+                    type=block.type,
+                    content=translation,
+                    translatable=True,
+                    metadata=block.metadata.copy() if block.metadata else {}
+                )
+        
+        for i, line in enumerate(processor.iter_reconstruct(translated_blocks())):
+            yield line if i == 0 else '\n' + line
+
+    @staticmethod
+    def _record_stream_result(stats: Dict, translation: str):
+        """流式翻译中记录一个单元的结果"""
+        index = stats["chunk_count"]
+        stats["chunk_count"] += 1
+        if translation.startswith(FAILURE_MARKER):
+            stats["failed_units"].append({"index": index, "attempts": 1, "error": "translation failed"})
+
+    def _schedule_verification(self, document: TranslatedDocument, stats: Dict,
+                               verify_mode: str, save_stats: bool):
+        """将校验与重译提交到后台队列（单线程按提交顺序处理，不阻塞后续文件的首轮翻译）"""
+        if self._background is None:
+            self._background = ThreadPoolExecutor(max_workers=1)
+        stats["verification_status"] = "pending"
+        print(f"首轮译文已写出，校验已加入后台队列: {stats['output_file']}")
+        self._pending.append(
+            self._background.submit(self._verify_later, document, stats, verify_mode, save_stats)
+        )
+
+    def _verify_later(self, document: TranslatedDocument, stats: Dict,
+                      verify_mode: str, save_stats: bool) -> Dict:
+        """后台任务：校验首轮译文，必要时重译，回写输出文件并更新状态标记"""
+        output_file = stats["output_file"]
+        try:
+            if document.chunks is not None:
+                translated_content, verify_stats = self.translator.verify_and_refine(
+                    document.source_content, document.chunks, document.translated_chunks, verify_mode
+                )
+                translated_blocks = self._blocks_from_translation(
+                    document.file_ext, document.blocks, translated_content, document.processor
+                )
+            else:
+                translated_blocks, verify_stats = self._verify_and_refine_blocks(
+                    document.blocks, document.translated_blocks, verify_mode
+                )
+        except Exception as e:
+            print(f"后台校验失败 {document.input_file}: {e}")
+            stats["verification_status"] = "failed"
+            stats["verification_error"] = str(e)
+            if save_stats:
+                self._save_translation_stats(stats, str(Path(output_file).with_suffix('.stats.json')))
+            return stats
+
+        changed = [b.content for b in translated_blocks] != [b.content for b in document.translated_blocks]
+        status = "refined" if changed else "verified"
+        document.translated_blocks = translated_blocks
+        self._write_document(document, output_file, verification_status=status)
+
+        # 在首轮统计上合并校验结果（保留 input_file 等字段），用量等累计信息取校验后的值
+        stats.update(verify_stats)
+        stats.update(self._usage_stats())
+        stats["verification_status"] = status
+        document.stats = stats
+        if save_stats:
+            self._save_translation_stats(stats, str(Path(output_file).with_suffix('.stats.json')))
+        print(f"后台校验完成 ({status}): {output_file}")
+        return stats
+
+    def wait_for_background(self) -> List[Dict]:
+        """
+        等待后台校验队列全部完成
+        
+        Returns:
+            各文件的最终统计信息（与 translate_file 返回的是同一对象）
+        """
+        results = [future.result() for future in self._pending]
+        self._pending = []
+        if self._background is not None:
+            self._background.shutdown(wait=True)
+            self._background = None
+        return results
+
+    def _finish_document(self,
+                         document: TranslatedDocument,
+                         output_file: Optional[str] = None,
+                         save_stats: bool = True,
+                         verification_status: Optional[str] = None) -> Dict:
+        """写出翻译结果并补全统计信息"""
+        input_file = document.input_file
+        if output_file is None:
+            file_path = Path(input_file)
+            output_file = str(file_path.parent / f"{file_path.stem}_translated{document.file_ext}")
+        
+        self._write_document(document, output_file, verification_status=verification_status)
+        
+        print(f"翻译完成，输出文件: {output_file}")
+        
+        # 统计信息
+        stats = document.stats
+        if save_stats:
+            stats_file = str(Path(output_file).with_suffix('.stats.json'))
+            self._save_translation_stats(stats, stats_file)
+
+        stats.update({
+            "input_file": input_file,
+            "output_file": output_file,
+            "translator_id": self.translator_id,
+            "file_format": document.file_ext,
+            "total_blocks": len(document.blocks),
+            "translatable_blocks": sum(1 for b in document.blocks if b.translatable),
+            **self._usage_stats()
+        })
+        
+        return stats
+
+    def _usage_stats(self) -> Dict:
+        """翻译器的累计统计（缓存命中、token 用量、编码器校准、拆分重试）"""
+        return {
+            "summary_cache": self.translator.summary_generator.cache.get_stats(),
+            "token_usage": self.translator.get_token_usage(),
+            "tokenizer_calibration": self.translator.get_token_calibration(),
+            "split_retries": self.translator.get_split_stats()
+        }
+
+    def _translate_document(self, input_file: str, verify_mode: Optional[str] = None,
+                            defer: bool = False) -> TranslatedDocument:
+        """读取、解析并翻译文档，返回尚未写出的翻译结果
+        defer 为 True 时只做首轮翻译，并保留分块结果供后台校验使用
+        """
         if not os.path.exists(input_file):
             raise FileNotFoundError(f"输入文件不存在: {input_file}")
         
@@ -115,166 +480,339 @@ class UniversalTranslator:
         translatable_count = sum(1 for b in blocks if b.translatable)
         print(f"可翻译块: {translatable_count}/{len(blocks)}")
         
-        # 针对 RST 采用逐块翻译，避免整篇合并造成结构破坏
-        if file_ext in ['.rst']:
+        translatable_content = None
+        chunks = None
+        translated_chunks = None
+        if file_ext in ['.rst'] and self.rst_mode == "blocks":
             print("使用逐块翻译模式 (RST)")
-            translated_blocks, stats = self._translate_blocks_individually(blocks)
+            translated_blocks, stats = self._translate_blocks_individually(
+                blocks, verify_mode="off" if defer else verify_mode
+            )
         else:
-            # 提取可翻译内容 (md等)
-            translatable_content = processor.get_translatable_content(blocks)
+            # RST 按结构分块，整篇正文即为分块的原文；Markdown 直接由已解析的文档块分块，
+            # 可翻译内容为各可翻译块文本按行连接
+            if file_ext in ['.rst']:
+                translatable_content = content_without_metadata
+                chunks = self.rst_chunker.chunk_text(translatable_content)
+            else:
+                segments = list(processor.iter_translatable(blocks))
+                translatable_content = '\n'.join(text for _, _, text in segments)
+                chunks = self.translator.chunker.chunk_blocks(segments)
             # 翻译内容
             print("开始翻译...")
-            translated_content, stats = self.translator.translate_content(translatable_content)
+            if defer:
+                chunks, translated_chunks, failed_units = self.translator.translate_first_pass(
+                    translatable_content, chunks
+                )
+                translated_content = self.translator._merge_translated_chunks(
+                    translated_chunks, chunks, translatable_content
+                )
+                stats = self.translator._unverified_stats(len(chunks))
+                stats["failed_units"] = failed_units
+            else:
+                translated_content, stats = self.translator.translate_content(
+                    translatable_content, verify_mode=verify_mode, chunks=chunks
+                )
             # 更新块中的翻译内容
-            translated_blocks = self._update_blocks_with_translation(
-                blocks, translated_content, processor
-            )
+            translated_blocks = self._blocks_from_translation(file_ext, blocks, translated_content, processor)
         
+        return TranslatedDocument(
+            input_file=input_file,
+            file_ext=file_ext,
+            processor=processor,
+            metadata=metadata_dict,
+            blocks=blocks,
+            translated_blocks=translated_blocks,
+            stats=stats,
+            source_content=translatable_content,
+            chunks=chunks,
+            translated_chunks=translated_chunks
+        )
+
+    def _write_document(self, document: TranslatedDocument, output_file: str,
+                        verification_status: Optional[str] = None):
+        """重构文档、更新元数据并写出
+        verification_status 不为空时写入校验状态标记：front matter / RST 字段列表中的 verification 字段，
+        原文没有元数据时使用文首注释（Markdown 为 HTML 注释，RST 为 .. 注释）
+        """
+        processor = document.processor
         # 重构文档
-        reconstructed_content = processor.reconstruct(translated_blocks)
+        reconstructed_content = processor.reconstruct(document.translated_blocks)
         
         # 更新元数据
+        metadata_dict = self._update_metadata(document.metadata) if document.metadata else None
+        if verification_status:
+            if metadata_dict is not None:
+                metadata_dict['verification'] = verification_status
+            elif document.file_ext in ['.rst']:
+                reconstructed_content = f".. verification: {verification_status}\n\n" + reconstructed_content
+            else:
+                reconstructed_content = f"<!-- verification: {verification_status} -->\n\n" + reconstructed_content
         if metadata_dict:
-            metadata_dict = self._update_metadata(metadata_dict)
             final_output = processor.format_with_metadata(metadata_dict, reconstructed_content)
         else:
             final_output = reconstructed_content
         
         # 添加翻译署名
-        final_output = self._append_translation_signature(final_output, file_ext)
-        
-        if output_file is None:
-            output_file = str(file_path.parent / f"{file_path.stem}_translated{file_ext}")
+        final_output = self._append_translation_signature(final_output, document.file_ext)
         
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(final_output)
-        
-        print(f"翻译完成，输出文件: {output_file}")
-        
-        # 统计信息
-        if save_stats:
-            stats_file = str(Path(output_file).with_suffix('.stats.json'))
-            self._save_translation_stats(stats, stats_file)
-
-        stats.update({
-            "input_file": input_file,
-            "output_file": output_file,
-            "translator_id": self.translator_id,
-            "file_format": file_ext,
-            "total_blocks": len(blocks),
-            "translatable_blocks": translatable_count
-        })
-        
-        return stats
 
-    def _translate_blocks_individually(self, blocks: List[DocumentBlock]) -> Tuple[List[DocumentBlock], Dict]:
+    def _translate_blocks_individually(self, blocks: List[DocumentBlock],
+                                       verify_mode: Optional[str] = None) -> Tuple[List[DocumentBlock], Dict]:
         """逐块翻译（RST 专用）
         - 保持每个块的独立性
         - 避免整体拼接导致的格式错乱
         - 代码/指令/表格分隔/空行不翻译
+        - verify_mode 决定校验策略（off / local / sampled / full）
         """
         translated_blocks: List[DocumentBlock] = []
-        original_texts = []
-        translated_texts = []
+        retry_queue = RetryQueue(
+            max_attempts=self.translator.retry_attempts,
+            base_delay=self.translator.retry_base_delay,
+            max_workers=self.translator.max_workers
+        )
         
-        for block in blocks:
+        for i, block in enumerate(blocks):
             if block.translatable and block.content.strip():
+                chunk = TextChunk(block.content, 'paragraph')
                 try:
-                    result = self.translator.translate_chunk(
-                        TextChunk(block.content, 'paragraph')
-                    )
-                except Exception:
-                    result = block.content
+                    result = self.translator._translate_with_split(chunk)
+                except Exception as e:
+                    # 失败的块先占位，其余块继续翻译，最后统一重试
+                    print(f"块 {i} 翻译失败，稍后重试: {e}")
+                    retry_queue.add(i, chunk, e)
+                    result = f"{FAILURE_MARKER} {block.content}"
                 new_block = DocumentBlock(
                     type=block.type,
                     content=result,
                     translatable=True,
                     metadata=block.metadata.copy() if block.metadata else {}
                 )
-                original_texts.append(block.content)
-                translated_texts.append(result)
             else:
                 new_block = block
             translated_blocks.append(new_block)
         
-        # 构造简单的统计信息（复用 summary/compare 能力）
-        original_joined = '\n'.join(original_texts)
-        translated_joined = '\n'.join(translated_texts)
-        original_summary = self.translator.summary_generator.generate_original_summary(original_joined)
-        translated_summary = self.translator.summary_generator.generate_translated_summary(translated_joined)
-        comparison_result = self.translator.summary_generator.compare_summaries(
-            original_summary, translated_summary
+        failed_units = []
+        if len(retry_queue):
+            recovered, failed_units = retry_queue.drain(self.translator._translate_with_split)
+            for i, result in recovered.items():
+                translated_blocks[i] = DocumentBlock(
+                    type=blocks[i].type,
+                    content=result,
+                    translatable=True,
+                    metadata=blocks[i].metadata.copy() if blocks[i].metadata else {}
+                )
+            if failed_units:
+                print(f"{len(failed_units)} 个块重试后仍然失败: {[u['index'] for u in failed_units]}")
+        
+        translated_blocks, stats = self._verify_and_refine_blocks(blocks, translated_blocks, verify_mode)
+        stats["failed_units"] = failed_units
+        return translated_blocks, stats
+
+    def _verify_and_refine_blocks(self,
+                                  blocks: List[DocumentBlock],
+                                  translated_blocks: List[DocumentBlock],
+                                  verify_mode: Optional[str] = None) -> Tuple[List[DocumentBlock], Dict]:
+        """按校验策略检查逐块翻译结果，必要时定向或整体重译（RST 专用）"""
+        segment_count = sum(1 for b in blocks if b.translatable and b.content.strip())
+        verify_mode = verify_mode or self.translator.verify_mode
+        if verify_mode == "off":
+            return translated_blocks, self.translator._unverified_stats(segment_count)
+
+        cascade = None
+        if self.translator.escalation_chain is not None:
+            translated_blocks, cascade = self._escalate_blocks(blocks, translated_blocks, verify_mode)
+        translated_blocks, stats = self._check_and_refine_blocks(blocks, translated_blocks, verify_mode, segment_count)
+        if cascade is not None:
+            stats["cascade"] = cascade
+        return translated_blocks, stats
+
+    def _escalate_blocks(self,
+                         blocks: List[DocumentBlock],
+                         translated_blocks: List[DocumentBlock],
+                         verify_mode: str) -> Tuple[List[DocumentBlock], Dict]:
+        """模型级联（RST）：未通过检查的块交给升级模型重译"""
+        updated_texts, cascade = self.translator.escalate_segments(
+            [b.content if b.translatable else '' for b in blocks],
+            [b.content for b in translated_blocks],
+            [b.type for b in blocks],
+            verify_mode
         )
+        new_blocks = translated_blocks.copy()
+        for bi in cascade["escalated"]:
+            b = translated_blocks[bi]
+            new_blocks[bi] = DocumentBlock(
+                type=b.type,
+                content=updated_texts[bi],
+                translatable=True,
+                metadata=b.metadata.copy() if b.metadata else {}
+            )
+        return new_blocks, cascade
+
+    def _check_and_refine_blocks(self,
+                                 blocks: List[DocumentBlock],
+                                 translated_blocks: List[DocumentBlock],
+                                 verify_mode: str,
+                                 segment_count: int) -> Tuple[List[DocumentBlock], Dict]:
+        """_verify_and_refine_blocks 的校验与重译部分（级联之后）"""
+        local_report = None
+        sampling = None
+        if verify_mode in ("local", "sampled") or self.translator.local_gate:
+            translated_blocks, local_report = self._local_check_blocks(blocks, translated_blocks)
+            if verify_mode == "sampled":
+                sampling = self.translator._sample_decision(local_report)
+            skip_llm = (verify_mode == "local"
+                        or (sampling is not None and not sampling["selected"])
+                        or (verify_mode == "full" and local_report.clean))
+            if skip_llm:
+                print("本地结构检查完成，跳过 LLM 校验")
+                stats = self.translator._local_stats(local_report, segment_count)
+                if sampling is not None:
+                    stats["sampling"] = sampling
+                return translated_blocks, stats
+
+        # 构造简单的统计信息（复用 summary/compare 能力）
+        verification = self._verify_blocks(blocks, translated_blocks)
+        comparison_result = verification["comparison_result"]
         stats = {
-            "original_summary": original_summary,
-            "translated_summary": translated_summary,
+            "original_summary": verification["original_summary"],
+            "translated_summary": verification["translated_summary"],
             "comparison_result": comparison_result,
-            "chunk_count": len(translated_texts),
-            "completeness_score": comparison_result.get("completeness_score", 0)
+            "chunk_count": segment_count,
+            "completeness_score": comparison_result.get("completeness_score", 0),
+            "verification_method": comparison_result.get("verify_mode", self.translator.verification_method)
         }
-        # 重译判定逻辑
-        missing_content = comparison_result.get("missing_content")
-        has_missing = bool(missing_content and missing_content.strip() and missing_content.strip() != '无')
-        if self.enable_refine and (comparison_result.get("completeness_score", 0) < self.refine_threshold or has_missing):
-            print(f"检测到需要改进: 完整性评分 {comparison_result.get('completeness_score', 0)}/10")
+        if local_report is not None:
+            stats["local_check"] = local_report.to_dict()
+        if sampling is not None:
+            stats["sampling"] = sampling
+        if not self.enable_refine:
+            return translated_blocks, stats
+        # 重译判定逻辑：有遗漏内容或评分低于阈值；轮数与花费由预算控制器决定
+        budget = self.translator.refine_budget
+        tracker = budget.begin_file()
+        segment_indices = [i for i, b in enumerate(blocks) if b.translatable and b.content.strip()]
+        while True:
+            score_before = comparison_result.get("completeness_score", 0)
+            missing_content = comparison_result.get("missing_content")
+            has_missing = self.translator._has_missing(missing_content)
+            targets = comparison_result.get("affected_blocks") or segment_indices[:5]
+            all_texts = [blocks[i].content for i in segment_indices] + \
+                [translated_blocks[i].content for i in segment_indices]
+            estimate = budget.estimate(
+                [text for i in targets for text in (blocks[i].content, translated_blocks[i].content)],
+                all_texts
+            )
+            if not tracker.should_refine(score_before, has_missing, self.refine_threshold, estimate):
+                break
+            print(f"检测到需要改进: 完整性评分 {score_before}/10")
             if has_missing:
                 print(f"缺失内容描述: {missing_content}")
             improved_blocks = self._attempt_retranslation_rst(
-                blocks, translated_blocks, missing_content or ""
+                blocks, translated_blocks, missing_content or "",
+                target_indices=comparison_result.get("affected_blocks")
             )
-            if improved_blocks:
-                translated_blocks = improved_blocks
-                # 重新生成统计
-                improved_original_texts = [b.content for b in blocks if b.translatable and b.content.strip()]
-                improved_translated_texts = [b.content for b in translated_blocks if b.translatable and b.content.strip()]
-                improved_original_joined = '\n'.join(improved_original_texts)
-                improved_translated_joined = '\n'.join(improved_translated_texts)
-                improved_original_summary = self.translator.summary_generator.generate_original_summary(improved_original_joined)
-                improved_translated_summary = self.translator.summary_generator.generate_translated_summary(improved_translated_joined)
-                improved_comp = self.translator.summary_generator.compare_summaries(
-                    improved_original_summary, improved_translated_summary
-                )
-                stats.update({
-                    "original_summary": improved_original_summary,
-                    "translated_summary": improved_translated_summary,
-                    "comparison_result": improved_comp,
-                    "completeness_score": improved_comp.get("completeness_score", stats.get("completeness_score")),
-                    "refine_mode": "targeted"
-                })
-                print(f"改进后完整性评分: {improved_comp.get('completeness_score')}/10")
-            else:
-                # 回退
+            refine_mode = "targeted"
+            if not improved_blocks:
+                # 回退：整体审阅的输入为全部段落
+                full_estimate = estimate + budget.estimate([], all_texts)
+                if not tracker.should_refine(score_before, has_missing, self.refine_threshold,
+                                             full_estimate, mode="full"):
+                    break
                 print("定向重译未成功或无改进，尝试整体重译补全关键信息……")
-                full_blocks = self._full_retranslate_rst(blocks, translated_blocks, missing_content or "")
-                if full_blocks:
-                    translated_blocks = full_blocks
-                    improved_original_texts = [b.content for b in blocks if b.translatable and b.content.strip()]
-                    improved_translated_texts = [b.content for b in translated_blocks if b.translatable and b.content.strip()]
-                    improved_original_joined = '\n'.join(improved_original_texts)
-                    improved_translated_joined = '\n'.join(improved_translated_texts)
-                    improved_original_summary = self.translator.summary_generator.generate_original_summary(improved_original_joined)
-                    improved_translated_summary = self.translator.summary_generator.generate_translated_summary(improved_translated_joined)
-                    improved_comp = self.translator.summary_generator.compare_summaries(
-                        improved_original_summary, improved_translated_summary
-                    )
-                    stats.update({
-                        "original_summary": improved_original_summary,
-                        "translated_summary": improved_translated_summary,
-                        "comparison_result": improved_comp,
-                        "completeness_score": improved_comp.get("completeness_score", stats.get("completeness_score")),
-                        "refine_mode": "full"
-                    })
-                    print(f"整体重译后完整性评分: {improved_comp.get('completeness_score')}/10")
+                improved_blocks = self._full_retranslate_rst(blocks, translated_blocks, missing_content or "")
+                refine_mode = "full"
+                estimate = full_estimate
+            if not improved_blocks:
+                tracker.stop("no_change")
+                break
+            translated_blocks = improved_blocks
+            # 重新生成统计（原文摘要命中缓存，不会重复调用 LLM）
+            improved = self._verify_blocks(
+                blocks, translated_blocks, verification["original_summary"] or None
+            )
+            comparison_result = improved["comparison_result"]
+            stats.update({
+                "original_summary": improved["original_summary"],
+                "translated_summary": improved["translated_summary"],
+                "comparison_result": comparison_result,
+                "completeness_score": comparison_result.get("completeness_score", stats.get("completeness_score")),
+                "refine_mode": refine_mode
+            })
+            label = "改进后" if refine_mode == "targeted" else "整体重译后"
+            print(f"{label}完整性评分: {comparison_result.get('completeness_score')}/10")
+            tracker.record(refine_mode, estimate, score_before, comparison_result.get("completeness_score", 0))
+        if tracker.rounds:
+            print(f"重译结束（{tracker.to_dict()['stop_reason']}），预估花费 {tracker.tokens_spent} tokens")
+        stats["refine_control"] = tracker.to_dict()
         return translated_blocks, stats
+
+    def _local_check_blocks(self,
+                            original_blocks: List[DocumentBlock],
+                            translated_blocks: List[DocumentBlock]) -> Tuple[List[DocumentBlock], IntegrityReport]:
+        """本地结构检查；存在问题时只重译被点名的块并复查一次"""
+        checker = self.translator.integrity_checker
+        report = checker.check_blocks(original_blocks, translated_blocks)
+        if report.clean:
+            return translated_blocks, report
+        print(f"本地结构检查发现 {len(report.issues)} 个问题块: {report.flagged_indices}")
+        improved = self._attempt_retranslation_rst(
+            original_blocks, translated_blocks, report.describe(),
+            max_targets=len(report.issues), target_indices=report.flagged_indices
+        )
+        if not improved:
+            return translated_blocks, report
+        return improved, checker.check_blocks(original_blocks, improved)
+
+    def _verify_blocks(self,
+                       original_blocks: List[DocumentBlock],
+                       translated_blocks: List[DocumentBlock],
+                       original_summary: Optional[str] = None) -> Dict:
+        """校验逐块翻译结果；结构化校验给出的片段编号会映射为块下标 affected_blocks"""
+        indices = [i for i, b in enumerate(original_blocks) if b.translatable and b.content.strip()]
+        original_texts = [original_blocks[i].content for i in indices]
+        translated_texts = [translated_blocks[i].content for i in indices]
+        verification = self.translator.verify_translation(
+            '\n'.join(original_texts), '\n'.join(translated_texts),
+            original_texts, translated_texts, original_summary
+        )
+        comparison_result = verification["comparison_result"]
+        comparison_result["affected_blocks"] = [
+            indices[j] for j in comparison_result.get("affected_segments", []) if j < len(indices)
+        ]
+        return verification
     
+    def _chunker_for(self, file_ext: str) -> MarkdownChunker:
+        """整篇分块翻译使用的分块器"""
+        return self.rst_chunker if file_ext in ['.rst'] else self.translator.chunker
+
+    def _blocks_from_translation(self,
+                                 file_ext: str,
+                                 blocks: List[DocumentBlock],
+                                 translated_content: str,
+                                 processor: DocumentProcessor) -> List[DocumentBlock]:
+        """整篇分块翻译的结果转为文档块：RST 译文按区间拼接后本身就是完整正文，修正版式后重新解析"""
+        if file_ext in ['.rst']:
+            return ProcessorFactory.create(file_ext).parse(RSTChunker.fit_translation(translated_content))
+        return self._update_blocks_with_translation(blocks, translated_content, processor)
+
     def _update_blocks_with_translation(self,
                                        blocks: List[DocumentBlock],
                                        translated_content: str,
                                        processor: DocumentProcessor) -> List[DocumentBlock]:
-        """将整体翻译结果按顺序回填到可翻译块（用于非 RST 格式如 Markdown）"""
-        translated_paragraphs = [p.strip() for p in translated_content.split('\n\n') if p.strip()]
+        """将整体翻译结果按顺序回填到可翻译块（用于非 RST 格式如 Markdown）
+        可翻译内容每块一行，译文按区间拼接回原文后行数与可翻译块数一致时逐行回填
+        """
+        translated_lines = [p.strip() for p in translated_content.split('\n') if p.strip()]
+        translatable_count = sum(1 for b in blocks if b.translatable and b.content.strip())
+        if len(translated_lines) == translatable_count:
+            translated_paragraphs = translated_lines
+        else:
+            translated_paragraphs = [p.strip() for p in translated_content.split('\n\n') if p.strip()]
         if not translated_paragraphs:
-            translated_paragraphs = [p.strip() for p in translated_content.split('\n') if p.strip()]
+            translated_paragraphs = translated_lines
         translated_index = 0
         updated_blocks: List[DocumentBlock] = []
         for block in blocks:
@@ -303,103 +841,31 @@ class UniversalTranslator:
                                    original_blocks: List[DocumentBlock],
                                    translated_blocks: List[DocumentBlock],
                                    missing_content: str,
-                                   max_targets: int = 5) -> Optional[List[DocumentBlock]]:
+                                   max_targets: int = 5,
+                                   target_indices: Optional[List[int]] = None) -> Optional[List[DocumentBlock]]:
         """针对 RST 块定向重译改进缺失内容。
+        target_indices 为校验阶段已定位的块下标，提供时跳过索引检索。
         返回更新后的 blocks 或 None。
         """
-        if not missing_content or not missing_content.strip():
+        if not target_indices and (not missing_content or not missing_content.strip()):
             return None
         try:
-            # 1. 反向提取关键词
-            reverse_prompt = ChatPromptTemplate.from_template(
-                """
-你是技术文档分析助手。请从下面关于缺失内容的中文描述中提取可能在英文原文中出现的关键词（英文术语、函数/结构名、文件名、协议名等）。
-只输出逗号分隔的英文关键词，不要解释：
-
-{missing}
-"""
-            )
-            reverse_chain = reverse_prompt | self.translator.llm | TranslationOutputParser()
-            try:
-                keywords_raw = reverse_chain.invoke({"missing": missing_content})
-                keywords = [k.strip() for k in keywords_raw.split(',') if k.strip()]
-            except Exception:
-                # import re as _re
-                keywords = _re.findall(r'[A-Za-z][A-Za-z0-9_\-]+', missing_content)
-            if not keywords:
-                return None
-            # 2. 匹配相关块
-            scored: List[Tuple[int, int]] = []
-            for idx, blk in enumerate(original_blocks):
-                if not blk.translatable or not blk.content.strip():
-                    continue
-                text_lower = blk.content.lower()
-                hits = sum(1 for kw in keywords if kw.lower() in text_lower)
-                if hits > 0:
-                    scored.append((idx, hits))
-            if not scored:
-                return None
-            scored.sort(key=lambda x: x[1], reverse=True)
-            primary_indices = [i for i, _ in scored[:max_targets]]
-            # 3. 扩展上下文（左右各 1 个）
-            context_indices = set()
-            for i in primary_indices:
-                for j in range(max(0, i - 1), min(len(original_blocks), i + 2)):
-                    if original_blocks[j].translatable:
-                        context_indices.add(j)
-            expanded = sorted(context_indices)
-            if not expanded:
+            primary_indices = self._locate_relevant_blocks(original_blocks, missing_content, max_targets, target_indices)
+            if not primary_indices:
                 return None
-            # 4. 构造片段文本
-            segment_chunks = []
-            for order, bi in enumerate(expanded, 1):
-                segment_chunks.append(
-                    f"[SEG-{order}]\n原文:\n{original_blocks[bi].content}\n当前译文:\n{translated_blocks[bi].content}"
-                )
-            segments_text = '\n\n-----\n\n'.join(segment_chunks)
-            # 5. 重译 Prompt
-            retranslate_prompt = ChatPromptTemplate.from_template(
-                """
-你是资深英文→简体中文技术翻译，需要对部分片段进行改进以补全遗漏内容：{missing_content}
-
-要求：
-1. 只改进提供的片段，不新增未提供原文的段落
-2. 保留 RST 结构（标题、列表缩进、行内反引号、下划线/星号格式等）
-3. 如果原译已正确可保持，但必须确保缺失信息被补足
-4. 输出时严格按输入 [SEG-x] 的顺序，仅给出改进后的中文译文正文（不要输出 [SEG-x] 标识本身）
-5. 片段之间使用独立分隔符 <<<END>>>
-
-待改进片段：
-{segments}
-
-仅输出改进译文列表（每个译文之间用 <<<END>>> 分隔，不包含任何标记）：
-"""
+            # 每个块连同相邻原文单独改进，并行执行，逐块校验后应用
+            patches = self.translator.refine_segments(
+                [b.content if b.translatable else '' for b in original_blocks],
+                [b.content for b in translated_blocks],
+                primary_indices, missing_content, doc_format="RST"
             )
-            re_chain = retranslate_prompt | self.translator.llm | TranslationOutputParser()
-            improved_all = re_chain.invoke({
-                "missing_content": missing_content,
-                "segments": segments_text
-            })
-            improved_parts = [p.strip() for p in improved_all.split('<<<END>>>') if p.strip()]
-            if len(improved_parts) != len(expanded):
-                fallback = [p.strip() for p in improved_all.split('\n\n') if p.strip()]
-                if len(fallback) == len(expanded):
-                    improved_parts = fallback
-            if len(improved_parts) != len(expanded):
+            if not patches:
                 return None
-            # 清理 LLM 返回中可能残留的 [SEG-x] 标识
-            cleaned_parts = []
-            for part in improved_parts:
-                # 移除开头的 [SEG-x] 或类似标识
-                cleaned = _re.sub(r'^\s*\[SEG-\d+\]\s*', '', part)
-                cleaned_parts.append(cleaned)
-            improved_parts = cleaned_parts
-            # 6. 应用替换
             new_blocks = translated_blocks.copy()
-            for part, bi in zip(improved_parts, expanded):
+            for bi, text in patches.items():
                 new_blocks[bi] = DocumentBlock(
                     type=new_blocks[bi].type,
-                    content=part,
+                    content=text,
                     translatable=new_blocks[bi].translatable,
                     metadata=new_blocks[bi].metadata.copy() if new_blocks[bi].metadata else {}
                 )
@@ -408,62 +874,116 @@ class UniversalTranslator:
             print(f"定向重译失败: {e}")
             return None
 
+    def _locate_relevant_blocks(self,
+                                original_blocks: List[DocumentBlock],
+                                missing_content: str,
+                                max_targets: int = 5,
+                                target_indices: Optional[List[int]] = None) -> List[int]:
+        """定位与缺失内容相关的块下标（按相关度排序）"""
+        if target_indices:
+            located = [i for i in target_indices
+                       if 0 <= i < len(original_blocks) and original_blocks[i].translatable]
+            if located:
+                return located[:max_targets]
+        if not missing_content or not missing_content.strip():
+            return []
+        # 在可翻译块的倒排索引上检索（不调用 LLM）
+        indices = [i for i, blk in enumerate(original_blocks) if blk.translatable and blk.content.strip()]
+        index = SegmentIndex(original_blocks[i].content for i in indices)
+        return [indices[pos] for pos, _ in index.search(missing_content, top_k=max_targets)]
+
     def _full_retranslate_rst(self,
                               original_blocks: List[DocumentBlock],
                               translated_blocks: List[DocumentBlock],
                               missing_content: str) -> Optional[List[DocumentBlock]]:
-        """整体重译 RST 的所有可翻译块，提示补全缺失内容。"""
+        """整体审阅 RST 的所有可翻译块，补全缺失内容。
+        模型只输出需要修改的段落（编号 -> 新译文的 JSON 补丁），未修改的译文保留在本地。
+        """
         try:
-            original_texts = [b.content for b in original_blocks if b.translatable and b.content.strip()]
-            current_translated = [b.content for b in translated_blocks if b.translatable and b.content.strip()]
-            orig_joined = '\n\n'.join(original_texts)
-            trans_joined = '\n\n'.join(current_translated)
+            indices = [i for i, b in enumerate(original_blocks) if b.translatable and b.content.strip()]
+            if not indices:
+                return None
+            segments_text = '\n\n'.join(
+                f"[{order}]\n原文:\n{original_blocks[bi].content}\n当前译文:\n{translated_blocks[bi].content}"
+                for order, bi in enumerate(indices, 1)
+            )
             prompt = ChatPromptTemplate.from_template(
                 """
-你是专业的英文→简体中文技术文档翻译改进器。下面是原文集合与当前译文集合。请在不破坏 RST 结构的前提下，输出改进后的完整译文集合，补全缺失信息：{missing}
+你是专业的英文→简体中文技术文档翻译改进器。下面是按编号列出的原文段落与当前译文。请找出需要修改才能补全缺失信息的段落：{missing}
 
 要求：
-1. 只输出改进后的所有译文段落，顺序与原文段落一致
-2. 不添加额外说明、编号、标记
-3. 维持原有段落粒度（使用双换行分隔）
-4. 保留行内反引号、下划线、列表语法
+1. 只输出需要修改的段落，未修改的段落不要输出
+2. 输出一个 JSON 对象，键为段落编号（字符串），值为该段落改进后的完整译文，例如 {{"3": "改进后的译文"}}
+3. 不要输出 JSON 以外的任何内容；无需修改时输出 {{}}
+4. 保留 RST 结构（行内反引号、下划线、列表语法等）
 
-【原文段落集合】
-{original}
-
-【当前译文段落集合】
-{translated}
+【段落】
+{segments}
 
-输出：改进后的译文段落集合（双换行分隔）：
+JSON 补丁：
 """
             )
             chain = prompt | self.translator.llm | TranslationOutputParser()
-            improved_all = chain.invoke({
+            raw = chain.invoke({
                 "missing": missing_content,
-                "original": orig_joined,
-                "translated": trans_joined
+                "segments": segments_text
             })
-            improved_segments = [seg.strip() for seg in improved_all.split('\n\n') if seg.strip()]
-            if not improved_segments:
-                return None
-            # 回填（按出现顺序）
-            new_blocks: List[DocumentBlock] = []
-            seg_idx = 0
-            for b in translated_blocks:
-                if b.translatable and b.content.strip() and seg_idx < len(improved_segments):
-                    new_blocks.append(DocumentBlock(
-                        type=b.type,
-                        content=improved_segments[seg_idx],
-                        translatable=True,
-                        metadata=b.metadata.copy() if b.metadata else {}
-                    ))
-                    seg_idx += 1
-                else:
-                    new_blocks.append(b)
-            return new_blocks
+            patches = self.parse_patch_json(raw, len(indices))
+            print(f"整体审阅返回 {len(patches)}/{len(indices)} 个段落的补丁")
+            new_blocks = translated_blocks.copy()
+            applied = 0
+            for order, text in patches.items():
+                bi = indices[order - 1]
+                if not self.translator._accept_refinement(
+                        original_blocks[bi].content, translated_blocks[bi].content, text):
+                    continue
+                b = translated_blocks[bi]
+                new_blocks[bi] = DocumentBlock(
+                    type=b.type,
+                    content=text,
+                    translatable=True,
+                    metadata=b.metadata.copy() if b.metadata else {}
+                )
+                applied += 1
+            return new_blocks if applied else None
         except Exception as e:
             print(f"整体重译失败: {e}")
             return None
+
+    @staticmethod
+    def parse_patch_json(raw: str, segment_count: int) -> Dict[int, str]:
+        """
+        解析段落补丁输出
+        
+        Args:
+            raw: 模型输出（允许包裹在 ```json 代码围栏中）
+            segment_count: 段落数量，补丁编号必须落在 1..segment_count
+            
+        Returns:
+            {段落编号: 新译文}
+            
+        Raises:
+            ValueError: 输出不是合法 JSON 对象，或编号/译文不符合约定
+        """
+        text = raw.strip()
+        fence_match = _re.match(r'^```(?:json)?\s*(.*?)\s*```$', text, _re.DOTALL)
+        if fence_match:
+            text = fence_match.group(1)
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"不是合法的 JSON: {e}")
+        if not isinstance(data, dict):
+            raise ValueError("顶层必须是 JSON 对象")
+        patches = {}
+        for key, value in data.items():
+            key = str(key).strip().strip('[]')
+            if not key.isdigit() or not 1 <= int(key) <= segment_count:
+                raise ValueError(f"补丁编号不存在: {key!r}")
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"段落 {key} 的译文必须是非空字符串")
+            patches[int(key)] = value.strip()
+        return patches
     
     def _update_metadata(self, metadata: Dict) -> Dict:
         """
@@ -516,7 +1036,8 @@ class UniversalTranslator:
     def batch_translate(self,
                        input_dir: str,
                        output_dir: Optional[str] = None,
-                       file_pattern: str = "*.*") -> List[Dict]:
+                       file_pattern: str = "*.*",
+                       anomaly_detection: bool = False) -> List[Dict]:
         """
         批量翻译目录中的文件
         
@@ -524,6 +1045,7 @@ class UniversalTranslator:
             input_dir: 输入目录
             output_dir: 输出目录（可选）
             file_pattern: 文件匹配模式
+            anomaly_detection: 是否用整批长度比异常检测代替逐文件的 LLM 校验
             
         Returns:
             翻译结果列表
@@ -538,32 +1060,30 @@ class UniversalTranslator:
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        # 查找所有支持的文件
-        supported_extensions = ProcessorFactory.get_supported_extensions()
-        files_to_translate = []
-        
-        for ext in supported_extensions:
-            pattern = f"*{ext}" if file_pattern == "*.*" else file_pattern
-            files_to_translate.extend(input_path.glob(pattern))
-        
+        files_to_translate = self._find_batch_files(input_path, file_pattern)
         if not files_to_translate:
-            print(f"在 {input_dir} 中没有找到支持的文件")
-            print(f"支持的格式: {', '.join(supported_extensions)}")
             return []
         
         print(f"找到 {len(files_to_translate)} 个文件待翻译")
         
         results = []
+        documents = []
         for i, file_path in enumerate(files_to_translate, 1):
             print(f"\n[{i}/{len(files_to_translate)}] 处理文件: {file_path.name}")
             
             try:
                 output_file = str(output_path / f"{file_path.stem}_translated{file_path.suffix}")
-                stats = self.translate_file(
-                    input_file=str(file_path),
-                    output_file=output_file,
-                    save_stats=True
-                )
+                if anomaly_detection:
+                    # 只做首轮翻译并保留分块结果，异常片段稍后统一检测与重译
+                    document = self._translate_document(str(file_path), verify_mode="off", defer=True)
+                    stats = self._finish_document(document, output_file, save_stats=True)
+                    documents.append((document, output_file))
+                else:
+                    stats = self.translate_file(
+                        input_file=str(file_path),
+                        output_file=output_file,
+                        save_stats=True
+                    )
                 results.append(stats)
             except Exception as e:
                 print(f"翻译文件 {file_path.name} 时出错: {e}")
@@ -572,8 +1092,378 @@ class UniversalTranslator:
                     "error": str(e)
                 })
         
+        if anomaly_detection and documents:
+            self._refine_batch_anomalies(documents)
+        
         return results
+
+    @staticmethod
+    def _find_batch_files(input_path: Path, file_pattern: str) -> List[Path]:
+        """查找目录中所有支持的文件"""
+        supported_extensions = ProcessorFactory.get_supported_extensions()
+        files = []
+        
+        for ext in supported_extensions:
+            pattern = f"*{ext}" if file_pattern == "*.*" else file_pattern
+            files.extend(input_path.glob(pattern))
+        
+        if not files:
+            print(f"在 {input_path} 中没有找到支持的文件")
+            print(f"支持的格式: {', '.join(supported_extensions)}")
+        return files
+
+    def plan_batch(self,
+                   input_dir: str,
+                   file_pattern: str = "*.*",
+                   sample_size: int = 512) -> List[Dict]:
+        """
+        预估整批文件的翻译请求数与输入 token 数（不调用 LLM）
+        
+        用与翻译相同的分块规则打包，但 token 数全部来自快速估计器：先从整批文档中抽取
+        sample_size 个结构块做一次批量精确编码校准估计器，之后规划每个文件都不再做 BPE 编码。
+        
+        Returns:
+            每个文件的 {"input_file", "requests", "input_tokens"}（出错时为 {"input_file", "error"}）
+        """
+        input_path = Path(input_dir)
+        if not input_path.exists():
+            raise FileNotFoundError(f"输入目录不存在: {input_dir}")
+        files = self._find_batch_files(input_path, file_pattern)
+        if not files:
+            return []
+        
+        planners = {}
+        
+        def planner_for(file_ext: str) -> MarkdownChunker:
+            """与翻译使用的分块器参数相同、只用估计值打包的分块器"""
+            reference = self._chunker_for(file_ext)
+            if type(reference) not in planners:
+                planners[type(reference)] = type(reference)(
+                    max_tokens=reference.max_tokens, model=self.model_name,
+                    max_output_tokens=reference.max_output_tokens,
+                    output_expansion=reference.output_expansion, exact=False
+                )
+            return planners[type(reference)]
+        
+        def load(file_path: Path) -> Tuple[str, List]:
+            """
+            返回文件扩展名与待翻译的单元：RST 整篇分块时为一篇正文，RST 逐块翻译时为各可翻译块，
+            Markdown 为 iter_translatable 产出的可翻译块
+            """
+            processor = ProcessorFactory.create(file_path.suffix)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                _, content = processor.extract_metadata(f.read())
+            if file_path.suffix in ['.rst']:
+                if self.rst_mode == "chunks":
+                    return file_path.suffix, [content]
+                return file_path.suffix, [b.content for b in processor.parse(content) if b.translatable and b.content.strip()]
+            return file_path.suffix, list(processor.iter_translatable(processor.parse(content)))
+        
+        def structure(file_ext: str, units: List) -> Iterator[TextChunk]:
+            planner = planner_for(file_ext)
+            if file_ext in ['.rst']:
+                return planner.iter_structure(units[0].split('\n'))
+            return planner.split_by_blocks(units)
+        
+        def per_block(file_ext: str) -> bool:
+            return file_ext in ['.rst'] and self.rst_mode == "blocks"
+        
+        # 校准：按文件顺序收集结构块，直到样本数足够（各分块器共用同一编码器与估计器）
+        samples: List[str] = []
+        for file_path in files:
+            if len(samples) >= sample_size:
+                break
+            try:
+                file_ext, texts = load(file_path)
+            except Exception:
+                continue
+            if per_block(file_ext):
+                samples.extend(texts)
+            else:
+                planner = planner_for(file_ext)
+                samples.extend(c.content for c in structure(file_ext, texts)
+                               if c.chunk_type not in planner.passthrough_types)
+        planner = planner_for('.md')
+        planner.estimator.calibrate(samples[:sample_size], planner.tokenizer)
+        
+        results = []
+        for file_path in files:
+            try:
+                file_ext, texts = load(file_path)
+                planner = planner_for(file_ext)
+                if per_block(file_ext):
+                    # RST 逐块翻译，每个可翻译块一个请求
+                    requests = len(texts)
+                    tokens = sum(planner.estimate_tokens(text) for text in texts)
+                else:
+                    # 与翻译时相同：RST 对正文分块，Markdown 由文档块分块
+                    chunks = planner.chunk_text(texts[0]) if file_ext in ['.rst'] else planner.chunk_blocks(texts)
+                    requests = len(chunks)
+                    tokens = sum(planner.estimate_tokens(c.content) for c in chunks)
+                results.append({"input_file": str(file_path), "requests": requests, "input_tokens": tokens})
+            except Exception as e:
+                results.append({"input_file": str(file_path), "error": str(e)})
+        return results
+
+    def _refine_batch_anomalies(self, documents: List[Tuple[TranslatedDocument, str]]):
+        """
+        对整批译文做一次向量化长度比异常检测，只重译被标记的片段并重写对应输出文件
+        """
+        detector = LengthRatioDetector(token_counter=self.translator.chunker.count_tokens)
+        for doc_id, (document, _) in enumerate(documents):
+            detector.add_document(doc_id, *self._anomaly_segments(document))
+        report = detector.detect()
+        print(f"\n批量异常检测: {report.segment_count} 个片段中标记了 {report.flagged_count} 个")
+
+        for doc_id, (document, output_file) in enumerate(documents):
+            flagged = report.flagged.get(doc_id, [])
+            by_chunk = self._detects_by_chunk(document)
+            document.stats["anomaly_check"] = {
+                **report.to_dict(),
+                "flagged_chunks" if by_chunk else "flagged_blocks": flagged
+            }
+            if flagged:
+                print(f"重译 {document.input_file} 中的 {len(flagged)} 个异常片段: {flagged}")
+                refined = self._retranslate_blocks(*self._anomaly_segments(document), flagged)
+                if by_chunk:
+                    document.translated_chunks = [block.content for block in refined]
+                    translated_content = self.translator._merge_translated_chunks(
+                        document.translated_chunks, document.chunks, document.source_content
+                    )
+                    document.translated_blocks = self._blocks_from_translation(
+                        document.file_ext, document.blocks, translated_content, document.processor
+                    )
+                else:
+                    document.translated_blocks = refined
+                self._write_document(document, output_file)
+            stats_file = str(Path(output_file).with_suffix('.stats.json'))
+            self._save_translation_stats(document.stats, stats_file)
+
+    @staticmethod
+    def _detects_by_chunk(document: TranslatedDocument) -> bool:
+        """
+        是否按分块做异常检测：RST 整篇分块翻译的译文块由拼接后的译文重新解析得到，
+        块数与下标不一定与原文块一致，改为比较各分块的原文与译文
+        """
+        return document.file_ext in ['.rst'] and document.chunks is not None
+
+    def _anomaly_segments(self, document: TranslatedDocument) -> Tuple[List[DocumentBlock], List[DocumentBlock]]:
+        """异常检测与重译的 (原文片段, 译文片段)，两者一一对应"""
+        if not self._detects_by_chunk(document):
+            return document.blocks, document.translated_blocks
+        sources = [DocumentBlock(type=chunk.chunk_type, content=chunk.content, translatable=True)
+                   for chunk in document.chunks]
+        translations = [DocumentBlock(type=chunk.chunk_type, content=text, translatable=True)
+                        for chunk, text in zip(document.chunks, document.translated_chunks)]
+        return sources, translations
+
+    def _retranslate_blocks(self,
+                            original_blocks: List[DocumentBlock],
+                            translated_blocks: List[DocumentBlock],
+                            indices: List[int]) -> List[DocumentBlock]:
+        """并行重译指定下标的块，失败的块保留原译文"""
+        def retranslate(index: int) -> str:
+            try:
+                return self.translator.translate_chunk(
+                    TextChunk(original_blocks[index].content, 'paragraph')
+                )
+            except Exception as e:
+                print(f"重译块 {index} 失败: {e}")
+                return translated_blocks[index].content
+
+        workers = min(self.translator.max_workers, len(indices)) or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(retranslate, indices))
+
+        new_blocks = translated_blocks.copy()
+        for index, content in zip(indices, results):
+            block = new_blocks[index]
+            new_blocks[index] = DocumentBlock(
+                type=block.type,
+                content=content,
+                translatable=block.translatable,
+                metadata=block.metadata.copy() if block.metadata else {}
+            )
+        return new_blocks
     
+    def repair_file(self,
+                    source_file: str,
+                    translated_file: str,
+                    output_file: Optional[str] = None,
+                    min_cjk_ratio: float = 0.2) -> Dict:
+        """
+        修复中断后残留的部分译文：只重译仍为英文、带失败标记或缺失的片段，其余片段保持不动
+        
+        Args:
+            source_file: 原文文件
+            translated_file: 部分翻译的输出文件
+            output_file: 修复结果的输出路径（默认覆盖 translated_file）
+            min_cjk_ratio: 译文最低中文比例，低于该值视为仍未翻译
+            
+        Returns:
+            修复统计
+        """
+        return self._repair_documents(
+            [(source_file, translated_file, output_file or translated_file)], min_cjk_ratio
+        )[0]
+
+    def repair_directory(self,
+                         source_dir: str,
+                         translated_dir: str,
+                         min_cjk_ratio: float = 0.2) -> List[Dict]:
+        """
+        修复整个目录：按 batch_translate 的命名（name_translated.ext，或同名文件）配对原文与译文，
+        整批一次性检测后原地修复
+        """
+        source_path = Path(source_dir)
+        translated_path = Path(translated_dir)
+        pairs = []
+        for ext in ProcessorFactory.get_supported_extensions():
+            for file_path in sorted(source_path.glob(f"*{ext}")):
+                for candidate in (translated_path / f"{file_path.stem}_translated{file_path.suffix}",
+                                  translated_path / file_path.name):
+                    if candidate.exists() and candidate != file_path:
+                        pairs.append((str(file_path), str(candidate), str(candidate)))
+                        break
+                else:
+                    print(f"未找到 {file_path.name} 对应的译文，跳过")
+        if not pairs:
+            print(f"在 {translated_dir} 中没有找到与 {source_dir} 对应的译文")
+            return []
+        print(f"找到 {len(pairs)} 对原文/译文待检查")
+        return self._repair_documents(pairs, min_cjk_ratio)
+
+    def _repair_documents(self, pairs: List[Tuple[str, str, str]], min_cjk_ratio: float) -> List[Dict]:
+        """对齐并检测所有 (原文, 译文, 输出) 文件，然后逐文件并行重译待修复片段"""
+        scanner = PartialTranslationScanner(min_cjk_ratio=min_cjk_ratio, checker=self.translator.integrity_checker)
+        loaded = {}
+        results: List[Dict] = []
+        for doc_id, (source_file, translated_file, output_file) in enumerate(pairs):
+            try:
+                document, aligned = self._load_for_repair(source_file, translated_file)
+            except Exception as e:
+                print(f"读取 {translated_file} 时出错: {e}")
+                results.append({"input_file": source_file, "translated_file": translated_file, "error": str(e)})
+                continue
+            scanner.add_document(doc_id, document.blocks, aligned)
+            loaded[doc_id] = (document, aligned, translated_file, output_file)
+            results.append(None)
+        
+        report = scanner.detect()
+        print(f"修复检测: {report.segment_count} 个片段中需要重译 {report.target_count} 个")
+        
+        for doc_id, (document, aligned, translated_file, output_file) in loaded.items():
+            targets = report.targets.get(doc_id, {})
+            # 缺失的片段先用原文占位，随后重译
+            document.translated_blocks = [
+                DocumentBlock(
+                    type=block.type,
+                    content=text if text is not None else block.content,
+                    translatable=True,
+                    metadata=block.metadata.copy() if block.metadata else {}
+                ) if block.translatable else block
+                for block, text in zip(document.blocks, aligned)
+            ]
+            if targets:
+                print(f"重译 {translated_file} 中的 {len(targets)} 个片段: {list(targets)}")
+                document.translated_blocks = self._retranslate_blocks(
+                    document.blocks, document.translated_blocks, list(targets)
+                )
+            if targets or output_file != translated_file:
+                self._write_document(document, output_file)
+            still_failed = [i for i in targets if FAILURE_MARKER in document.translated_blocks[i].content]
+            document.stats = {
+                "input_file": document.input_file,
+                "translated_file": translated_file,
+                "output_file": output_file,
+                "segment_count": sum(1 for b in document.blocks if b.translatable and b.content.strip()),
+                "repaired_blocks": targets,
+                "still_failed": still_failed
+            }
+            results[doc_id] = document.stats
+        return [r for r in results if r is not None]
+
+    def _load_for_repair(self, source_file: str,
+                         translated_file: str) -> Tuple[TranslatedDocument, List[Optional[str]]]:
+        """解析原文与译文，并把译文块对齐到原文块"""
+        file_ext = Path(source_file).suffix
+        if not ProcessorFactory.is_supported(file_ext):
+            raise ValueError(f"不支持的文件格式: {file_ext}")
+        
+        with open(source_file, 'r', encoding='utf-8') as f:
+            source_content = f.read()
+        with open(translated_file, 'r', encoding='utf-8') as f:
+            translated_content = f.read()
+        
+        processor = ProcessorFactory.create(file_ext)
+        _, source_body = processor.extract_metadata(source_content)
+        if file_ext in ['.rst'] and self.rst_mode != "blocks":
+            # 分块模式写回的译文中，多行表格单元格已合成一行
+            source_body = self.rst_chunker.flatten_table_cells(source_body)
+        blocks = processor.parse(source_body)
+        
+        # 去掉写出时附加的署名与校验状态注释，再解析译文
+        signature = self._append_translation_signature('', file_ext)
+        if translated_content.rstrip('\n').endswith(signature):
+            translated_content = translated_content.rstrip('\n')[:-len(signature)]
+        translated_content = _re.sub(
+            r'^(?:\.\. verification: \w+|<!-- verification: \w+ -->)\n\n', '', translated_content
+        )
+        translated_processor = ProcessorFactory.create(file_ext)
+        metadata_dict, translated_body = translated_processor.extract_metadata(translated_content)
+        translated_blocks = translated_processor.parse(translated_body)
+        
+        document = TranslatedDocument(
+            input_file=source_file,
+            file_ext=file_ext,
+            processor=processor,
+            metadata=metadata_dict,
+            blocks=blocks,
+            translated_blocks=translated_blocks,
+            stats={}
+        )
+        return document, align_blocks(blocks, translated_blocks)
+
+    @staticmethod
+    def get_sampling_report(results: List[Dict], confidence_z: float = 1.96) -> Dict:
+        """
+        汇总 sampled 模式的抽样结果
+        
+        随机抽中的文件是“本地检查通过”文件的无偏样本，用其 LLM 校验通过率
+        （Wilson 区间）估计未做 LLM 校验文件的通过率。
+        
+        Args:
+            results: batch_translate 返回的结果列表
+            confidence_z: 置信区间对应的 z 值（默认 95%）
+            
+        Returns:
+            抽样报告字典
+        """
+        sampled = [r for r in results if 'error' not in r and 'sampling' in r and 'selected' in r['sampling']]
+        random_hits = [r for r in sampled if r['sampling']['reason'] == 'random']
+        passed = sum(
+            1 for r in random_hits
+            if (r.get('completeness_score') or 0) >= 8 and not r.get('refine_mode')
+        )
+        n = len(random_hits)
+        if n:
+            p = passed / n
+            denom = 1 + confidence_z ** 2 / n
+            center = (p + confidence_z ** 2 / (2 * n)) / denom
+            margin = confidence_z * ((p * (1 - p) / n + confidence_z ** 2 / (4 * n ** 2)) ** 0.5) / denom
+            interval = [round(max(0.0, center - margin), 4), round(min(1.0, center + margin), 4)]
+        else:
+            p = None
+            interval = None
+        return {
+            "files": len(sampled),
+            "llm_verified": sum(1 for r in sampled if r['sampling']['selected']),
+            "risk_verified": sum(1 for r in sampled if r['sampling']['reason'] == 'risk'),
+            "random_verified": n,
+            "random_pass_rate": p,
+            "pass_rate_interval": interval
+        }
+
     def get_translation_report(self, stats: Dict) -> str:
         """生成翻译报告"""
         lines = [
@@ -591,7 +1481,35 @@ class UniversalTranslator:
             f"  分块数: {stats.get('chunk_count', 'N/A')}",
             "",
             "质量评估:",
-            f"  完整性评分: {stats.get('completeness_score', 'N/A')}/10",
+            f"  完整性评分: {stats.get('completeness_score') if stats.get('completeness_score') is not None else 'N/A'}/10",
+        ]
+        cascade = stats.get('cascade')
+        if cascade:
+            lines.append(
+                f"  模型级联: {len(cascade['flagged'])} 个片段未通过检查，"
+                f"{len(cascade['escalated'])} 个升级到 {cascade['escalation_model']}"
+            )
+        for model, usage in (stats.get('token_usage') or {}).items():
+            lines.append(
+                f"  {model}: {usage['calls']} 次调用，输入 {usage['input_tokens']} / 输出 {usage['output_tokens']} tokens"
+            )
+        for model, calibration in (stats.get('tokenizer_calibration') or {}).items():
+            lines.append(
+                f"  分词校准 {model} ({calibration['tokenizer']}): {calibration['samples']} 次调用，"
+                f"API/本地输入 token 比 {calibration['prompt_ratio']}，平均相对误差 {calibration['mean_abs_error']:.1%}"
+            )
+        refine_control = stats.get('refine_control')
+        if refine_control and refine_control.get('rounds'):
+            lines.append(
+                f"  重译轮数: {len(refine_control['rounds'])}，预估花费 {refine_control['tokens_spent']} tokens，"
+                f"停止原因: {refine_control['stop_reason']}"
+            )
+        failed_units = stats.get('failed_units')
+        if failed_units:
+            lines.append(
+                f"  重试后仍失败的单元: {', '.join(str(u['index']) for u in failed_units)}"
+            )
+        lines += [
             "",
             "原文摘要:",
             f"  {stats.get('original_summary', 'N/A')}",
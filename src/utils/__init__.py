@@ -4,5 +4,6 @@
 
 from .config import ConfigManager, config_manager
 from .llm_factory import LLMFactory
+from .cache import ResultCache
 
-__all__ = ['ConfigManager', 'config_manager', 'LLMFactory']
\ No newline at end of file
+__all__ = ['ConfigManager', 'config_manager', 'LLMFactory', 'ResultCache']
\ No newline at end of file
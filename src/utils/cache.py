@@ -0,0 +1,112 @@
+"""
+结果缓存 - 按内容哈希缓存摘要与比较结果
+"""
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class ResultCache:
+    """
+    内容哈希缓存
+
+    键由 (类型, 模型, 各输入文本的哈希) 组成，同一次运行内保存在内存中；
+    指定 cache_dir 时同时落盘，供重复运行和 validate 复用。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 磁盘缓存目录（可选，为空时只使用内存缓存）
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._memory: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """计算文本的 SHA-256 哈希"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def make_key(self, kind: str, model: str, *texts: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            kind: 结果类型（如 original_summary、comparison）
+            model: 模型名称
+            texts: 参与计算的输入文本（原文、译文等）
+
+        Returns:
+            缓存键
+        """
+        text_hashes = ':'.join(self.hash_text(t) for t in texts)
+        return self.hash_text(f"{kind}|{model}|{text_hashes}")
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            if key in self._memory:
+                self.hits += 1
+                return self._memory[key]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._memory[key] = value
+        return value
+
+    def set(self, key: str, value: Any):
+        """写入缓存（内存 + 可选磁盘）"""
+        with self._lock:
+            self._memory[key] = value
+        self._write_disk(key, value)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取命中统计"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._memory)}
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取缓存失败 {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, value: Any):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再替换，避免并发写入产生半截文件
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入缓存失败 {path}: {e}")
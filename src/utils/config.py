@@ -74,6 +74,24 @@ class ConfigManager:
         
         return config
     
+    def get_tokenizer_config(self) -> Dict[str, Optional[str]]:
+        """
+        分词器配置：本地 BPE 缓存目录与（可选的）本地 Qwen tokenizer.json 路径
+        """
+        config = {
+            'cache_dir': None,
+            'qwen_tokenizer_file': None
+        }
+
+        if self.config.has_section('tokenizer'):
+            config['cache_dir'] = self.config.get('tokenizer', 'cache_dir', fallback=None) or None
+            config['qwen_tokenizer_file'] = self.config.get('tokenizer', 'qwen_tokenizer_file', fallback=None) or None
+
+        config['cache_dir'] = os.getenv('LT_TOKENIZER_DIR', config['cache_dir'])
+        config['qwen_tokenizer_file'] = os.getenv('QWEN_TOKENIZER_FILE', config['qwen_tokenizer_file'])
+        
+        return config
+    
     def get_default_config(self) -> Dict[str, str]:
         """
         获取默认配置
@@ -146,6 +164,12 @@ model_name = gpt-3.5-turbo
 provider = auto
 translator_id = FILL_YOUR_GITHUB_ID_HERE
 max_tokens = 800
+
+[tokenizer]
+# 分词器本地缓存目录（默认 ~/.cache/lt/tokenizers），离线环境可预先放入 cl100k_base.tiktoken 等文件
+# cache_dir = /path/to/tokenizers
+# 本地 Qwen 分词器文件（tokenizer.json，需要安装 tokenizers），未配置时 Qwen 按 cl100k_base 近似计数
+# qwen_tokenizer_file = /path/to/qwen/tokenizer.json
 """
         
         with open(config_path, 'w', encoding='utf-8') as f:
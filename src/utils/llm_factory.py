@@ -4,14 +4,53 @@ LLM工厂 - 支持多种模型提供商
 
 import os
 import json
-from typing import Optional, Any, List, Dict, Union
+from typing import Optional, Any, Callable, List, Dict, Union
 from langchain_openai import ChatOpenAI
 from langchain.llms.base import LLM
+from langchain.callbacks.base import BaseCallbackHandler
 from pydantic import Field
 
 from .config import config_manager
 
 
+# 用量记录函数：(提示词, 输出, API 报告的输入 token 数, API 报告的输出 token 数)
+UsageRecorder = Callable[[str, str, int, int], None]
+
+
+def _report_usage(recorder: Optional[UsageRecorder], prompt_text: str, output_text: str,
+                  prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    """把 API 报告的用量交给记录函数；记录出错不影响翻译"""
+    if recorder is None or not prompt_tokens:
+        return
+    try:
+        recorder(prompt_text, output_text or "", prompt_tokens, completion_tokens or 0)
+    except Exception as e:
+        print(f"记录 token 用量失败: {e}")
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """从 LangChain 回调中取出提示词与 API 报告的 token 用量（ChatOpenAI）"""
+    
+    def __init__(self, recorder: UsageRecorder):
+        self.recorder = recorder
+        self._prompts: Dict[Any, str] = {}
+    
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._prompts[run_id] = '\n'.join(
+            str(message.content) for batch in messages for message in batch
+        )
+    
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_text = self._prompts.pop(run_id, '')
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        output_text = response.generations[0][0].text if response.generations and response.generations[0] else ''
+        _report_usage(self.recorder, prompt_text, output_text,
+                      usage.get('prompt_tokens'), usage.get('completion_tokens'))
+    
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._prompts.pop(run_id, None)
+
+
 class QwenChatModel(LLM):
     """
     Qwen模型的LangChain兼容包装器 - 使用OpenAI SDK
@@ -20,6 +59,7 @@ class QwenChatModel(LLM):
     model: str = Field(default="qwen-plus", description="模型名称")
     temperature: float = Field(default=0.1, description="生成的随机性")
     client: Any = Field(default=None, description="OpenAI客户端")
+    usage_recorder: Any = Field(default=None, description="API 用量记录函数（可选）")
     
     class Config:
         """Pydantic配置"""
@@ -112,11 +152,19 @@ class QwenChatModel(LLM):
                 **kwargs
             )
             
-            return completion.choices[0].message.content
+            response_text = completion.choices[0].message.content
+            self._record_usage(prompt, response_text, completion)
+            return response_text
                 
         except Exception as e:
             raise Exception(f"Qwen模型调用出错: {str(e)}")
     
+    def _record_usage(self, prompt_text: str, response_text: str, completion: Any):
+        usage = getattr(completion, 'usage', None)
+        if usage is not None:
+            _report_usage(self.usage_recorder, prompt_text, response_text,
+                          getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None))
+    
     def invoke(self, input, config=None, **kwargs):
         try:
             formatted_messages = self._safe_format_messages(input)
@@ -130,6 +178,9 @@ class QwenChatModel(LLM):
             )
             
             response_text = completion.choices[0].message.content
+            self._record_usage(
+                '\n'.join(str(m.get('content', '')) for m in formatted_messages), response_text, completion
+            )
             return response_text
                 
         except Exception as e:
@@ -184,7 +235,13 @@ class LLMFactory:
                    temperature: float = 0.1,
                    openai_api_key: Optional[str] = None,
                    qwen_api_key: Optional[str] = None,
+                   usage_recorder: Optional[UsageRecorder] = None,
                    **kwargs):
+        """
+        创建 LLM 实例
+        
+        usage_recorder 不为空时，每次调用后把提示词、输出与 API 报告的 token 用量交给它（用于分词器校准）
+        """
 
         if provider == "auto":
             supported_models = LLMFactory.get_supported_models()
@@ -197,12 +254,14 @@ class LLMFactory:
                 raise ValueError(f"无法自动识别模型 {model_name} 的提供商")
 
         if provider == "openai":
+            if usage_recorder is not None:
+                kwargs['callbacks'] = [UsageCallbackHandler(usage_recorder)]
             return LLMFactory._create_openai_llm(
                 model_name, temperature, openai_api_key, **kwargs
             )
         elif provider == "qwen":
             return LLMFactory._create_qwen_llm(
-                model_name, temperature, qwen_api_key, **kwargs
+                model_name, temperature, qwen_api_key, usage_recorder=usage_recorder, **kwargs
             )
         else:
             raise ValueError(f"不支持的提供商: {provider}")
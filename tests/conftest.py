@@ -0,0 +1,101 @@
+"""
+测试公共设置
+
+- 编码器：由 tests/ 下的样例文本训练的小型 BPE（与 cl100k_base 相同的预切分规则），
+  不需要下载 tiktoken 编码文件，离线可运行
+- LLM：用可替换回复函数的假模型代替真实调用
+"""
+
+import collections
+from pathlib import Path
+from typing import Callable, List
+
+import pytest
+import regex
+import tiktoken
+
+from src.core import tokenizer
+from src.utils.llm_factory import LLMFactory
+
+
+FIXTURES = Path(__file__).parent
+# cl100k_base 的预切分正则
+CL100K_PATTERN = (
+    r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}"""
+    r"""| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding='utf-8')
+
+
+def train_encoding(text: str, merges: int = 300, pattern: str = CL100K_PATTERN) -> tiktoken.Encoding:
+    """在 text 上训练 merges 次合并的字节级 BPE"""
+    ranks = {bytes([i]): i for i in range(256)}
+    words = collections.Counter(regex.findall(pattern, text))
+    pieces = {word: [bytes([b]) for b in word.encode('utf-8')] for word in words}
+    for _ in range(merges):
+        pairs = collections.Counter()
+        for word, count in words.items():
+            parts = pieces[word]
+            for pair in zip(parts, parts[1:]):
+                pairs[pair] += count
+        if not pairs:
+            break
+        (left, right), _ = pairs.most_common(1)[0]
+        merged = left + right
+        ranks.setdefault(merged, len(ranks))
+        for word, parts in pieces.items():
+            out = []
+            i = 0
+            while i < len(parts):
+                if i + 1 < len(parts) and parts[i] == left and parts[i + 1] == right:
+                    out.append(merged)
+                    i += 2
+                else:
+                    out.append(parts[i])
+                    i += 1
+            pieces[word] = out
+    return tiktoken.Encoding("test_bpe", pat_str=pattern, mergeable_ranks=ranks, special_tokens={})
+
+
+@pytest.fixture(scope="session")
+def encoding() -> tiktoken.Encoding:
+    return train_encoding(read_fixture('ldm.md') + read_fixture('w1-generic.rst'))
+
+
+@pytest.fixture(autouse=True)
+def offline_tokenizer(monkeypatch, encoding):
+    """所有模型都使用训练出的编码器；每个测试使用独立的编码器/估计器缓存"""
+    monkeypatch.setattr(tokenizer, "_load_tiktoken", lambda name: encoding)
+    monkeypatch.setattr(tokenizer, "_tokenizers", {})
+    monkeypatch.setattr(tokenizer, "_model_tokenizers", {})
+    monkeypatch.setattr(tokenizer, "_estimators", {})
+
+
+class FakeLLM:
+    """记录每次调用的提示词，按 respond(提示词文本) 生成回复"""
+
+    def __init__(self):
+        self.prompts: List[str] = []
+        self.respond: Callable[[str], str] = lambda prompt: "译文"
+
+    def __call__(self, prompt) -> str:
+        text = prompt.to_string() if hasattr(prompt, 'to_string') else str(prompt)
+        self.prompts.append(text)
+        return self.respond(text)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch) -> FakeLLM:
+    from langchain_core.runnables import RunnableLambda
+
+    llm = FakeLLM()
+    monkeypatch.setattr(LLMFactory, "create_llm", staticmethod(lambda *args, **kwargs: RunnableLambda(llm)))
+    return llm
+
+
+def mark_translated(text: str) -> str:
+    """假译文：每个非空行前加一个中文字符，行结构与空行保持不变"""
+    return '\n'.join('中' + line if line.strip() else line for line in text.split('\n'))
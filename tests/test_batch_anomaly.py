@@ -0,0 +1,94 @@
+"""
+批量异常检测：长度比统计与未翻译判断；RST 整篇分块翻译按分块检测与重译（译文块由译文重新解析，与原文块不一一对应）
+"""
+
+import json
+import string
+
+import numpy as np
+import pytest
+
+from conftest import read_fixture
+from src.core.batch_anomaly import LengthRatioDetector
+from src.core.document_processor import DocumentBlock
+from src.core.rst_chunker import RSTChunker
+from src.core.translator import SmartTranslator
+from src.core.universal_translator import UniversalTranslator
+
+
+# 假译文：字母逐个换成中文字符，行结构、标点与标识符位置保持不变
+TO_CJK = str.maketrans(string.ascii_letters, '文' * len(string.ascii_letters))
+SKIPPED = "Most hardware provides higher-level functions"
+WRAPPED = "signal wire (plus ground, so two wires)."
+
+
+def test_identifiers_are_not_flagged_as_untranslated():
+    sources = [
+        "Each slave device found on the bus is listed here.",
+        "w1_smem",
+        "W1_SLAVE_FAMILY w1_therm",
+        "Most hardware provides higher-level functions to the driver.",
+    ] * 3
+    translations = [
+        "总线上发现的每个从设备都列在这里。",
+        "w1_smem",
+        "W1_SLAVE_FAMILY w1_therm",
+        "Most hardware provides higher-level functions to the driver.",
+    ] * 3
+    detector = LengthRatioDetector(min_source_tokens=1, min_group_size=1)
+    detector.add_document("doc", [DocumentBlock('paragraph', text) for text in sources],
+                          [DocumentBlock('paragraph', text) for text in translations])
+    report = detector.detect()
+
+    assert report.flagged == {"doc": [3, 7, 11]}
+    tokens = np.array([len(text.split()) for text in sources], dtype=float)
+    chars = np.array([len(text) for text in translations], dtype=float)
+    assert report.group_stats["paragraph"]["median_ratio"] == pytest.approx(float(np.median(chars / tokens)))
+
+
+def test_rst_anomaly_retranslation_targets_flagged_chunk(tmp_path, monkeypatch, fake_llm):
+    """
+    首轮翻译中一个请求原样返回了英文，另一个请求把一段拆成两段（译文块比原文块多一个）；
+    只重译漏译的请求，其余段落不丢失、不重复
+    """
+    first_pass = [True]
+
+    def translate_once(self, chunk, escalate=False):
+        if first_pass[0] and SKIPPED in chunk.content:
+            return chunk.content
+        translation = chunk.content.translate(TO_CJK)
+        if first_pass[0]:
+            wrapped = WRAPPED.translate(TO_CJK)
+            translation = translation.replace('\n' + wrapped, '\n\n' + wrapped)
+        return translation
+
+    monkeypatch.setattr(SmartTranslator, "_translate_once", translate_once)
+    source_dir = tmp_path / "docs"
+    source_dir.mkdir()
+    (source_dir / "w1-generic.rst").write_text(read_fixture('w1-generic.rst'), encoding='utf-8')
+    translator = UniversalTranslator(model_name="qwen-plus", verify_mode="off")
+
+    original_refine = translator._refine_batch_anomalies
+
+    def refine(documents):
+        first_pass[0] = False
+        document = documents[0][0]
+        assert len(document.translated_blocks) != len(document.blocks)
+        original_refine(documents)
+
+    translator._refine_batch_anomalies = refine
+    translator.batch_translate(str(source_dir), str(tmp_path / "out"), anomaly_detection=True)
+    refined = (tmp_path / "out" / "w1-generic_translated.rst").read_text(encoding='utf-8')
+
+    translator.batch_translate(str(source_dir), str(tmp_path / "clean"))
+    clean = (tmp_path / "clean" / "w1-generic_translated.rst").read_text(encoding='utf-8')
+
+    chunks = RSTChunker(max_tokens=translator.rst_chunker.max_tokens).chunk_text(read_fixture('w1-generic.rst'))
+    stats = json.loads((tmp_path / "out" / "w1-generic_translated.stats.json").read_text(encoding='utf-8'))
+    skipped = next(i for i, chunk in enumerate(chunks) if SKIPPED in chunk.content)
+    assert skipped in stats["anomaly_check"]["flagged_chunks"]
+    assert SKIPPED not in refined
+    assert refined.count(SKIPPED.translate(TO_CJK)) == 1
+    # 除首轮拆开的那一段外，与一次译对的结果完全相同
+    wrapped = WRAPPED.translate(TO_CJK)
+    assert refined == clean.replace('\n' + wrapped, '\n\n' + wrapped, 1)
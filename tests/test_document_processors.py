@@ -0,0 +1,38 @@
+"""
+文档解析：RST 与 Markdown 的解析结果与 tests/golden 中记录的块完全一致
+
+golden 文件由改用预编译正则与首字符分派之前的解析器生成，词法分析的改动不应改变任何块。
+"""
+
+import dataclasses
+import io
+import json
+
+import pytest
+
+from conftest import FIXTURES, read_fixture
+from src.core.line_stream import iter_lines
+from src.core.markdown_document_processor import MarkdownDocumentProcessor
+from src.core.rst_processor import RSTProcessor
+
+
+def golden_blocks(name):
+    with open(FIXTURES / 'golden' / f'{name}.json', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("processor_class, fixture", [
+    (MarkdownDocumentProcessor, 'ldm.md'),
+    (RSTProcessor, 'w1-generic.rst'),
+])
+def test_blocks_match_golden(processor_class, fixture):
+    processor = processor_class()
+    _, body = processor.extract_metadata(read_fixture(fixture))
+    assert [dataclasses.asdict(block) for block in processor.parse(body)] == golden_blocks(fixture)
+
+
+def test_rst_streaming_parse_matches_golden():
+    processor = RSTProcessor()
+    _, body = processor.extract_metadata(read_fixture('w1-generic.rst'))
+    blocks = processor.iter_parse(iter_lines(io.StringIO(body)))
+    assert [dataclasses.asdict(block) for block in blocks] == golden_blocks('w1-generic.rst')
@@ -0,0 +1,111 @@
+"""
+本地结构完整性检查：每种结构不变量、中文比例与干净译文
+"""
+
+import pytest
+
+from src.core.document_processor import DocumentBlock
+from src.core.integrity_checker import FAILURE_MARKER, StructuralIntegrityChecker
+
+
+# (原文, 正确译文, 破坏了该不变量的译文, 报告原因)
+CASES = {
+    "heading": (
+        "# Overview of the bus driver",
+        "# 总线驱动概述",
+        "总线驱动概述",
+        "标题数量不一致",
+    ),
+    "list": (
+        "- first item in the list\n- second item in the list",
+        "- 列表第一项\n- 列表第二项",
+        "- 列表第一项\n列表第二项",
+        "列表项数量不一致",
+    ),
+    "fence": (
+        "Run this example in the shell:\n```\nmake\n```",
+        "在终端中运行这个示例：\n```\nmake\n```",
+        "在终端中运行这个示例：\n```\nmake",
+        "代码围栏数量不一致",
+    ),
+    "inline literal": (
+        "Set the ``debug`` option to enable logs.",
+        "将 ``debug`` 选项设为启用日志。",
+        "将调试选项设为启用日志。",
+        "缺少行内代码",
+    ),
+    "link": (
+        "See https://www.kernel.org/doc for the details.",
+        "详情参见 https://www.kernel.org/doc 。",
+        "详情参见内核文档。",
+        "缺少链接",
+    ),
+    "number": (
+        "The bus supports 16 devices at most.",
+        "总线最多支持 16 个设备。",
+        "总线最多支持若干设备。",
+        "缺少数字",
+    ),
+    "rst role": (
+        "Read :doc:`w1-generic` before writing drivers.",
+        "编写驱动前请阅读 :doc:`w1-generic`。",
+        "编写驱动前请阅读 w1-generic。",
+        "RST 角色数量不一致",
+    ),
+    "directive": (
+        ".. note::\n\n   Keep the bus idle while probing.",
+        ".. note::\n\n   探测时保持总线空闲。",
+        "注意：\n\n   探测时保持总线空闲。",
+        "指令数量不一致",
+    ),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_each_invariant_is_checked(name):
+    source, good, bad, reason = CASES[name]
+    checker = StructuralIntegrityChecker()
+
+    assert checker.check_segments([source], [good]).clean
+
+    report = checker.check_segments([source], [bad])
+    assert report.flagged_indices == [0]
+    assert any(r.startswith(reason) for r in report.issues[0].reasons)
+
+
+def test_untranslated_segment_fails_cjk_ratio():
+    checker = StructuralIntegrityChecker()
+    source = "Each slave device found on the bus is listed here."
+    report = checker.check_segments([source, "w1_smem"], [source, "w1_smem"])
+
+    assert report.flagged_indices == [0]
+    assert report.issues[0].reasons[0].startswith("疑似未翻译")
+    assert report.cjk_coverage == 0.0
+    # 代码片段不检查中文比例
+    assert checker.check_segments([source], [source], segment_types=['code']).clean
+
+
+def test_clean_translation_and_failures():
+    checker = StructuralIntegrityChecker()
+    sources = [source for source, _, _, _ in CASES.values()]
+    translations = [good for _, good, _, _ in CASES.values()]
+    report = checker.check_segments(sources, translations)
+    assert report.clean
+    assert report.describe() == "无"
+    assert report.cjk_coverage == 1.0
+
+    translations[2] = f"{FAILURE_MARKER} {sources[2]}"
+    report = checker.check_segments(sources, translations[:-1])
+    assert report.flagged_indices == [2, len(sources) - 1]
+    assert report.issues[-1].reasons == ["缺少译文"]
+
+
+def test_blocks_keep_untranslatable_content():
+    checker = StructuralIntegrityChecker()
+    original = [DocumentBlock('paragraph', "The bus supports 16 devices at most."),
+                DocumentBlock('code', "make all", translatable=False)]
+    translated = [DocumentBlock('paragraph', "总线最多支持 16 个设备。"),
+                  DocumentBlock('code', "make", translatable=False)]
+    report = checker.check_blocks(original, translated)
+    assert report.flagged_indices == [1]
+    assert checker.check_blocks(original, [translated[0], original[1]]).clean
@@ -0,0 +1,75 @@
+"""
+部分译文修复：只重译仍为英文或带失败标记的块，其余内容逐字节保留
+"""
+
+import string
+from collections import Counter
+
+import pytest
+
+from conftest import read_fixture
+from src.core.integrity_checker import FAILURE_MARKER
+from src.core.translator import SmartTranslator
+from src.core.universal_translator import UniversalTranslator
+
+
+# 首轮与修复时的假译文：字母换成不同的中文字符，便于区分哪些块被重译
+FIRST_PASS = str.maketrans(string.ascii_letters, '文' * len(string.ascii_letters))
+REPAIR = str.maketrans(string.ascii_letters, '译' * len(string.ascii_letters))
+
+ENGLISH = "Any partitions created under the LDM are called"
+FAILED = "If you wish to use Spanned, Striped, Mirrored or RAID 5 Volumes"
+
+
+def paragraph(text: str, start: str) -> str:
+    begin = text.index(start)
+    return text[begin:text.index('\n\n', begin)]
+
+
+@pytest.mark.parametrize("in_place", [True, False])
+def test_repair_retranslates_only_untranslated_blocks(tmp_path, monkeypatch, fake_llm, in_place):
+    table = [FIRST_PASS]
+    monkeypatch.setattr(SmartTranslator, "_translate_once",
+                        lambda self, chunk, escalate=False: chunk.content.translate(table[0]))
+    source = tmp_path / "ldm.md"
+    source.write_text(read_fixture('ldm.md'), encoding='utf-8')
+    translator = UniversalTranslator(model_name="qwen-plus", verify_mode="off")
+    translated = tmp_path / "ldm_translated.md"
+    translator.translate_file(str(source), output_file=str(translated), save_stats=False)
+    complete = translated.read_text(encoding='utf-8')
+
+    # 中断后残留的译文：一段仍是英文，一段带失败标记
+    text = read_fixture('ldm.md')
+    english, failed = paragraph(text, ENGLISH), paragraph(text, FAILED)
+    partial = complete.replace(english.translate(FIRST_PASS), english) \
+        .replace(failed.translate(FIRST_PASS), f"{FAILURE_MARKER} {failed}")
+    assert partial.count(english) == 1 and partial.count(FAILURE_MARKER) == 1
+    translated.write_text(partial, encoding='utf-8')
+
+    table[0] = REPAIR
+    output = translated if in_place else tmp_path / "repaired.md"
+    stats = translator.repair_file(str(source), str(translated), None if in_place else str(output))
+
+    # Markdown 段落逐行成块：两段各三行，失败标记只在第一行
+    assert Counter(stats["repaired_blocks"].values()) == {"untranslated": 5, "failure_marker": 1}
+    assert stats["still_failed"] == []
+    expected = complete.replace(english.translate(FIRST_PASS), english.translate(REPAIR)) \
+        .replace(failed.translate(FIRST_PASS), failed.translate(REPAIR))
+    assert output.read_text(encoding='utf-8') == expected
+    if not in_place:
+        assert translated.read_text(encoding='utf-8') == partial
+
+
+def test_complete_translation_is_left_untouched(tmp_path, monkeypatch, fake_llm):
+    monkeypatch.setattr(SmartTranslator, "_translate_once",
+                        lambda self, chunk, escalate=False: chunk.content.translate(FIRST_PASS))
+    source = tmp_path / "w1-generic.rst"
+    source.write_text(read_fixture('w1-generic.rst'), encoding='utf-8')
+    translator = UniversalTranslator(model_name="qwen-plus", verify_mode="off")
+    translated = tmp_path / "w1-generic_translated.rst"
+    translator.translate_file(str(source), output_file=str(translated), save_stats=False)
+    complete = translated.read_bytes()
+
+    stats = translator.repair_file(str(source), str(translated))
+    assert stats["repaired_blocks"] == {}
+    assert translated.read_bytes() == complete
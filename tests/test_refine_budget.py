@@ -0,0 +1,66 @@
+"""
+重译预算控制：各停止原因
+"""
+
+from src.core.refine_budget import RefineBudget
+
+
+def test_stops_when_refine_is_not_needed_or_passed():
+    tracker = RefineBudget().begin_file()
+    assert not tracker.should_refine(9, False, 8, 100)
+    assert tracker.to_dict()["stop_reason"] == "not_needed"
+
+    tracker = RefineBudget().begin_file()
+    assert tracker.should_refine(5, True, 8, 100)
+    tracker.record("targeted", 100, 5, 9)
+    assert not tracker.should_refine(9, False, 8, 100)
+    assert tracker.stop_reason == "passed"
+
+
+def test_stops_at_file_and_batch_budget():
+    budget = RefineBudget(file_token_budget=1000, batch_token_budget=1500)
+    tracker = budget.begin_file()
+    assert not tracker.should_refine(5, True, 8, 1001)
+    assert tracker.stop_reason == "file_budget"
+
+    assert tracker.should_refine(5, True, 8, 900)
+    tracker.record("targeted", 900, 5, 7)
+    assert not tracker.should_refine(7, True, 8, 200)
+    assert tracker.stop_reason == "file_budget"
+
+    # 整批预算跨文件累计
+    other = budget.begin_file()
+    assert not other.should_refine(5, True, 8, 700)
+    assert other.to_dict()["stop_reason"] == "batch_budget"
+    assert budget.get_stats()["batch_tokens_spent"] == 900
+
+
+def test_stops_on_plateau():
+    tracker = RefineBudget().begin_file()
+    tracker.record("targeted", 100, 5, 5)
+    assert not tracker.should_refine(5, True, 8, 100)
+    assert tracker.stop_reason == "plateau"
+
+
+def test_stops_at_max_rounds():
+    tracker = RefineBudget(max_rounds=2, file_token_budget=None).begin_file()
+    for score in (4, 5):
+        assert tracker.should_refine(score, True, 8, 100)
+        tracker.record("targeted", 100, score, score + 1)
+    assert not tracker.should_refine(6, True, 8, 100)
+    assert tracker.to_dict() == {
+        "rounds": tracker.rounds,
+        "tokens_spent": 200,
+        "stop_reason": "max_rounds"
+    }
+
+
+def test_low_expected_gain_from_history(tmp_path):
+    history = tmp_path / "refine_history.json"
+    budget = RefineBudget(min_history=3, history_file=str(history))
+    for _ in range(3):
+        budget.record("targeted", 10, 0)
+
+    tracker = RefineBudget(min_history=3, history_file=str(history)).begin_file()
+    assert not tracker.should_refine(5, True, 8, 100)
+    assert tracker.stop_reason == "low_expected_gain"
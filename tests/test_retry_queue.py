@@ -0,0 +1,49 @@
+"""
+延迟重试队列：退避轮数、重试成功与最终失败的单元
+"""
+
+from src.core import retry_queue
+from src.core.retry_queue import RetryQueue
+from src.core.text_chunker import TextChunk
+
+
+def test_drain_backs_off_and_reports_failures(monkeypatch):
+    delays = []
+    monkeypatch.setattr(retry_queue.time, "sleep", delays.append)
+    calls = {}
+
+    def translate(chunk):
+        calls[chunk.content] = calls.get(chunk.content, 0) + 1
+        if chunk.content == "bad" or (chunk.content == "flaky" and calls["flaky"] < 2):
+            raise RuntimeError(f"rate limited: {chunk.content}")
+        return f"译文{chunk.content}"
+
+    queue = RetryQueue(max_attempts=3, base_delay=2.0, max_delay=30.0)
+    for key in ("flaky", "bad", "slow"):
+        queue.add(key, TextChunk(key, 'paragraph'), RuntimeError("first attempt"))
+
+    recovered, failed = queue.drain(translate)
+
+    assert recovered == {"flaky": "译文flaky", "slow": "译文slow"}
+    assert failed == [{"index": "bad", "attempts": 3, "error": "rate limited: bad"}]
+    # 首次失败后最多再试 2 轮，等待时间指数增长（带 0.5-1 倍抖动）
+    assert len(delays) == 2
+    assert 1.0 <= delays[0] <= 2.0 and 2.0 <= delays[1] <= 4.0
+    assert calls == {"flaky": 2, "bad": 2, "slow": 1}
+    assert len(queue) == 0
+
+
+def test_drain_caps_delay_and_respects_single_attempt(monkeypatch):
+    delays = []
+    monkeypatch.setattr(retry_queue.time, "sleep", delays.append)
+
+    queue = RetryQueue(max_attempts=1)
+    queue.add(0, TextChunk("text", 'paragraph'), RuntimeError("timeout"))
+    assert queue.drain(lambda chunk: "译文") == ({}, [{"index": 0, "attempts": 1, "error": "timeout"}])
+    assert delays == []
+
+    queue = RetryQueue(max_attempts=6, base_delay=10.0, max_delay=15.0)
+    queue.add(0, TextChunk("text", 'paragraph'), RuntimeError("timeout"))
+    queue.drain(lambda chunk: (_ for _ in ()).throw(RuntimeError("timeout")))
+    assert len(delays) == 5
+    assert max(delays) <= 15.0
@@ -0,0 +1,54 @@
+"""
+RST 分块：表格单元格的翻译与写回
+"""
+
+from conftest import read_fixture
+from src.core.rst_chunker import RSTChunker
+
+
+def test_simple_table_cells_are_translated_on_one_line():
+    text = read_fixture('w1-generic.rst')
+    chunker = RSTChunker(max_tokens=200)
+    chunks = chunker.chunk_text(text)
+    cells = [chunk for chunk in chunks if chunk.chunk_type == 'table_cell']
+
+    assert [cell.content.split('\n')[0] for cell in cells[:2]] == [
+        "A directory for a found device. The format is",
+        "(standard) symlink to the w1 bus",
+    ]
+    # 以制表符对齐的行按 8 列展开后切分
+    assert cells[-1].content.startswith("(optional) created for slave devices")
+    assert all(chunk.chunk_type != 'table_cell' for chunk in chunks if '\n\n' in chunk.content)
+
+    translations = ['中文\n译文' if chunk.chunk_type == 'table_cell' else None for chunk in chunks]
+    output = chunker.splice(text, chunks, translations).split('\n')
+    assert "<xx-xxxxxxxxxxxx>         中文 译文" in output
+    assert "rw\t\t    中文 译文" in output
+    # 多行单元格合成一行，第一列与边框保持不变
+    assert len(output) == len(text.split('\n')) - 4
+    assert output.count("=" * 25 + " " + "=" * 53) == 2
+
+
+def test_grid_table_is_relaid_to_translated_width():
+    table = (
+        "+------+-------------+\n"
+        "| Name | Description |\n"
+        "+======+=============+\n"
+        "| bus  | the bus     |\n"
+        "|      | link        |\n"
+        "+------+-------------+"
+    )
+    assert RSTChunker.fit_grid_tables(table) == table
+
+    translated = table.replace("the bus", "指向总线的符号链接").replace("Description", "说明")
+    assert RSTChunker.fit_grid_tables(translated) == (
+        "+------+--------------------+\n"
+        "| Name | 说明               |\n"
+        "+======+====================+\n"
+        "| bus  | 指向总线的符号链接 |\n"
+        "|      | link               |\n"
+        "+------+--------------------+"
+    )
+
+    spanned = table.replace("| bus  | the bus     |", "| bus spans the row  |")
+    assert RSTChunker.fit_grid_tables(spanned) == spanned
@@ -0,0 +1,35 @@
+"""
+片段倒排索引：用英文词、标识符与中文术语定位原文片段
+"""
+
+from src.core.segment_index import SegmentIndex, tokenize
+
+
+SEGMENTS = [
+    "The w1 bus master driver registers a new bus with the kernel.",
+    "Each slave device has a family code and a unique serial number.",
+    "Use W1_SKIP_ROM to address all devices on the bus at once.",
+    "Temperature sensors report their readings in millidegrees.",
+]
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("W1_SKIP_ROM getDeviceId drivers") == [
+        "w1_skip_rom", "w1", "skip", "rom", "getdeviceid", "get", "device", "id", "driver"
+    ]
+
+
+def test_english_query_finds_segment():
+    index = SegmentIndex(SEGMENTS)
+    assert index.search("family code")[0][0] == 1
+    assert index.search("缺少 W1_SKIP_ROM 的用法说明")[0][0] == 2
+    assert index.search("完全无关的内容") == []
+
+
+def test_glossary_maps_chinese_terms():
+    index = SegmentIndex(SEGMENTS)
+    assert index.search("遗漏了温度传感器的读数单位")[0][0] == 3
+    assert index.search("缺少从设备的说明")[0][0] == 1
+
+    custom = SegmentIndex(SEGMENTS, glossary={"千分之一度": ["millidegrees"]})
+    assert custom.search("缺少千分之一度", top_k=1)[0][0] == 3
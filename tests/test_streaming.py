@@ -0,0 +1,60 @@
+"""
+流式翻译与整篇翻译：对同一输入发出相同的请求
+"""
+
+import io
+import threading
+
+import pytest
+
+from conftest import mark_translated, read_fixture
+from src.core.line_stream import SourceBuffer, iter_lines
+from src.core.rst_chunker import RSTChunker
+from src.core.text_chunker import MarkdownChunker
+from src.core.translator import SmartTranslator
+from src.core.universal_translator import UniversalTranslator
+
+
+def stream_chunks(chunker, text):
+    source = SourceBuffer(iter_lines(io.StringIO(text)))
+    return list(chunker.iter_chunks(source, source=source.slice))
+
+
+@pytest.mark.parametrize("chunker_class, fixture", [
+    (MarkdownChunker, 'ldm.md'),
+    (RSTChunker, 'w1-generic.rst'),
+])
+@pytest.mark.parametrize("max_tokens", [60, 200, 800])
+def test_stream_chunks_match_whole_file(chunker_class, fixture, max_tokens):
+    text = read_fixture(fixture)
+    chunker = chunker_class(max_tokens=max_tokens)
+    whole = chunker.chunk_text(text)
+    streamed = stream_chunks(chunker, text)
+    assert [(c.content, c.start_pos, c.end_pos) for c in streamed] == \
+        [(c.content, c.start_pos, c.end_pos) for c in whole]
+    for chunk in whole:
+        assert chunk.content == text[chunk.start_pos:chunk.end_pos]
+
+
+def test_rst_requests_and_output_match(tmp_path, monkeypatch, fake_llm):
+    requests = []
+    lock = threading.Lock()
+
+    def translate_once(self, chunk, escalate=False):
+        with lock:
+            requests.append(chunk.content)
+        return mark_translated(chunk.content)
+
+    monkeypatch.setattr(SmartTranslator, "_translate_once", translate_once)
+    translator = UniversalTranslator(model_name="qwen-plus", verify_mode="off")
+    source = tmp_path / "w1-generic.rst"
+    source.write_text(read_fixture('w1-generic.rst'), encoding='utf-8')
+
+    translator.translate_file(str(source), output_file=str(tmp_path / "whole.rst"), save_stats=False)
+    whole_requests, requests[:] = list(requests), []
+    translator.translate_file_streaming(str(source), output_file=str(tmp_path / "stream.rst"), save_stats=False)
+
+    assert whole_requests
+    assert sorted(requests) == sorted(whole_requests)
+    assert (tmp_path / "stream.rst").read_text(encoding='utf-8') == \
+        (tmp_path / "whole.rst").read_text(encoding='utf-8')
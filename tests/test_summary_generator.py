@@ -0,0 +1,133 @@
+"""
+摘要生成器：摘要与比较结果的缓存，map-reduce 归并的 token 预算，结构化校验输出的解析
+"""
+
+import re
+
+import pytest
+
+from src.core.summary_generator import SummaryGenerator
+from src.utils.cache import ResultCache
+
+
+def test_unparsed_comparison_is_not_cached(fake_llm):
+    generator = SummaryGenerator(model_name="qwen-plus")
+    fake_llm.respond = lambda prompt: "无法比较"
+    assert generator.compare_summaries("原文摘要", "译文摘要")["completeness_score"] == 0
+
+    fake_llm.respond = lambda prompt: "- 完整性评分：8/10\n- 遗漏内容：无\n- 建议：无"
+    assert generator.compare_summaries("原文摘要", "译文摘要")["completeness_score"] == 8
+    fake_llm.respond = lambda prompt: "- 完整性评分：3/10\n- 遗漏内容：无\n- 建议：无"
+    assert generator.compare_summaries("原文摘要", "译文摘要")["completeness_score"] == 8
+    assert len(fake_llm.prompts) == 2
+
+
+def test_summary_cache_key_includes_map_reduce_parameters(fake_llm):
+    cache = ResultCache()
+    content = "A paragraph about the w1 bus. " * 20
+    fake_llm.respond = lambda prompt: "摘要"
+
+    def summarize(**kwargs):
+        generator = SummaryGenerator(model_name="qwen-plus", cache=cache, **kwargs)
+        return generator.generate_original_summary(content)
+
+    summarize()
+    summarize()
+    assert len(fake_llm.prompts) == 1
+    summarize(map_reduce_threshold=10, map_chunk_tokens=40)
+    assert len(fake_llm.prompts) > 1
+    calls = len(fake_llm.prompts)
+    summarize(map_reduce_threshold=10, map_chunk_tokens=40, reduce_budget=5)
+    assert len(fake_llm.prompts) > calls
+
+
+@pytest.mark.parametrize("condensed", ["压缩后的摘要。", None])
+def test_reduce_requests_stay_within_budget(fake_llm, condensed):
+    """分块摘要超出 reduce 预算时先压缩（压缩无效时截断）再分组，每次归并请求都不超预算"""
+    generator = SummaryGenerator(model_name="qwen-plus", map_reduce_threshold=10,
+                                 map_chunk_tokens=60, reduce_budget=80)
+    reduce_parts = []
+
+    def respond(prompt):
+        if "分部分摘要" in prompt:
+            parts = re.split(r'第\d+部分：\n', prompt.split("分部分摘要：\n")[1].split("\n\n请生成")[0])
+            reduce_parts.append([part.strip() for part in parts if part.strip()])
+            return "合并后的摘要。"
+        if "压缩" in prompt:
+            return condensed or prompt
+        return "这一部分的摘要很长。" * 40
+
+    fake_llm.respond = respond
+    content = "\n\n".join(f"Paragraph {i} about the w1 bus and its slave devices." for i in range(20))
+    assert generator.generate_original_summary(content) == "合并后的摘要。"
+    assert reduce_parts
+    for parts in reduce_parts:
+        assert len(parts) > 1
+        assert sum(generator.chunker.count_tokens(part) for part in parts) <= 80
+
+
+def test_failed_chunk_summaries_are_not_reduced_or_cached(fake_llm):
+    cache = ResultCache()
+    generator = SummaryGenerator(model_name="qwen-plus", cache=cache, map_reduce_threshold=10,
+                                 map_chunk_tokens=60, reduce_budget=2000)
+    content = "\n\n".join(f"Paragraph {i} about the w1 bus and its slave devices." for i in range(20))
+    reduced = []
+
+    def respond(prompt):
+        if "分部分摘要" in prompt:
+            reduced.append(prompt)
+            return "合并后的摘要。"
+        if "Paragraph 3 " in prompt:
+            raise RuntimeError("rate limited")
+        return "块摘要。"
+
+    fake_llm.respond = respond
+    assert generator.generate_original_summary(content) == "合并后的摘要。"
+    assert reduced and not any("摘要生成失败" in prompt for prompt in reduced)
+
+    fake_llm.respond = lambda prompt: "合并后的摘要。" if "分部分摘要" in prompt else "块摘要。"
+    calls = len(fake_llm.prompts)
+    generator.generate_original_summary(content)
+    assert len(fake_llm.prompts) > calls
+    calls = len(fake_llm.prompts)
+    generator.generate_original_summary(content)
+    assert len(fake_llm.prompts) == calls
+
+
+def test_parse_verification_json():
+    raw = '```json\n{"completeness_score": 7, "missing_items": ["漏了第二句", "无"], ' \
+          '"affected_segments": [2, 1, 2], "suggestions": "补全"}\n```'
+    result = SummaryGenerator.parse_verification_json(raw, 3)
+    assert result["completeness_score"] == 7
+    assert result["missing_items"] == ["漏了第二句"]
+    assert result["affected_segments"] == [0, 1]
+
+    # 超出范围的片段编号被丢弃，评分与遗漏内容保留；没有片段编号时 affected_segments 为空
+    out_of_range = '{"completeness_score": 4, "missing_items": ["缺少表格"], "affected_segments": [0, 2, 9]}'
+    assert SummaryGenerator.parse_verification_json(out_of_range, 3)["affected_segments"] == [1]
+    result = SummaryGenerator.parse_verification_json(out_of_range, 0)
+    assert result["affected_segments"] == []
+    assert (result["completeness_score"], result["missing_items"]) == (4, ["缺少表格"])
+
+
+@pytest.mark.parametrize("raw", [
+    "评分 8 分",
+    "[8]",
+    '{"completeness_score": "8", "missing_items": []}',
+    '{"completeness_score": 11, "missing_items": []}',
+    '{"completeness_score": true, "missing_items": []}',
+    '{"completeness_score": 8, "missing_items": "无"}',
+    '{"completeness_score": 8, "missing_items": [], "affected_segments": ["1"]}',
+    '{"completeness_score": 8, "missing_items": [], "suggestions": null}',
+])
+def test_parse_verification_json_rejects_malformed_output(raw):
+    with pytest.raises(ValueError):
+        SummaryGenerator.parse_verification_json(raw, 3)
+
+
+def test_chunk_verdict_with_segment_ids_is_kept(fake_llm):
+    generator = SummaryGenerator(model_name="qwen-plus")
+    fake_llm.respond = lambda prompt: '{"completeness_score": 5, "missing_items": ["漏译"], "affected_segments": [1]}'
+    result = generator.verify_chunk("Two sentences. Second one.", "两句话。")
+    assert result["completeness_score"] == 5
+    assert result["missing_items"] == ["漏译"]
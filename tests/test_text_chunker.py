@@ -0,0 +1,168 @@
+"""
+MarkdownChunker：合并块的 token 数按块计数相加再修正分隔符处（不整体重新编码）
+"""
+
+import random
+
+import pytest
+
+from conftest import read_fixture
+from src.core.document_processor import ProcessorFactory
+from src.core.rst_chunker import RSTChunker
+from src.core.text_chunker import MarkdownChunker
+
+
+SEPARATORS = ['\n\n', '\n', '\n\n\n', ' \n\n', '\n  \n', '\n\t\n\n']
+
+
+def full_join_cost(chunker, left, right, separator='\n\n'):
+    return (chunker.count_tokens(left + separator + right)
+            - chunker.count_tokens(left) - chunker.count_tokens(right))
+
+
+class FullEncodingMixin:
+    """参照实现：每次合并都整体重新编码"""
+
+    def _join_cost(self, left, right, separator='\n\n'):
+        return full_join_cost(self, left, right, separator)
+
+
+class FullEncodingMarkdownChunker(FullEncodingMixin, MarkdownChunker):
+    pass
+
+
+class FullEncodingRSTChunker(FullEncodingMixin, RSTChunker):
+    pass
+
+
+def fragments(text):
+    """样例文档中以空行分隔的片段"""
+    return [piece for piece in text.split('\n\n') if piece.strip()]
+
+
+def test_join_cost_matches_full_encoding():
+    chunker = MarkdownChunker()
+    assert chunker.exact
+    pieces = fragments(read_fixture('ldm.md')) + fragments(read_fixture('w1-generic.rst'))
+    rng = random.Random(42)
+    for _ in range(3000):
+        left, right = rng.choice(pieces), rng.choice(pieces)
+        # 也取片段内任意位置截断的文本，覆盖行中、词中与空白处的拼接
+        if rng.random() < 0.5:
+            left = left[:rng.randrange(1, len(left) + 1)]
+        if rng.random() < 0.5:
+            right = right[rng.randrange(len(right)):]
+        separator = rng.choice(SEPARATORS)
+        assert chunker._join_cost(left, right, separator) == full_join_cost(chunker, left, right, separator), \
+            (left[-40:], separator, right[:40])
+
+
+@pytest.mark.parametrize("chunker_class, reference_class, fixture", [
+    (MarkdownChunker, FullEncodingMarkdownChunker, 'ldm.md'),
+    (RSTChunker, FullEncodingRSTChunker, 'w1-generic.rst'),
+])
+def test_incremental_counting_keeps_chunk_boundaries(chunker_class, reference_class, fixture):
+    pieces = fragments(read_fixture(fixture))
+    rng = random.Random(7)
+    documents = [read_fixture(fixture)] + [
+        '\n\n'.join(rng.choice(pieces) for _ in range(rng.randrange(5, 60))) for _ in range(20)
+    ]
+    for max_tokens in (60, 200, 800):
+        chunker, reference = chunker_class(max_tokens=max_tokens), reference_class(max_tokens=max_tokens)
+        for text in documents:
+            chunks = chunker.chunk_text(text)
+            assert [(c.start_pos, c.end_pos) for c in chunks] == \
+                [(c.start_pos, c.end_pos) for c in reference.chunk_text(text)]
+
+
+@pytest.mark.parametrize("chunker_class, fixture", [(MarkdownChunker, 'ldm.md'), (RSTChunker, 'w1-generic.rst')])
+def test_structure_chunks_carry_exact_spans(chunker_class, fixture):
+    """结构块与分块结果的区间指向原文，按区间拼接时块间原文逐字保留"""
+    text = read_fixture(fixture)
+    for max_tokens in (60, 800):
+        chunker = chunker_class(max_tokens=max_tokens)
+        structure = chunker.split_by_structure(text)
+        for chunk in structure:
+            assert chunk.content == text[chunk.start_pos:chunk.end_pos]
+            assert chunk.start_line == text.count('\n', 0, chunk.start_pos)
+            assert chunk.end_line == chunk.start_line + chunk.content.count('\n') + 1
+        chunks = chunker.chunk_text(text)
+        assert chunker.has_spans(text, chunks)
+        assert all(chunk.content == text[chunk.start_pos:chunk.end_pos] for chunk in chunks)
+
+        assert chunker.splice(text, chunks, [None] * len(chunks)) == text
+        target = len(chunks) // 2
+        replacements = [None] * len(chunks)
+        replacements[target] = "译文"
+        spliced = chunker.splice(text, chunks, replacements)
+        body = chunks[target].content
+        start = chunks[target].start_pos + len(body) - len(body.lstrip())
+        end = chunks[target].start_pos + len(body.rstrip())
+        assert spliced == text[:start] + "译文" + text[end:]
+
+
+def merged_content(run):
+    return run[0][0].content + ''.join(gap + chunk.content for chunk, _, gap in run[1:])
+
+
+def greedy_groups(chunker, run, budget):
+    """参照：从前往后尽量装满每个请求"""
+    groups, start = [], 0
+    for end in range(1, len(run) + 1):
+        if chunker.count_tokens(merged_content(run[start:end])) > budget:
+            groups.append((start, end - 1))
+            start = end - 1
+    return groups + [(start, len(run))]
+
+
+def plan_cost(chunker, run, groups):
+    misaligned = sum(1 for i, _ in groups[1:] if run[i][0].chunk_type != 'heading')
+    return misaligned, sum(chunker.count_tokens(merged_content(run[i:j])) ** 2 for i, j in groups)
+
+
+def test_plan_groups_matches_greedy_request_count():
+    """保序 DP 打包的请求数与贪心相同，各请求都不超预算，且断点与大小分布不劣于贪心"""
+    text = read_fixture('ldm.md')
+    chunker = MarkdownChunker()
+    structure = chunker.split_by_structure(text)
+    run = [(chunk, chunker.count_tokens(chunk.content),
+            text[previous.end_pos:chunk.start_pos] if previous else '')
+           for previous, chunk in zip([None] + structure, structure)]
+    largest = max(tokens for _, tokens, _ in run)
+    rebalanced = 0
+    for budget in range(largest, 8 * largest, max(1, largest // 4)):
+        planned, greedy = chunker._plan_groups(run, budget), greedy_groups(chunker, run, budget)
+        assert len(planned) == len(greedy)
+        assert [i for i, _ in planned[1:]] == [j for _, j in planned[:-1]]
+        assert planned[0][0] == 0 and planned[-1][1] == len(run)
+        assert max(chunker.count_tokens(merged_content(run[i:j])) for i, j in planned) <= budget
+        # 在请求数相同的前提下，不在标题处断开的次数与大小平方和（按此顺序）不劣于贪心
+        assert plan_cost(chunker, run, planned) <= plan_cost(chunker, run, greedy)
+        rebalanced += planned != greedy
+    assert rebalanced
+
+
+@pytest.mark.parametrize("max_tokens", [60, 200, 1000])
+def test_chunk_blocks_matches_chunk_text(max_tokens):
+    """
+    由文档块直接分块与对可翻译内容调用 chunk_text 覆盖同一段可翻译内容：
+    区间都指向该内容、按区间拼接可还原，且文档块按顺序全部覆盖
+    """
+    processor = ProcessorFactory.create('.md')
+    _, body = processor.extract_metadata(read_fixture('ldm.md'))
+    segments = list(processor.iter_translatable(processor.parse(body)))
+    content = '\n'.join(text for _, _, text in segments)
+    chunker = MarkdownChunker(max_tokens=max_tokens)
+
+    from_blocks, from_text = chunker.chunk_blocks(segments), chunker.chunk_text(content)
+    for chunks in (from_blocks, from_text):
+        assert chunker.has_spans(content, chunks)
+        assert all(chunk.content == content[chunk.start_pos:chunk.end_pos] for chunk in chunks)
+        assert chunker.splice(content, chunks, [chunk.content for chunk in chunks]) == content
+        gaps = zip([0] + [chunk.end_pos for chunk in chunks], [chunk.start_pos for chunk in chunks] + [len(content)])
+        assert all(not content[start:end].strip() for start, end in gaps)
+    # 按句子切开的长块，各片段的文档块区间为其所跨的块，相邻片段可能共用一块
+    ranges = [chunk.block_range for chunk in from_blocks]
+    assert all(a[0] <= b[0] and a[1] <= b[1] for a, b in zip(ranges, ranges[1:]))
+    covered = {i for start, end in ranges for i in range(start, end)}
+    assert {index for index, _, _ in segments} <= covered
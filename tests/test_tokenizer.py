@@ -0,0 +1,91 @@
+"""
+token 估计器与用量校准：最小二乘拟合；tiktoken 缓存目录
+"""
+
+import os
+import random
+
+import numpy as np
+import pytest
+
+from conftest import mark_translated, read_fixture
+from src.core.text_chunker import MarkdownChunker
+from src.core import tokenizer as tokenizer_module
+from src.core.tokenizer import TokenCalibration, TokenEstimator, get_tokenizer
+
+# 测试环境的自动夹具会替换 _load_tiktoken，这里保留原函数
+load_tiktoken = tokenizer_module._load_tiktoken
+
+
+def chunk_texts():
+    """两份样例文档的结构块、由其随机拼接的较长文本，以及一部分加了中文字符的假译文"""
+    chunker = MarkdownChunker()
+    texts = [chunk.content for name in ('ldm.md', 'w1-generic.rst')
+             for chunk in chunker.split_by_structure(read_fixture(name))]
+    rng = random.Random(3)
+    texts += ['\n\n'.join(rng.sample(texts, rng.randrange(2, 12))) for _ in range(400)]
+    return [mark_translated(text) if k % 3 == 0 else text for k, text in enumerate(texts)]
+
+
+def test_estimator_fit_is_least_squares_on_exact_counts():
+    tokenizer = get_tokenizer("gpt-3.5-turbo")
+    texts = chunk_texts()
+    rng = random.Random(5)
+    rng.shuffle(texts)
+    train, held_out = texts[:200], texts[200:]
+
+    estimator = TokenEstimator(max_samples=len(train)).calibrate(train, tokenizer)
+
+    x = np.array([TokenEstimator.features(text) for text in train], dtype=float)
+    y = np.array([tokenizer.count(text) for text in train], dtype=float)
+    assert (x != 0).any(axis=0).all()
+    expected, *_ = np.linalg.lstsq(x, y, rcond=None)
+    assert (expected >= 0).all()
+    assert estimator.coefficients == pytest.approx(expected.tolist(), rel=1e-6, abs=1e-9)
+    # 拟合后的误差界覆盖所有样本
+    for text, tokens in zip(train, y):
+        bounds = estimator.bounds(text)
+        assert bounds.low <= tokens <= bounds.high
+    # 未参与拟合的文本上平均相对误差
+    errors = [abs(estimator.estimate(text) - tokenizer.count(text)) / tokenizer.count(text)
+              for text in held_out if tokenizer.count(text) >= 20]
+    assert sum(errors) / len(errors) < 0.1
+
+
+def test_calibration_recovers_scale_and_overhead_from_recorded_usage():
+    tokenizer = get_tokenizer("gpt-3.5-turbo")
+    calibration = TokenCalibration()
+    texts = chunk_texts()[:50]
+    for text in texts:
+        local = tokenizer.count(text)
+        # API 报告的输入 = 1.1 * 本地计数 + 每次请求 25 个模板 token
+        calibration.record("gpt-3.5-turbo", text, "译文", round(1.1 * local + 25), 3)
+
+    report = calibration.report()["gpt-3.5-turbo"]
+    assert report["samples"] == len(texts)
+    assert report["fitted_scale"] == pytest.approx(1.1, abs=0.002)
+    assert report["fitted_overhead"] == pytest.approx(25, abs=0.6)
+    assert report["api_completion_tokens"] == 3 * len(texts)
+
+
+def test_tiktoken_cache_dir_is_set_only_while_loading(tmp_path, monkeypatch, encoding):
+    monkeypatch.setattr(tokenizer_module, "tokenizer_dir", lambda: tmp_path)
+    monkeypatch.delenv("TIKTOKEN_CACHE_DIR", raising=False)
+    seen = []
+
+    def get_encoding(name):
+        seen.append(os.environ.get("TIKTOKEN_CACHE_DIR"))
+        return encoding
+
+    monkeypatch.setattr(tokenizer_module.tiktoken, "get_encoding", get_encoding)
+    (tmp_path / "cl100k_base.tiktoken").write_text("bpe", encoding='utf-8')
+
+    assert load_tiktoken("cl100k_base") is encoding
+    assert seen == [str(tmp_path / "tiktoken")]
+    assert "TIKTOKEN_CACHE_DIR" not in os.environ
+    assert [p.read_text(encoding='utf-8') for p in (tmp_path / "tiktoken").iterdir()] == ["bpe"]
+
+    # 用户自行设置的缓存目录保持不变
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path / "own"))
+    load_tiktoken("cl100k_base")
+    assert seen[-1] == os.environ["TIKTOKEN_CACHE_DIR"] == str(tmp_path / "own")
@@ -0,0 +1,147 @@
+"""
+SmartTranslator：整篇分块翻译
+"""
+
+import threading
+
+from src.core.text_chunker import TextChunk
+from src.core.translator import SmartTranslator
+from src.utils.llm_factory import LLMFactory
+
+
+def test_chunks_are_translated_in_parallel_and_kept_in_order(monkeypatch, fake_llm):
+    workers = 4
+    # 请求逐个发出时第一个请求会一直等到超时
+    barrier = threading.Barrier(workers, timeout=10)
+
+    def translate_once(self, chunk, escalate=False):
+        if int(chunk.content) < workers:
+            barrier.wait()
+        return f"译文{chunk.content}"
+
+    monkeypatch.setattr(SmartTranslator, "_translate_once", translate_once)
+    translator = SmartTranslator(model_name="qwen-plus", max_workers=workers, verify_mode="off")
+    chunks = [TextChunk(str(i), 'paragraph') for i in range(10)]
+
+    _, translated, _, failed = translator._translate_chunks("", "off", chunks)
+
+    assert translated == [f"译文{i}" for i in range(10)]
+    assert failed == []
+
+
+def test_usage_is_recorded_per_tier_from_api_reports(monkeypatch):
+    """翻译、升级模型的代码块注释与校验调用都按模型层级记录 API 报告的用量"""
+    from langchain_core.runnables import RunnableLambda
+
+    def create_llm(model_name, usage_recorder=None, **kwargs):
+        def call(prompt):
+            reply = f"{model_name} 译文"
+            usage_recorder(prompt.to_string() if hasattr(prompt, 'to_string') else str(prompt), reply, 100, 7)
+            return reply
+        return RunnableLambda(call)
+
+    monkeypatch.setattr(LLMFactory, "create_llm", staticmethod(create_llm))
+    translator = SmartTranslator(model_name="qwen-plus", escalation_model="qwen-max", verify_mode="off")
+
+    translator.translate_chunk(TextChunk("Some text.", 'paragraph'))
+    code = translator.translate_chunk(TextChunk("# read the bus\nx = 1", 'code'), escalate=True)
+    translator.summary_generator.compare_summaries("原文摘要", "译文摘要")
+
+    assert code == "qwen-max 译文\nx = 1"
+    assert translator.get_token_usage() == {
+        "qwen-plus": {"calls": 2, "input_tokens": 200, "output_tokens": 14},
+        "qwen-max": {"calls": 1, "input_tokens": 100, "output_tokens": 7},
+    }
+    assert translator.get_token_calibration()["qwen-plus"]["samples"] == 2
+
+
+def test_failed_chunk_verification_is_not_a_pass(monkeypatch, fake_llm):
+    """块级校验调用失败（None）的块保持标记并重译，不计为满分，也不算作已校验"""
+    monkeypatch.setattr(SmartTranslator, "_translate_once", lambda self, chunk, escalate=False: f"译文{chunk.content}")
+    translator = SmartTranslator(model_name="qwen-plus", chunk_verify=True, verify_mode="sampled", sample_rate=1.0)
+    verdicts = {"0": None, "1": None, "2": None}
+    monkeypatch.setattr(translator.summary_generator, "verify_chunk",
+                        lambda source, translated: verdicts[source])
+    retranslated = []
+
+    def retranslate(chunks, translated_chunks, indices, missing_content):
+        retranslated.append(list(indices))
+        return translated_chunks
+
+    monkeypatch.setattr(translator, "_retranslate_chunks", retranslate)
+    chunks = [TextChunk(str(i), 'paragraph') for i in range(3)]
+
+    _, stats = translator.translate_content("", chunks=chunks)
+    assert stats["completeness_score"] is None
+    assert stats["unverified_chunks"] == [0, 1, 2]
+    assert stats["sampling"]["verified_chunks"] == []
+    assert retranslated == [[0, 1, 2]]
+
+    verdicts["1"] = {"completeness_score": 9, "missing_items": []}
+    _, stats = translator.translate_content("", chunks=chunks)
+    assert stats["completeness_score"] == 9
+    assert stats["unverified_chunks"] == [0, 2]
+    assert stats["sampling"]["verified_chunks"] == [1]
+    assert retranslated[-1] == [0, 2]
+
+
+def test_sampled_mode_always_verifies_risky_and_samples_clean(fake_llm):
+    """sampled：本地检查未通过的必选（risk），通过的按 sample_rate 随机抽样（random）"""
+    translator = SmartTranslator(model_name="qwen-plus", verify_mode="sampled", sample_rate=0.3, sample_seed=1)
+    checker = translator.integrity_checker
+    risky = checker.check_segments(["Some text that was never translated."], ["Some text that was never translated."])
+    clean = checker.check_segments(["Some text that was translated."], ["一些已经翻译的文本。"])
+    assert not risky.clean and clean.clean
+
+    assert all(translator._sample_decision(risky) == {"selected": True, "reason": "risk"} for _ in range(200))
+    reasons = [translator._sample_decision(clean)["reason"] for _ in range(1000)]
+    assert set(reasons) == {"random", "not_sampled"}
+    assert 0.25 < reasons.count("random") / len(reasons) < 0.35
+
+    # 相同的种子抽中相同的样本
+    again = SmartTranslator(model_name="qwen-plus", verify_mode="sampled", sample_rate=0.3, sample_seed=1)
+    assert [again._sample_decision(clean)["reason"] for _ in range(1000)] == reasons
+
+
+def test_refine_segments_runs_in_parallel_and_isolates_failures(fake_llm):
+    """每个目标片段单独并行请求；某个片段请求失败或改进后反而变差，不影响其他片段"""
+    workers = 3
+    barrier = threading.Barrier(workers, timeout=10)
+    translator = SmartTranslator(model_name="qwen-plus", max_workers=workers, verify_mode="off")
+    sources = ["First paragraph.", "Second paragraph.", "Third paragraph.", "Fourth paragraph: 64 volumes."]
+    translations = ["First paragraph.", "第二段。", "Third paragraph.", "第四段：64 个卷。"]
+
+    class Chain:
+        def invoke(self, inputs):
+            barrier.wait()
+            if inputs["source"].startswith("Third"):
+                raise RuntimeError("请求失败")
+            if inputs["source"].startswith("Fourth"):
+                return "第四段：若干个卷。"  # 丢了数字，不如原译文
+            return "改进后的" + inputs["source"][:5] + "段落。"
+
+    translator.segment_refine_chain = Chain()
+    patches = translator.refine_segments(sources, translations, [3, 0, 2, 7], "无")
+    assert patches == {0: "改进后的First段落。"}
+
+
+def test_split_retry_keeps_chunk_order(fake_llm):
+    """上下文超长时按段落、行递归拆分重试，译文按原顺序与原分隔符合并"""
+    calls = []
+
+    def translate_once(self, chunk, escalate=False):
+        calls.append(chunk.content)
+        if len(chunk.content) > 20:
+            raise ValueError("This model's maximum context length is 8192 tokens")
+        return f"<{chunk.content}>"
+
+    translator = SmartTranslator(model_name="qwen-plus", verify_mode="off")
+    translator._translate_once = translate_once.__get__(translator)
+    paragraphs = [f"para {i} line a\npara {i} line b" for i in range(5)]
+    content = '\n\n'.join(paragraphs)
+
+    result = translator.translate_chunk(TextChunk(content, 'paragraph'))
+    assert result == '\n\n'.join(f"<para {i} line a>\n<para {i} line b>" for i in range(5))
+    stats = translator.get_split_stats()
+    assert stats["count"] == 1 and stats["failed"] == 0 and stats["max_depth"] >= 2
+    assert not SmartTranslator._is_split_retryable(ValueError("invalid api key"))
@@ -0,0 +1,57 @@
+"""
+UniversalTranslator：后台校验（verify_later）回写统计信息；整篇 RST 改进的段落补丁解析
+"""
+
+import json
+
+import pytest
+
+from conftest import mark_translated, read_fixture
+from src.core.translator import SmartTranslator
+from src.core.universal_translator import UniversalTranslator
+
+
+def test_verify_later_merges_into_saved_stats(tmp_path, monkeypatch, fake_llm):
+    monkeypatch.setattr(SmartTranslator, "_translate_once",
+                        lambda self, chunk, escalate=False: mark_translated(chunk.content))
+
+    def verify_and_refine(self, source_content, chunks, translated_chunks, verify_mode):
+        return self._merge_translated_chunks(translated_chunks, chunks, source_content), {
+            "completeness_score": 9, "refine_rounds": 0
+        }
+
+    monkeypatch.setattr(SmartTranslator, "verify_and_refine", verify_and_refine)
+    source = tmp_path / "ldm.md"
+    source.write_text(read_fixture('ldm.md'), encoding='utf-8')
+    translator = UniversalTranslator(model_name="qwen-plus", verify_later=True)
+
+    result = translator.translate_file(str(source))
+    translator.wait_for_background()
+
+    saved = json.loads((tmp_path / "ldm_translated.stats.json").read_text(encoding='utf-8'))
+    assert saved["verification_status"] == "verified"
+    assert saved["completeness_score"] == 9
+    assert saved["input_file"] == str(source)
+    assert saved["chunk_count"] == result["chunk_count"] > 0
+    assert "token_usage" in saved
+
+
+def test_parse_patch_json():
+    assert UniversalTranslator.parse_patch_json('{"2": " 新译文 ", "[3]": "第三段"}', 3) == {2: "新译文", 3: "第三段"}
+    assert UniversalTranslator.parse_patch_json('```json\n{"1": "译文"}\n```', 1) == {1: "译文"}
+    assert UniversalTranslator.parse_patch_json('{}', 3) == {}
+
+
+@pytest.mark.parametrize("raw", [
+    "第 2 段：新译文",
+    '["新译文"]',
+    '{"0": "译文"}',
+    '{"4": "译文"}',
+    '{"二": "译文"}',
+    '{"1": ""}',
+    '{"1": 42}',
+    '{"1": null}',
+])
+def test_parse_patch_json_rejects_malformed_output(raw):
+    with pytest.raises(ValueError):
+        UniversalTranslator.parse_patch_json(raw, 3)